@@ -0,0 +1,135 @@
+"""Benchmark the irrigation programs at scale on a virtual clock.
+
+    python benchmarks/bench_programs.py --programs 200 --zones 16 --days 2
+
+Home Assistant must be installed. A simulated day runs in seconds, the
+report shows the event loop wake-ups, state writes, service calls,
+template renders and peak memory of each phase so regressions in the
+hot loops of switch.py show up as changed counts. The tests in the tests
+directory hold a small run of it to baseline thresholds.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulation import Simulation  # noqa: E402
+
+from irrigationprogram import async_setup  # noqa: E402
+from irrigationprogram.const import DOMAIN, DATA_HISTORY, DATA_VALVES  # noqa: E402
+from irrigationprogram.switch import (  # noqa: E402
+    PLATFORM_SCHEMA,
+    _async_create_entities,
+)
+
+
+def build_config(programs, zones):
+    """ platform configuration and input entity states for the programs """
+    states   = {'input_boolean.irrigation_on': 'on'}
+    switches = {}
+    for p in range(programs):
+        start = 'input_datetime.start_%s' % p
+        water = 'input_number.water_%s' % p
+        minute = 5 * 60 + (p * 7) % (18 * 60)
+        states[start] = '%02d:%02d:00' % (minute // 60, minute % 60)
+        states[water] = '1'
+        switches['program_%s' % p] = {
+            'start_time': start,
+            'irrigation_on': 'input_boolean.irrigation_on',
+            'zones': [{'zone': 'switch.zone_%s' % z,
+                       'name': 'Zone %s' % z,
+                       'water': water} for z in range(zones)],
+        }
+    for z in range(zones):
+        states['switch.zone_%s' % z] = 'off'
+
+    config = PLATFORM_SCHEMA({'platform': DOMAIN, 'switches': switches})
+    return config, states
+
+
+def snapshot(sim):
+    """ the counters at the start of a phase, the memory peak restarts """
+    sim.reset_peak()
+    data = sim.counters.as_dict()
+    data['wakeups'] = sim.loop.wakeups
+    data['wall']    = time.perf_counter()
+    data['clock']   = sim.loop.time()
+    return data
+
+
+def measure(sim, before):
+    """ the work done and the peak memory since the snapshot """
+    after = sim.counters.as_dict()
+    delta = {k: after[k] - before[k] for k in after}
+    delta['wakeups']     = sim.loop.wakeups - before['wakeups']
+    delta['wall']        = time.perf_counter() - before['wall']
+    delta['simulated']   = sim.loop.time() - before['clock']
+    delta['peak_memory'] = sim.peak_memory
+    return delta
+
+
+def report(name, delta):
+    simulated = delta['simulated']
+    per_s = delta['state_writes'] / simulated if simulated >= 1 else 0
+    print('%-10s wall %7.2fs  simulated %9.0fs  wakeups %8d  state writes %8d (%.3f/s)'
+          '  service calls %7d  zone commands %7d  template renders %5d  peak memory %6.1f MiB'
+          % (name, delta['wall'], simulated, delta['wakeups'], delta['state_writes'], per_s,
+             delta['service_calls'], delta['zone_commands'], delta['template_renders'],
+             delta['peak_memory'] / 1048576))
+
+
+async def async_benchmark(sim, programs, zones, days):
+    """ run the setup, schedule and stop phases, returns the measures of each """
+    hass = sim.hass
+    await async_setup(hass, {})
+    hass.data[DOMAIN][DATA_VALVES].timeout = 10
+
+    config, states = build_config(programs, zones)
+    for entity_id, state in states.items():
+        hass.states.async_set(entity_id, state)
+
+    phases = {}
+    before = snapshot(sim)
+    entities = await _async_create_entities(hass, config)
+    await sim.async_add_programs(entities)
+    phases['setup'] = measure(sim, before)
+
+    before = snapshot(sim)
+    await sim.async_advance(days * 86400)
+    phases['schedule'] = measure(sim, before)
+
+    """ every zone on, then a single stop of all the programs """
+    for z in range(zones):
+        hass.states.async_set('switch.zone_%s' % z, 'on')
+    before = snapshot(sim)
+    await hass.services.async_call(DOMAIN, 'stop_programs', {}, blocking=True)
+    phases['stop'] = measure(sim, before)
+
+    """ the run history is written before the loop closes """
+    await hass.data[DOMAIN][DATA_HISTORY].async_flush()
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--programs', type=int, default=200)
+    parser.add_argument('--zones', type=int, default=16)
+    parser.add_argument('--days', type=float, default=1)
+    args = parser.parse_args()
+
+    async def scenario(sim):
+        phases = await async_benchmark(sim, args.programs, args.zones, args.days)
+        for name, delta in phases.items():
+            report(name, delta)
+        print('programs %s  zones %s  simulated days %s'
+              % (args.programs, args.zones, args.days))
+
+    Simulation().run(scenario)
+
+
+if __name__ == '__main__':
+    main()
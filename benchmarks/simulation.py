@@ -0,0 +1,233 @@
+"""In-process simulation of Home Assistant for the irrigation programs.
+
+The real Home Assistant core objects are used for the state machine,
+service registry and event bus, but nothing is set up: there is no
+configuration, recorder or frontend. Zone switches are provided by a
+service that simply sets their state, each command is kept in zone_log
+with the virtual time it was sent.
+
+Time is virtual. VirtualClockLoop is an event loop whose clock jumps
+straight to the next scheduled callback instead of blocking, so every
+asyncio.sleep, timeout and point in time listener completes immediately
+in wall clock terms. dt_util.utcnow, dt_util.now and the clock used by
+the point in time listeners are patched to follow the loop clock so the
+scheduler sees the same virtual time.
+"""
+import asyncio
+import shutil
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+from datetime import timedelta
+from unittest import mock
+
+import homeassistant.util.dt as dt_util
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    EVENT_HOMEASSISTANT_START,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import discovery, event, template
+from homeassistant.helpers.restore_state import (
+    DATA_RESTORE_STATE_TASK,
+    RestoreStateData,
+)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop that skips idle time instead of sleeping through it.
+
+    Time only skips when nothing else can happen, while a job runs in the
+    executor the loop waits for it in real time so a file write does not
+    let the clock jump to the next scheduled callback.
+    """
+
+    def __init__(self, start=0.0):
+        super().__init__()
+        self._virtual_time = start
+        self.wakeups       = 0
+        self.jobs          = set()
+        real_select        = self._selector.select
+
+        def select(timeout=None):
+            events = real_select(0)
+            if events or timeout == 0:
+                return events
+            if self.jobs:
+                """ a job is running in the executor, wait for it """
+                return real_select(None)
+            self.wakeups += 1
+            if timeout is None:
+                """ nothing is scheduled, wait for real I/O """
+                return real_select(None)
+            self._virtual_time += timeout
+            return []
+
+        self._selector.select = select
+
+    def time(self):
+        return self._virtual_time
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.jobs.add(future)
+        future.add_done_callback(self.jobs.discard)
+        return future
+
+
+class Counters:
+    """Counts of the work done by the programs during a simulation."""
+
+    def __init__(self):
+        self.state_writes     = 0
+        self.program_writes   = 0
+        self.service_calls    = 0
+        self.zone_commands    = 0
+        self.template_renders = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class Simulation:
+    """A Home Assistant stand-in with a virtual clock and counters."""
+
+    def __init__(self, start='2026-01-05T05:00:00+00:00', time_zone='UTC'):
+        self.loop     = VirtualClockLoop()
+        self.counters = Counters()
+        self.start    = dt_util.parse_datetime(start)
+        self.hass     = None
+        self.zone_log = []
+        self._patches = []
+        self._tz      = time_zone
+        self._config_dir = None
+
+    def utcnow(self):
+        return self.start + timedelta(seconds=self.loop.time())
+
+    def now(self, time_zone=None):
+        return self.utcnow().astimezone(time_zone or dt_util.DEFAULT_TIME_ZONE)
+
+    def run(self, coro):
+        """ run a coroutine on the virtual clock """
+        asyncio.set_event_loop(self.loop)
+        tracemalloc.start()
+        try:
+            return self.loop.run_until_complete(self._async_run(coro))
+        finally:
+            for patch in self._patches:
+                patch.stop()
+            tracemalloc.stop()
+            self.loop.close()
+            if self._config_dir is not None:
+                shutil.rmtree(self._config_dir, ignore_errors=True)
+
+    @property
+    def peak_memory(self):
+        """ the peak memory since the start or the last reset_peak """
+        return tracemalloc.get_traced_memory()[1]
+
+    def reset_peak(self):
+        """ start measuring the peak memory of the next phase """
+        tracemalloc.reset_peak()
+
+    async def _async_run(self, coro):
+        self.hass = await self._async_create_hass()
+        result = await coro(self)
+        """ let the storage writes in progress finish before the loop closes """
+        while self.loop.jobs:
+            await asyncio.wait(list(self.loop.jobs))
+            await asyncio.sleep(0)
+        return result
+
+    async def _async_create_hass(self):
+
+        self._patches = [
+            mock.patch.object(dt_util, 'utcnow', self.utcnow),
+            mock.patch.object(dt_util, 'now', self.now),
+            mock.patch.object(event, 'time_tracker_utcnow', self.utcnow),
+            mock.patch.object(event, 'time',
+                              SimpleNamespace(time=lambda: self.utcnow().timestamp())),
+            mock.patch.object(discovery, 'async_load_platform', self._async_no_platform),
+        ]
+        for patch in self._patches:
+            patch.start()
+
+        hass = HomeAssistant()
+        hass.config.set_time_zone(self._tz)
+
+        """ a throw away .storage directory for the run checkpoints """
+        hass.config.config_dir = self._config_dir = tempfile.mkdtemp()
+
+        """ no saved states, and no periodic dump of them """
+        restore = RestoreStateData(hass)
+        restore.last_states = {}
+        hass.data[DATA_RESTORE_STATE_TASK] = restore
+
+        counters = self.counters
+        zone_log = self.zone_log
+        loop     = self.loop
+
+        set_state = hass.states.async_set
+        def async_set(entity_id, *args, **kwargs):
+            counters.state_writes += 1
+            if entity_id.startswith('switch.') and not entity_id.startswith('switch.zone_'):
+                counters.program_writes += 1
+            return set_state(entity_id, *args, **kwargs)
+        hass.states.async_set = async_set
+
+        async_call = hass.services.async_call
+        async def counted_call(domain, service, *args, **kwargs):
+            counters.service_calls += 1
+            return await async_call(domain, service, *args, **kwargs)
+        hass.services.async_call = counted_call
+
+        render = template.Template.async_render
+        def counted_render(tpl, *args, **kwargs):
+            counters.template_renders += 1
+            return render(tpl, *args, **kwargs)
+        patch = mock.patch.object(template.Template, 'async_render', counted_render)
+        patch.start()
+        self._patches.append(patch)
+
+        async def zone_switch(call):
+            entity_ids = call.data.get(ATTR_ENTITY_ID)
+            if isinstance(entity_ids, str):
+                entity_ids = [entity_ids]
+            state = 'on' if call.service == SERVICE_TURN_ON else 'off'
+            for entity_id in entity_ids:
+                counters.zone_commands += 1
+                zone_log.append((loop.time(), entity_id, state))
+                set_state(entity_id, state)
+
+        hass.services.async_register('switch', SERVICE_TURN_ON, zone_switch)
+        hass.services.async_register('switch', SERVICE_TURN_OFF, zone_switch)
+        return hass
+
+    @staticmethod
+    async def _async_no_platform(*args, **kwargs):
+        """ the sensor platform is not set up """
+
+    async def async_add_programs(self, entities):
+        """ add the program entities and start Home Assistant """
+        await self.async_add_entities(entities)
+        self.hass.bus.async_fire(EVENT_HOMEASSISTANT_START)
+        await self.async_settle()
+
+    async def async_add_entities(self, entities):
+        """ add entities the way an entity platform does """
+        for entity in entities:
+            entity.hass = self.hass
+            await entity.async_internal_added_to_hass()
+            await entity.async_added_to_hass()
+            entity.async_write_ha_state()
+
+    async def async_settle(self):
+        """ let the tasks created by the last step run """
+        await asyncio.sleep(0.001)
+
+    async def async_advance(self, seconds):
+        """ move the virtual clock on by a number of seconds """
+        await asyncio.sleep(seconds)
@@ -1,15 +1,68 @@
 import logging
+from datetime import datetime, timedelta
+
+import voluptuous as vol
 
 from .const import (
     DOMAIN,
     CONST_SWITCH,
-    SWITCH_ID_FORMAT,
+    DATA_DISPATCHER,
+    DATA_PROGRAMS,
+    DATA_VALVES,
+    DATA_RUN_STATS,
+    DATA_CHECKPOINTS,
+    DATA_RUN_QUEUE,
+    DATA_LIMITS,
+    DATA_REFERENCES,
+    DATA_HISTORY,
+    DATA_ET,
+    ATTR_MAX_VALVES,
+    ATTR_MAX_FLOW,
+    ATTR_WINDOW_START,
+    ATTR_WINDOW_END,
+    ATTR_OBJECTIVE,
+    ATTR_APPLY,
+    ATTR_PERIOD,
+    ATTR_ZONE,
+    ATTR_DAYS,
+    ATTR_RAIN_PROBABILITY,
+    OBJECTIVE_MAKESPAN,
+    OBJECTIVE_PEAK_FLOW,
+    PERIOD_DAY,
+    PERIOD_WEEK,
+    PERIOD_MONTH,
+    PERIOD_YEAR,
+    PERIOD_ALL,
+    EVENT_WINDOW,
+    EVENT_RELOADED,
+    EVENT_QUEUE,
+    EVENT_RUN_QUEUE,
+    EVENT_RUN_STATS,
+    EVENT_HISTORY,
+    EVENT_PROJECTION,
+    DFLT_PROJECTION_DAYS,
+    STOP_PREEMPTED,
+    STOP_SERVICE,
     )
+from .checkpoint import RunCheckpoints
+from .dispatcher import ProgramDispatcher
+from .et import EtEngine
+from .history import RunHistory
+from .optimizer import fit_window
+from .projection import project
+from .references import ReferenceIndex
+from .runqueue import RunQueue
+from .valves import ValveActuator
 
 
+from homeassistant.helpers import config_per_platform, config_validation as cv, discovery
+from homeassistant.helpers.reload import async_integration_yaml_config
+import homeassistant.util.dt as dt_util
 from homeassistant.const import (
     CONF_SWITCHES,
-    SERVICE_TURN_OFF,
+    EVENT_HOMEASSISTANT_START,
+    EVENT_HOMEASSISTANT_STOP,
+    SERVICE_RELOAD,
     ATTR_ENTITY_ID,
     CONF_API_KEY,
     CONF_LATITUDE,
@@ -20,32 +73,271 @@ from homeassistant.const import (
 # Shortcut for the logger
 _LOGGER = logging.getLogger(__name__)
 
+OPTIMIZE_WINDOW_SCHEMA = vol.Schema(
+    {
+    vol.Required(ATTR_WINDOW_START): cv.time,
+    vol.Required(ATTR_WINDOW_END): cv.time,
+    vol.Optional(ATTR_OBJECTIVE, default=OBJECTIVE_MAKESPAN): vol.In([OBJECTIVE_MAKESPAN, OBJECTIVE_PEAK_FLOW]),
+    vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_APPLY, default=False): cv.boolean,
+    }
+)
+
+GET_HISTORY_SCHEMA = vol.Schema(
+    {
+    vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_ZONE): cv.entity_ids,
+    vol.Optional(ATTR_PERIOD, default=PERIOD_WEEK): vol.In([PERIOD_DAY, PERIOD_WEEK, PERIOD_MONTH, PERIOD_YEAR, PERIOD_ALL]),
+    }
+)
+
+PROJECT_USAGE_SCHEMA = vol.Schema(
+    {
+    vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    vol.Optional(ATTR_DAYS, default=DFLT_PROJECTION_DAYS): vol.All(vol.Coerce(int), vol.Range(min=1, max=731)),
+    vol.Optional(ATTR_RAIN_PROBABILITY): vol.Any(
+        vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+        vol.All([vol.All(vol.Coerce(float), vol.Range(min=0, max=100))], vol.Length(min=12, max=12))),
+    }
+)
+
+
+def _period_start(period):
+    """ the start of the current local day, week, month or year """
+    if period == PERIOD_ALL:
+        return None
+    today = dt_util.now().date()
+    if period == PERIOD_WEEK:
+        today = today - timedelta(days=today.weekday())
+    elif period == PERIOD_MONTH:
+        today = today.replace(day=1)
+    elif period == PERIOD_YEAR:
+        today = today.replace(month=1, day=1)
+    return dt_util.start_of_local_day(today)
+
 
 async def async_setup(hass, config):
 
-    platforms = config.get(CONST_SWITCH)
+    """ shared start time queue for all the programs """
+    dispatcher = ProgramDispatcher(hass)
+
+    """ programs by device id, maintained by the program entities """
+    programs = {}
+
+    """ zone switching with confirmation, shared by all the programs """
+    valves = ValveActuator(hass)
+
+    """ the program that is watering and those waiting to """
+    run_queue = RunQueue(hass)
+
+    """ entities referenced by the programs, validated once for all of them """
+    references = ReferenceIndex(hass)
+
+    """ telemetry of the last run of each program """
+    run_stats = {}
+
+    """ progress of the running programs, survives a restart """
+    checkpoints = RunCheckpoints(hass)
+    await checkpoints.async_load()
 
-    for x in platforms:
-        if x.get('platform') == DOMAIN:
-            switches = x.get('switches')
-            break
+    """ every program and zone run, read before the programs restore """
+    history = RunHistory(hass)
+    await history.async_load()
+
+    """ water adjustment from the local weather sensors, set up by the platform """
+    et = EtEngine(hass)
+    await et.async_load()
+
+    hass.data[DOMAIN] = {DATA_DISPATCHER: dispatcher,
+                         DATA_PROGRAMS: programs,
+                         DATA_VALVES: valves,
+                         DATA_RUN_STATS: run_stats,
+                         DATA_CHECKPOINTS: checkpoints,
+                         DATA_RUN_QUEUE: run_queue,
+                         DATA_LIMITS: {},
+                         DATA_REFERENCES: references,
+                         DATA_HISTORY: history,
+                         DATA_ET: et}
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START,
+                               lambda event: references.async_validate())
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, history.async_flush)
 
     async def async_stop_programs(call):
 
-        for x in switches:
-            if x == call.data.get('ignore',''):
+        ignore = call.data.get('ignore','')
+        zones  = []
+        for device_id, program in list(programs.items()):
+            if device_id == ignore:
                 continue
+            program.async_stop_run(STOP_PREEMPTED if ignore else STOP_SERVICE)
+            zones.extend(program.zone_entities)
 
-            device = SWITCH_ID_FORMAT.format(x)
-            DATA = {ATTR_ENTITY_ID: device}
-            await hass.services.async_call(CONST_SWITCH,
-                                     SERVICE_TURN_OFF,
-                                     DATA)
+        """ one call for every zone that is on, returns once they confirm off """
+        await valves.async_turn_off(zones)
     """ END async_stop_switches """
 
+    async def async_dump_queue(call):
+
+        queue = dispatcher.snapshot()
+        _LOGGER.info('Program queue: %s', queue)
+        hass.bus.async_fire(EVENT_QUEUE, {'queue': queue})
+    """ END async_dump_queue """
+
+    async def async_get_run_queue(call):
+
+        queue = run_queue.snapshot()
+        _LOGGER.info('Run queue: %s', queue)
+        hass.bus.async_fire(EVENT_RUN_QUEUE, queue)
+    """ END async_get_run_queue """
+
+    async def async_optimize_window(call):
+
+        selected = call.data.get(ATTR_ENTITY_ID)
+        targets  = [x for x in programs.values()
+                    if selected is None or x.entity_id in selected]
+
+        """ the window can run past midnight """
+        day    = datetime(2000, 1, 1)
+        start  = datetime.combine(day, call.data[ATTR_WINDOW_START])
+        end    = datetime.combine(day, call.data[ATTR_WINDOW_END])
+        window = (end - start).total_seconds() % 86400 or 86400
+
+        limits = hass.data[DOMAIN][DATA_LIMITS]
+        result = fit_window([x.window_job() for x in targets],
+                            window,
+                            limits.get(ATTR_MAX_VALVES),
+                            limits.get(ATTR_MAX_FLOW),
+                            call.data[ATTR_OBJECTIVE],
+                            exclusive=not run_queue.concurrent)
+        for item in result['schedule']:
+            item[ATTR_ENTITY_ID] = item.pop('key')
+            item['start_time']   = (start + timedelta(seconds=item['start'])).time().isoformat()
+        _LOGGER.info('Window plan: %s', result)
+        hass.bus.async_fire(EVENT_WINDOW, result)
+
+        if not call.data[ATTR_APPLY]:
+            return
+        if not result['fits']:
+            _LOGGER.warning('The programs do not fit the window, start times not changed')
+            return
+
+        """ a start time entity shared by programs cannot take two times """
+        entities = {}
+        for program in targets:
+            entities.setdefault(program.start_time_entity, []).append(program.entity_id)
+        starts = {x[ATTR_ENTITY_ID]: x['start_time'] for x in result['schedule']}
+        for entity, users in entities.items():
+            if len(users) > 1:
+                _LOGGER.warning('%s is shared by %s, start time not changed', entity, users)
+                continue
+            await hass.services.async_call('input_datetime', 'set_datetime',
+                                           {ATTR_ENTITY_ID: entity,
+                                            'time': starts[users[0]]},
+                                           blocking=True)
+    """ END async_optimize_window """
+
+    async def async_reload(call):
+
+        from .switch import PLATFORM_SCHEMA, async_reload_programs
+
+        conf = await async_integration_yaml_config(hass, CONST_SWITCH)
+        if conf is None:
+            return
+
+        """ the programs of every irrigationprogram platform entry """
+        config = PLATFORM_SCHEMA({'platform': DOMAIN, CONF_SWITCHES: {}})
+        for platform, p_config in config_per_platform(conf, CONST_SWITCH):
+            if platform != DOMAIN:
+                continue
+            switches = dict(config[CONF_SWITCHES], **p_config[CONF_SWITCHES])
+            config   = dict(p_config, **{CONF_SWITCHES: switches})
+
+        result = await async_reload_programs(hass, config)
+        if result is None:
+            return
+        _LOGGER.info('Reloaded programs: %s', result)
+        hass.bus.async_fire(EVENT_RELOADED, result, context=call.context)
+    """ END async_reload """
+
+    async def async_get_run_stats(call):
+
+        entity_id = call.data.get(ATTR_ENTITY_ID)
+        stats = dict(run_stats)
+        for program in programs.values():
+            if program.run_stats is not None:
+                stats[program.entity_id] = program.run_stats
+        if entity_id is not None:
+            stats = {k: v for k, v in stats.items() if k == entity_id}
+        _LOGGER.info('Run stats: %s', stats)
+        hass.bus.async_fire(EVENT_RUN_STATS, {'stats': stats})
+    """ END async_get_run_stats """
+
+    async def async_get_history(call):
+
+        selected = call.data.get(ATTR_ENTITY_ID)
+        zones    = call.data.get(ATTR_ZONE)
+        targets  = [x for x in programs.values()
+                    if selected is None or x.entity_id in selected]
+        if zones is None:
+            zones = list(dict.fromkeys(z for x in targets for z in x.zone_entities))
+        elif selected is None:
+            """ only the zones asked for """
+            targets = []
+
+        start  = _period_start(call.data[ATTR_PERIOD])
+        result = {ATTR_PERIOD: call.data[ATTR_PERIOD],
+                  'start': start.isoformat() if start else None,
+                  'programs': history.summary([x.entity_id for x in targets], start),
+                  'zones': history.summary(zones, start)}
+        _LOGGER.info('Run history: %s', result)
+        hass.bus.async_fire(EVENT_HISTORY, result)
+    """ END async_get_history """
+
+    async def async_project_usage(call):
+
+        selected = call.data.get(ATTR_ENTITY_ID)
+        targets  = [x for x in programs.values()
+                    if selected is None or x.entity_id in selected]
+        result   = project([x.projection_job() for x in targets],
+                           dt_util.now(),
+                           call.data[ATTR_DAYS],
+                           call.data.get(ATTR_RAIN_PROBABILITY))
+        _LOGGER.info('Water use projection: %s', result['total'])
+        hass.bus.async_fire(EVENT_PROJECTION, result)
+    """ END async_project_usage """
+
     """ register services """
     hass.services.async_register(DOMAIN,
                                  'stop_programs',
                                  async_stop_programs)
+    hass.services.async_register(DOMAIN,
+                                 'dump_queue',
+                                 async_dump_queue)
+    hass.services.async_register(DOMAIN,
+                                 'get_run_queue',
+                                 async_get_run_queue)
+    hass.services.async_register(DOMAIN,
+                                 'optimize_window',
+                                 async_optimize_window,
+                                 schema=OPTIMIZE_WINDOW_SCHEMA)
+    hass.services.async_register(DOMAIN,
+                                 SERVICE_RELOAD,
+                                 async_reload)
+    hass.services.async_register(DOMAIN,
+                                 'get_run_stats',
+                                 async_get_run_stats)
+    hass.services.async_register(DOMAIN,
+                                 'get_history',
+                                 async_get_history,
+                                 schema=GET_HISTORY_SCHEMA)
+    hass.services.async_register(DOMAIN,
+                                 'project_usage',
+                                 async_project_usage,
+                                 schema=PROJECT_USAGE_SCHEMA)
+
+    """ diagnostics sensor """
+    hass.async_create_task(discovery.async_load_platform(
+        hass, 'sensor', DOMAIN, {}, config))
 
     return True
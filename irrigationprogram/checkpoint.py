@@ -0,0 +1,47 @@
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    STORAGE_KEY,
+    STORAGE_VERSION,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class RunCheckpoints:
+    """Progress of the running programs kept in the .storage directory.
+
+    A program saves a checkpoint each time a zone changes phase and clears
+    it when the run ends, a checkpoint found at start up belongs to a run
+    that was interrupted by a restart or crash.
+    """
+
+    def __init__(self, hass):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data  = {}
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        self._data = data if isinstance(data, dict) else {}
+        if self._data:
+            _LOGGER.debug('interrupted runs: %s', list(self._data))
+
+    def get(self, entity_id):
+        return self._data.get(entity_id)
+
+    @callback
+    def async_save(self, entity_id, checkpoint):
+        self._data[entity_id] = checkpoint
+        self._store.async_delay_save(self._data_to_save)
+
+    @callback
+    def async_clear(self, entity_id):
+        if self._data.pop(entity_id, None) is not None:
+            self._store.async_delay_save(self._data_to_save)
+
+    def _data_to_save(self):
+        return self._data
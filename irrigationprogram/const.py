@@ -23,8 +23,130 @@ ATTR_ICON_WAIT          = 'icon_wait'
 ATTR_ICON_OFF           = 'icon_off'
 ATTR_PROGRAMS           = 'programs'
 ATTR_LAST_RAN           = 'last_ran'
+ATTR_UPDATE_INTERVAL    = 'update_interval'
+ATTR_NEXT_RUN           = 'next_run'
+ATTR_INTERLEAVE         = 'interleave'
+ATTR_INTERLEAVED_PLAN   = 'interleaved_plan'
+ATTR_MAX_VALVES         = 'max_valves'
+ATTR_MAX_FLOW           = 'max_flow'
+ATTR_FLOW               = 'flow'
+ATTR_PLAN               = 'plan'
+ATTR_PLANNED_RUNTIME    = 'planned_runtime'
+ATTR_VALVE_TIMEOUT      = 'valve_timeout'
+ATTR_VALVE_RETRIES      = 'valve_retries'
+ATTR_VALVE_LATENCY      = 'valve_latency'
+ATTR_RESUME             = 'resume'
+ATTR_RESUME_WINDOW      = 'resume_window'
+ATTR_RAIN_INTERRUPT     = 'rain_interrupt'
+ATTR_RAIN_DEBOUNCE      = 'rain_debounce'
+ATTR_INTERRUPTED        = 'interrupted'
+ATTR_STOP_REASON        = 'stop_reason'
+ATTR_PRIORITY           = 'priority'
+ATTR_QUEUE_POLICY       = 'queue_policy'
+ATTR_QUEUE_POSITION     = 'queue_position'
+ATTR_ZONE_LOCKS         = 'zone_locks'
+ATTR_WAITING_FOR        = 'waiting_for'
+ATTR_WINDOW_START       = 'window_start'
+ATTR_WINDOW_END         = 'window_end'
+ATTR_OBJECTIVE          = 'objective'
+ATTR_APPLY              = 'apply'
+ATTR_PERIOD             = 'period'
+ATTR_CONTROLLER         = 'controller'
+ATTR_CONTROLLERS        = 'controllers'
+ATTR_CONCURRENT         = 'concurrent'
+ATTR_MAX_COMMANDS       = 'max_commands'
+ATTR_COMMAND_INTERVAL   = 'command_interval'
+ATTR_HANDOVER           = 'handover'
+ATTR_ET                 = 'et'
+ATTR_CROP_COEFFICIENT   = 'crop_coefficient'
+ATTR_VOLUME             = 'volume'
+ATTR_FLOW_SENSOR        = 'flow_sensor'
+ATTR_DAYS               = 'days'
+ATTR_RAIN_PROBABILITY   = 'rain_probability'
+ATTR_FLOW_TOLERANCE     = 'flow_tolerance'
+ATTR_FLOW_ALERTS        = 'flow_alerts'
 
 
+DATA_DISPATCHER         = 'dispatcher'
+DATA_PROGRAMS           = 'programs'
+DATA_VALVES             = 'valves'
+DATA_RUN_STATS          = 'run_stats'
+DATA_CHECKPOINTS        = 'checkpoints'
+DATA_RUN_QUEUE          = 'run_queue'
+DATA_LIMITS             = 'limits'
+DATA_ADD_ENTITIES       = 'add_entities'
+DATA_REFERENCES         = 'references'
+DATA_HISTORY            = 'history'
+DATA_ET                 = 'et'
+
+STORAGE_KEY             = DOMAIN + '.checkpoints'
+STORAGE_VERSION         = 1
+HISTORY_FILE            = '.storage/' + DOMAIN + '.history'
+ET_STORAGE_KEY          = DOMAIN + '.et'
+
+SIGNAL_RUN_STATS        = DOMAIN + '_run_stats'
+SIGNAL_HEALTH           = DOMAIN + '_health'
+SIGNAL_STATUS           = DOMAIN + '_status'
+SIGNAL_ET               = DOMAIN + '_et'
+
+SKIP_MISSING            = 'missing'
+SKIP_RAIN               = 'rain'
+SKIP_ADJUSTED           = 'adjusted'
+SKIP_MERGED             = 'merged'
+SKIP_LOCKED             = 'locked'
+
+FLOW_LEAK               = 'leak'
+FLOW_BLOCKAGE           = 'blockage'
+
+PHASE_WATER             = 'water'
+PHASE_WAIT              = 'wait'
+PHASE_QUEUED            = 'queued'
+
+ET_TEMPERATURE          = 'temperature'
+ET_HUMIDITY             = 'humidity'
+ET_WIND                 = 'wind'
+ET_SOLAR                = 'solar'
+ET_RAIN                 = 'rain'
+ET_DAYS                 = 'days'
+ET_REFERENCE            = 'reference_et'
+ET_MAX_FACTOR           = 'max_factor'
+
+STATUS_IDLE             = 'idle'
+STATUS_WATERING         = 'watering'
+STATUS_WAITING          = 'waiting'
+
+RESUME_ABANDON          = 'abandon'
+RESUME_RESUME           = 'resume'
+RESUME_RESTART          = 'restart'
+
+STOP_TURN_OFF           = 'turned_off'
+STOP_PREEMPTED          = 'preempted'
+STOP_SERVICE            = 'stop_programs'
+
+POLICY_PREEMPT          = 'preempt'
+POLICY_QUEUE            = 'queue'
+POLICY_MERGE            = 'merge'
+POLICY_SKIP             = 'skip'
+
+OBJECTIVE_MAKESPAN      = 'makespan'
+OBJECTIVE_PEAK_FLOW     = 'peak_flow'
+
+PERIOD_DAY              = 'day'
+PERIOD_WEEK             = 'week'
+PERIOD_MONTH            = 'month'
+PERIOD_YEAR             = 'year'
+PERIOD_ALL              = 'all'
+
+EVENT_QUEUE             = DOMAIN + '_queue'
+EVENT_PLAN              = DOMAIN + '_plan'
+EVENT_RUN_STATS         = DOMAIN + '_run_stats'
+EVENT_RUN_QUEUE         = DOMAIN + '_run_queue'
+EVENT_WINDOW            = DOMAIN + '_window'
+EVENT_RELOADED          = DOMAIN + '_reloaded'
+EVENT_HISTORY           = DOMAIN + '_history'
+EVENT_FLOW_ALERT        = DOMAIN + '_flow_alert'
+EVENT_PROJECTION        = DOMAIN + '_projection'
+
 CONST_ENTITY            = 'entity_id'
 CONST_SWITCH            = 'switch'
 
@@ -32,4 +154,26 @@ DFLT_ICON_WATER         = 'mdi:water'
 DFLT_ICON_WAIT          = 'mdi:timer-sand'
 DFLT_ICON_OFF           = 'mdi:water-off'
 DFLT_ICON               = 'mdi:fountain'
-DFLT_ICON_RAIN          = 'mdi:weather-pouring'
\ No newline at end of file
+DFLT_ICON_RAIN          = 'mdi:weather-pouring'
+DFLT_ICON_STATS         = 'mdi:chart-timeline'
+DFLT_ICON_HEALTH        = 'mdi:stethoscope'
+DFLT_ICON_ET            = 'mdi:sun-thermometer'
+
+DFLT_UPDATE_INTERVAL    = 30
+DFLT_VALVE_TIMEOUT      = 10
+DFLT_VALVE_RETRIES      = 2
+DFLT_MAX_COMMANDS       = 1
+DFLT_COMMAND_INTERVAL   = 0.1
+DFLT_RESUME             = RESUME_ABANDON
+DFLT_RESUME_WINDOW      = 60
+DFLT_RAIN_DEBOUNCE      = 30
+DFLT_PRIORITY           = 0
+DFLT_QUEUE_POLICY       = POLICY_PREEMPT
+DFLT_HISTORY_DAYS       = 400
+DFLT_ET_DAYS            = 3
+DFLT_ET_REFERENCE       = 5.0
+DFLT_ET_MAX_FACTOR      = 2.0
+DFLT_FLOW_TOLERANCE     = 30
+DFLT_FLOW_SETTLE        = 30
+DFLT_PROJECTION_DAYS    = 365
+DFLT_RELOAD_TIMEOUT     = 60
@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_point_in_time
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class ProgramDispatcher:
+    """Domain wide queue of irrigation program start times.
+
+    Every program registers its next start in a single heap, one point in
+    time callback is armed for the earliest entry and only the programs
+    that are due are woken. Rescheduling a program leaves its old heap
+    entry behind, stale entries are discarded when they reach the top.
+    """
+
+    def __init__(self, hass):
+        self.hass     = hass
+        self._heap    = []
+        self._entries = {}
+        self._seq     = itertools.count()
+        self._unsub   = None
+        self._armed   = None
+
+    @callback
+    def async_schedule(self, entity_id, when, action):
+        """ (re)schedule a program, a when of None removes it """
+        self._entries.pop(entity_id, None)
+
+        if when is not None:
+            seq = next(self._seq)
+            self._entries[entity_id] = (when, seq, action)
+            heapq.heappush(self._heap, (when, seq, entity_id))
+
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._compact()
+
+        self._async_arm()
+
+    @callback
+    def async_cancel(self, entity_id):
+        self.async_schedule(entity_id, None, None)
+
+    def _is_current(self, item):
+        when, seq, entity_id = item
+        entry = self._entries.get(entity_id)
+        return entry is not None and entry[1] == seq
+
+    def _compact(self):
+        """ rebuild the heap without the stale entries """
+        self._heap = [x for x in self._heap if self._is_current(x)]
+        heapq.heapify(self._heap)
+
+    @callback
+    def _async_arm(self):
+        """ arm a single callback for the earliest start """
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+
+        when = self._heap[0][0] if self._heap else None
+        if when == self._armed:
+            return
+
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+        self._armed = when
+        if when is not None:
+            self._unsub = async_track_point_in_time(
+                self.hass, self._async_fire, when)
+
+    @callback
+    def _async_fire(self, now):
+        """ wake the programs that are due """
+        self._unsub = None
+        self._armed = None
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            item = heapq.heappop(self._heap)
+            if not self._is_current(item):
+                continue
+            entity_id = item[2]
+            due.append((entity_id, self._entries.pop(entity_id)[2]))
+
+        for entity_id, action in due:
+            _LOGGER.debug('dispatch %s', entity_id)
+            action(now)
+
+        self._async_arm()
+
+    @callback
+    def async_stop(self):
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._armed = None
+
+    def snapshot(self):
+        """ the queued programs in start order """
+        queue = sorted((when, seq, entity_id)
+                       for entity_id, (when, seq, action) in self._entries.items())
+        return [{'entity_id': entity_id, 'next_run': when.isoformat()}
+                for when, seq, entity_id in queue]
@@ -0,0 +1,296 @@
+import logging
+import math
+from datetime import timedelta
+
+import homeassistant.util.dt as dt_util
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import (
+    async_track_state_change_event,
+    async_track_time_change,
+)
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    ET_TEMPERATURE,
+    ET_HUMIDITY,
+    ET_WIND,
+    ET_SOLAR,
+    ET_RAIN,
+    ET_DAYS,
+    ET_REFERENCE,
+    ET_MAX_FACTOR,
+    ET_STORAGE_KEY,
+    STORAGE_VERSION,
+    SIGNAL_ET,
+    DFLT_ET_DAYS,
+    DFLT_ET_REFERENCE,
+    DFLT_ET_MAX_FACTOR,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+""" conversions to °C, m/s, W/m² and mm """
+CONVERT = {'°F': lambda x: (x - 32) / 1.8,
+           'km/h': lambda x: x / 3.6,
+           'mph': lambda x: x * 0.44704,
+           'in': lambda x: x * 25.4}
+
+
+def _vapour_pressure(temp):
+    """ saturation vapour pressure kPa at a temperature °C """
+    return 0.6108 * math.exp(17.27 * temp / (temp + 237.3))
+
+
+def _extraterrestrial(latitude, day):
+    """ extraterrestrial radiation MJ/m²/day for a latitude and day of the year """
+    phi   = math.radians(latitude)
+    dr    = 1 + 0.033 * math.cos(2 * math.pi * day / 365)
+    decl  = 0.409 * math.sin(2 * math.pi * day / 365 - 1.39)
+    omega = math.acos(max(-1, min(1, -math.tan(phi) * math.tan(decl))))
+    return 24 * 60 / math.pi * 0.082 * dr * (
+        omega * math.sin(phi) * math.sin(decl)
+        + math.cos(phi) * math.cos(decl) * math.sin(omega))
+
+
+def reference_et(tmin, tmax, tmean, day, latitude, elevation=0,
+                 humidity=None, wind=None, solar=None):
+    """The FAO-56 Penman-Monteith daily reference evapotranspiration in mm.
+
+    Without humidity the actual vapour pressure is taken at the minimum
+    temperature, without wind 2 m/s is used and without solar radiation
+    it is estimated from the temperature range.
+    """
+    ra    = _extraterrestrial(latitude, day)
+    if solar is None:
+        solar = 0.16 * math.sqrt(max(0, tmax - tmin)) * ra
+    if wind is None:
+        wind = 2
+    es    = (_vapour_pressure(tmax) + _vapour_pressure(tmin)) / 2
+    ea    = _vapour_pressure(tmin) if humidity is None else es * humidity / 100
+    delta = 4098 * _vapour_pressure(tmean) / (tmean + 237.3) ** 2
+    gamma = 0.000665 * 101.3 * ((293 - 0.0065 * elevation) / 293) ** 5.26
+    rso   = (0.75 + 2e-5 * elevation) * ra
+    rnl   = 4.903e-9 * ((tmax + 273.16) ** 4 + (tmin + 273.16) ** 4) / 2 \
+        * (0.34 - 0.14 * math.sqrt(max(0, ea))) \
+        * (1.35 * min(1, solar / rso if rso > 0 else 1) - 0.35)
+    rn    = 0.77 * solar - rnl
+    et0   = (0.408 * delta * rn + gamma * 900 / (tmean + 273) * wind * (es - ea)) \
+        / (delta + gamma * (1 + 0.34 * wind))
+    return max(0, et0)
+
+
+class _Reading:
+    """The time weighted mean, minimum and maximum of a sensor for a day."""
+
+    __slots__ = ('value', 'since', 'area', 'seconds', 'low', 'high')
+
+    def __init__(self):
+        self.value   = None
+        self.since   = None
+        self.area    = 0
+        self.seconds = 0
+        self.low     = None
+        self.high    = None
+
+    def update(self, value, now):
+        self.close(now)
+        self.value = value
+        if value is not None:
+            self.low  = value if self.low is None else min(self.low, value)
+            self.high = value if self.high is None else max(self.high, value)
+
+    def close(self, now):
+        """ add the last value up to now """
+        if self.value is not None and self.since is not None:
+            seconds       = max(0, now - self.since)
+            self.area    += self.value * seconds
+            self.seconds += seconds
+        self.since = now
+
+    @property
+    def mean(self):
+        if self.seconds:
+            return self.area / self.seconds
+        return self.value
+
+    def reset(self):
+        """ start a new day from the last value """
+        self.area    = 0
+        self.seconds = 0
+        self.low     = self.high = self.value
+
+
+class EtEngine:
+    """Rolling reference evapotranspiration and rainfall balance.
+
+    The weather sensors are integrated as their state changes, at the end
+    of each day the day's reference ET and rain are pushed into a ring
+    buffer of the last days that keeps its own totals, so an update and
+    the factor are O(1). The factor is the ET less the rain of the buffer
+    over the reference ET the water times are set for.
+    """
+
+    def __init__(self, hass):
+        self.hass      = hass
+        self.config    = None
+        self._store    = Store(hass, STORAGE_VERSION, ET_STORAGE_KEY)
+        self._readings = {}
+        self._rain     = None
+        self._rain_day = 0
+        self._unsubs   = []
+        self._buffer   = []
+        self._pos      = 0
+        self._count    = 0
+        self._et_sum   = 0
+        self._rain_sum = 0
+        self._saved    = []
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if isinstance(data, dict):
+            self._saved = data.get('days', [])
+
+    @property
+    def configured(self):
+        return self.config is not None
+
+    @callback
+    def async_configure(self, config):
+        """ set up or change the sensors and buffer, None removes the engine """
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        days = self.days()
+        self.config = config
+        if config is None:
+            return
+
+        self._resize(config.get(ET_DAYS, DFLT_ET_DAYS), days or self._saved)
+        self._readings = {x: _Reading() for x in (ET_TEMPERATURE, ET_HUMIDITY, ET_WIND, ET_SOLAR)
+                          if config.get(x) is not None}
+        self._rain     = None
+        self._rain_day = 0
+
+        now      = self.hass.loop.time()
+        entities = {}
+        for key in self._readings:
+            entities[config[key]] = key
+            self._readings[key].update(self._value(self.hass.states.get(config[key])), now)
+        if config.get(ET_RAIN) is not None:
+            entities[config[ET_RAIN]] = ET_RAIN
+            self._rain = self._value(self.hass.states.get(config[ET_RAIN]))
+
+        @callback
+        def sensor_changed(event):
+            key = entities.get(event.data.get('entity_id'))
+            if key is not None:
+                self._update(key, self._value(event.data.get('new_state')))
+
+        self._unsubs.append(async_track_state_change_event(
+            self.hass, list(entities), sensor_changed))
+        self._unsubs.append(async_track_time_change(
+            self.hass, self._async_end_of_day, hour=0, minute=0, second=0))
+
+    def _value(self, state):
+        if state is None:
+            return None
+        try:
+            value = float(state.state)
+        except ValueError:
+            return None
+        convert = CONVERT.get(state.attributes.get(ATTR_UNIT_OF_MEASUREMENT))
+        return convert(value) if convert else value
+
+    def _update(self, key, value):
+        if key == ET_RAIN:
+            """ a total that increases, a drop is the counter resetting """
+            if value is not None and self._rain is not None:
+                self._rain_day += value - self._rain if value >= self._rain else value
+            if value is not None:
+                self._rain = value
+            return
+        self._readings[key].update(value, self.hass.loop.time())
+
+    @callback
+    def _async_end_of_day(self, now):
+        loop_now = self.hass.loop.time()
+        for reading in self._readings.values():
+            reading.close(loop_now)
+
+        temp = self._readings[ET_TEMPERATURE]
+        if temp.low is None:
+            _LOGGER.warning('No temperature for the day, the evapotranspiration is not updated')
+        else:
+            day   = dt_util.as_local(now) - timedelta(days=1)
+            solar = self._readings.get(ET_SOLAR)
+            et0   = reference_et(
+                temp.low, temp.high, temp.mean,
+                day.timetuple().tm_yday,
+                self.hass.config.latitude,
+                self.hass.config.elevation or 0,
+                humidity=self._mean(ET_HUMIDITY),
+                wind=self._mean(ET_WIND),
+                solar=solar.area / 1e6 if solar is not None and solar.seconds else None)
+            self._push(round(et0, 2), round(self._rain_day, 1))
+            _LOGGER.debug('reference ET %s mm, rain %s mm, factor %s',
+                          round(et0, 2), round(self._rain_day, 1), self.factor())
+
+        for reading in self._readings.values():
+            reading.reset()
+        self._rain_day = 0
+        self._store.async_delay_save(lambda: {'days': self.days()}, 1)
+        async_dispatcher_send(self.hass, SIGNAL_ET)
+
+    def _mean(self, key):
+        reading = self._readings.get(key)
+        return None if reading is None else reading.mean
+
+    def _resize(self, size, days):
+        self._buffer   = [None] * size
+        self._pos      = 0
+        self._count    = 0
+        self._et_sum   = 0
+        self._rain_sum = 0
+        for et0, rain in days[-size:]:
+            self._push(et0, rain)
+
+    def _push(self, et0, rain):
+        """ add a day, dropping the oldest when the buffer is full """
+        old = self._buffer[self._pos]
+        if old is not None:
+            self._et_sum   -= old[0]
+            self._rain_sum -= old[1]
+        else:
+            self._count += 1
+        self._buffer[self._pos] = (et0, rain)
+        self._et_sum   += et0
+        self._rain_sum += rain
+        self._pos = (self._pos + 1) % len(self._buffer)
+
+    def days(self):
+        """ the (et, rain) of the days in the buffer, oldest first """
+        return [x for x in self._buffer[self._pos:] + self._buffer[:self._pos]
+                if x is not None]
+
+    def factor(self):
+        """ the water time multiplier, 1 until a day has been recorded """
+        if self.config is None or not self._count:
+            return 1
+        balance = max(0, self._et_sum - self._rain_sum)
+        factor  = balance / (self.config.get(ET_REFERENCE, DFLT_ET_REFERENCE) * self._count)
+        return round(min(factor, self.config.get(ET_MAX_FACTOR, DFLT_ET_MAX_FACTOR)), 2)
+
+    def snapshot(self):
+        return {'factor': self.factor(),
+                'et': round(self._et_sum, 2),
+                'rain': round(self._rain_sum, 1),
+                'days': self.days(),
+                'today': {'rain': round(self._rain_day, 1),
+                          'temperature': _round(self._mean(ET_TEMPERATURE))}}
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
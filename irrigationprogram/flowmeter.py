@@ -0,0 +1,179 @@
+import logging
+
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (
+    FLOW_LEAK,
+    FLOW_BLOCKAGE,
+    DFLT_FLOW_SETTLE,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+""" litres per unit of a volume total, and per minute of a flow rate """
+VOLUME = {'L': 1, 'l': 1, 'm³': 1000, 'gal': 3.785}
+RATE   = {'L/min': 1, 'l/min': 1, 'L/h': 1 / 60, 'l/h': 1 / 60, 'L/s': 60, 'l/s': 60,
+          'gal/min': 3.785, 'gal/h': 3.785 / 60, 'm³/h': 1000 / 60}
+
+
+class VolumeMeter:
+    """The litres delivered to a zone from a flow sensor.
+
+    The sensor is either a flow rate, integrated over the time each value
+    held, or a volume total such as a pulse counter. The meter only runs
+    on the sensor's state changed events. With a rate sensor the moment
+    the target will be reached is predicted from the last rate, so the
+    valve closes on time between readings. A sensor whose unit is neither
+    a known rate nor volume is not used.
+    """
+
+    def __init__(self, hass, entity_id, target=None, expected=None,
+                 tolerance=None, reached_cb=None, alert_cb=None):
+        self.hass        = hass
+        self.entity_id   = entity_id
+        self.target      = target
+        self.expected    = expected
+        self.tolerance   = tolerance
+        self.litres      = 0
+        self.reached     = False
+        self.alert       = None
+        self._reached_cb = reached_cb
+        self._alert_cb   = alert_cb
+        self._rate       = None
+        self._since      = None
+        self._total      = None
+        self._started    = None
+        self._due        = None
+        self._unsub      = None
+
+    @property
+    def loop(self):
+        return self.hass.loop
+
+    @callback
+    def async_start(self):
+        """ start measuring, the valve has just opened """
+        self._started = self._since = self.loop.time()
+        state = self.hass.states.get(self.entity_id)
+        if state is None:
+            _LOGGER.warning('%s not found, watering by time', self.entity_id)
+            return False
+        unit = state.attributes.get(ATTR_UNIT_OF_MEASUREMENT)
+        if unit not in RATE and unit not in VOLUME:
+            _LOGGER.warning('%s has the unit %s, not a known flow rate or volume, watering by time',
+                            self.entity_id, unit)
+            return False
+        self._read(state, start=True)
+        self._unsub = async_track_state_change_event(
+            self.hass, [self.entity_id], self._async_changed)
+        self._schedule()
+        return True
+
+    @callback
+    def async_stop(self):
+        """ stop measuring, returns the litres delivered """
+        if self._rate is not None:
+            self._integrate()
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._cancel()
+        self._check_band()
+        return self.litres
+
+    @property
+    def flow(self):
+        """ the mean flow in litres per minute since the valve opened """
+        minutes = (self.loop.time() - self._started) / 60 if self._started else 0
+        return self.litres / minutes if minutes > 0 else 0
+
+    def _read(self, state, start=False):
+        unit = state.attributes.get(ATTR_UNIT_OF_MEASUREMENT)
+        try:
+            value = float(state.state)
+        except ValueError:
+            return
+        if unit in RATE:
+            self._integrate()
+            self._rate = value * RATE[unit]
+        elif unit in VOLUME:
+            value = value * VOLUME[unit]
+            if start or self._total is None:
+                self._total = value
+            elif value >= self._total:
+                self.litres += value - self._total
+                self._total  = value
+            else:
+                """ the counter has been reset """
+                self.litres += value
+                self._total  = value
+
+    def _integrate(self):
+        now = self.loop.time()
+        if self._rate is not None:
+            self.litres += self._rate * (now - self._since) / 60
+        self._since = now
+
+    @callback
+    def _async_changed(self, event):
+        state = event.data.get('new_state')
+        if state is None:
+            return
+        self._read(state)
+        self._check_target()
+        if not self.reached:
+            self._check_band()
+            self._schedule()
+
+    def _check_target(self):
+        if self.target is not None and not self.reached and self.litres >= self.target:
+            self.reached = True
+            self._cancel()
+            if self._reached_cb is not None:
+                self._reached_cb()
+
+    def _schedule(self):
+        """ wake when a rate sensor will have delivered the target """
+        self._cancel()
+        if self.target is None or not self._rate or self._rate <= 0:
+            return
+        seconds = (self.target - self.litres) / self._rate * 60
+
+        @callback
+        def due():
+            self._due = None
+            self._integrate()
+            self.litres = max(self.litres, self.target)
+            self._check_target()
+
+        self._due = self.loop.call_later(max(0, seconds), due)
+
+    def _cancel(self):
+        if self._due is not None:
+            self._due.cancel()
+            self._due = None
+
+    def _check_band(self):
+        """ flag a leak or blockage once the flow has settled """
+        if self.alert is not None or self._started is None:
+            return
+        if self.loop.time() - self._started < DFLT_FLOW_SETTLE:
+            return
+        """ a rate sensor is judged on its reading, a total on the mean """
+        flow  = self._rate if self._rate is not None else self.flow
+        alert = None
+        if self.expected:
+            band = self.expected * (self.tolerance or 0) / 100
+            if flow > self.expected + band:
+                alert = FLOW_LEAK
+            elif flow < self.expected - band:
+                alert = FLOW_BLOCKAGE
+        elif flow <= 0:
+            alert = FLOW_BLOCKAGE
+        if alert is not None:
+            self.alert = alert
+            if self._alert_cb is not None:
+                self._alert_cb(alert, round(flow, 2))
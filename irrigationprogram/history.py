@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import os
+from bisect import bisect_left, bisect_right
+
+import homeassistant.util.dt as dt_util
+from homeassistant.core import callback
+
+from .const import (
+    HISTORY_FILE,
+    DFLT_HISTORY_DAYS,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+""" the fields of a record, stored as a json list one record per line """
+FIELDS = ('program', 'zone', 'start', 'seconds', 'litres', 'skip', 'scheduled')
+
+
+class _Series:
+    """The runs of a program or zone in start order with a running total
+    of their seconds and litres, so the totals over any period are two
+    binary searches.
+    """
+
+    def __init__(self):
+        self.starts  = []
+        self.seconds = [0]
+        self.litres  = [0]
+        self.last    = None
+
+    def add(self, record):
+        start   = record['start']
+        seconds = record['seconds']
+        litres  = record['litres'] or 0
+        if not self.starts or start >= self.starts[-1]:
+            self.starts.append(start)
+            self.seconds.append(self.seconds[-1] + seconds)
+            self.litres.append(self.litres[-1] + litres)
+        else:
+            """ only when the clock went backwards, shift the later totals """
+            index = bisect_right(self.starts, start)
+            self.starts.insert(index, start)
+            self.seconds.insert(index + 1, self.seconds[index])
+            self.litres.insert(index + 1, self.litres[index])
+            for i in range(index + 1, len(self.seconds)):
+                self.seconds[i] += seconds
+                self.litres[i]  += litres
+        if record['zone'] is None or seconds > 0:
+            if self.last is None or start >= self.last['start']:
+                self.last = record
+
+    def totals(self, start=None, end=None):
+        first = 0 if start is None else bisect_left(self.starts, start)
+        last  = len(self.starts) if end is None else bisect_left(self.starts, end)
+        last  = max(first, last)
+        return {'runs': last - first,
+                'seconds': self.seconds[last] - self.seconds[first],
+                'litres': round(self.litres[last] - self.litres[first], 1)}
+
+
+class RunHistory:
+    """Append only log of the program and zone runs.
+
+    Each run of a program appends a record for the program and one for
+    every zone in it to a file in the .storage directory. The file is read
+    once at start up into an index of the last run and running totals of
+    every program and zone, and rewritten without the records older than
+    the retention period when it holds any.
+    """
+
+    def __init__(self, hass, days=DFLT_HISTORY_DAYS):
+        self.hass      = hass
+        self.days      = days
+        self._path     = hass.config.path(HISTORY_FILE)
+        self._series   = {}
+        self._last_ran = {}
+        self._pending  = []
+        self._writer   = None
+
+    async def async_load(self):
+        records, expired = await self.hass.async_add_executor_job(self._read)
+        for record in records:
+            self._index(record)
+        if expired:
+            _LOGGER.debug('%s run history records expired', expired)
+            await self.hass.async_add_executor_job(self._rewrite, records)
+
+    def _read(self):
+        records = []
+        expired = 0
+        cutoff  = dt_util.utcnow().timestamp() - self.days * 86400
+        try:
+            with open(self._path, encoding='utf-8') as history:
+                for line in history:
+                    try:
+                        record = dict(zip(FIELDS, json.loads(line)))
+                    except ValueError:
+                        """ a partly written last line """
+                        continue
+                    if record['start'] < cutoff:
+                        expired += 1
+                        continue
+                    records.append(record)
+        except FileNotFoundError:
+            pass
+        return records, expired
+
+    def _rewrite(self, records):
+        temp = self._path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as history:
+            for record in records:
+                history.write(_line(record))
+        os.replace(temp, self._path)
+
+    def _append(self, lines):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'a', encoding='utf-8') as history:
+            history.writelines(lines)
+
+    def _index(self, record):
+        key = record['zone'] or record['program']
+        self._series.setdefault(key, _Series()).add(record)
+        if record['zone'] is None and record['scheduled']:
+            self._last_ran[record['program']] = max(
+                record['start'], self._last_ran.get(record['program'], 0))
+
+    @callback
+    def async_record(self, program, zones, start, scheduled):
+        """Append the run of a program.
+
+        zones maps each zone to its seconds, litres and skip reason, the
+        program record holds the total seconds and litres.
+        """
+        start   = round(start.timestamp())
+        records = [{'program': program, 'zone': zone, 'start': round(x.get('start', start)),
+                    'seconds': round(x['seconds']), 'litres': x.get('litres'),
+                    'skip': x.get('skip'), 'scheduled': scheduled}
+                   for zone, x in zones.items()]
+        litres  = [x['litres'] for x in records if x['litres'] is not None]
+        records.append({'program': program, 'zone': None, 'start': start,
+                        'seconds': sum(x['seconds'] for x in records),
+                        'litres': round(sum(litres), 1) if litres else None,
+                        'skip': None, 'scheduled': scheduled})
+        for record in records:
+            self._index(record)
+        self._pending.extend(_line(x) for x in records)
+        if self._writer is None:
+            self._writer = self.hass.async_create_task(self._async_write())
+
+    async def _async_write(self):
+        """ one writer at a time, records added while it writes go next """
+        try:
+            while self._pending:
+                lines, self._pending = self._pending, []
+                await self.hass.async_add_executor_job(self._append, lines)
+        except OSError as err:
+            _LOGGER.error('Unable to write the run history: %s', err)
+        finally:
+            self._writer = None
+
+    async def async_flush(self, event=None):
+        """ wait for the records to be written """
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    def last_ran(self, program):
+        """ the local date of the last scheduled run of a program """
+        start = self._last_ran.get(program)
+        if start is None:
+            return None
+        return dt_util.as_local(dt_util.utc_from_timestamp(start)).date()
+
+    def last_run(self, key):
+        """ the last run of a program, or the last time a zone watered """
+        series = self._series.get(key)
+        if series is None or series.last is None:
+            return None
+        record = series.last
+        return {'start': dt_util.utc_from_timestamp(record['start']).isoformat(),
+                'seconds': record['seconds'],
+                'litres': record['litres'],
+                'scheduled': record['scheduled']}
+
+    def totals(self, key, start=None, end=None):
+        """ the runs, seconds and litres of a program or zone in a period """
+        series = self._series.get(key)
+        if series is None:
+            return {'runs': 0, 'seconds': 0, 'litres': 0}
+        return series.totals(start and start.timestamp(), end and end.timestamp())
+
+    def summary(self, keys, start=None, end=None):
+        result = {}
+        for key in keys:
+            totals = self.totals(key, start, end)
+            result[key] = dict(totals,
+                               minutes=round(totals['seconds'] / 60, 1),
+                               last_run=self.last_run(key))
+        return result
+
+
+def _line(record):
+    return json.dumps([record[x] for x in FIELDS], separators=(',', ':')) + '\n'
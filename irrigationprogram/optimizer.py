@@ -0,0 +1,110 @@
+import heapq
+import logging
+
+from .const import (
+    OBJECTIVE_MAKESPAN,
+    OBJECTIVE_PEAK_FLOW,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+def _schedule(jobs, max_valves, max_flow, exclusive):
+    """List schedule the jobs in the order given.
+
+    A job starts as soon as nothing it shares a zone with is running and
+    the valves and flow of the running jobs leave room for it, a later job
+    may start ahead of an earlier one that does not fit yet. A job that is
+    over a limit on its own runs alone. Returns ({key: start}, makespan,
+    peak flow).
+    """
+    pending = list(jobs)
+    running = []
+    starts  = {}
+    t       = 0
+    peak    = 0
+
+    while pending:
+        while running and running[0][0] <= t:
+            heapq.heappop(running)
+
+        for job in list(pending):
+            busy = [x[2] for x in running]
+            if busy:
+                if exclusive:
+                    break
+                if any(job['zones'] & other['zones'] for other in busy):
+                    continue
+                if max_valves and sum(x['valves'] for x in busy) + job['valves'] > max_valves:
+                    continue
+                if max_flow and sum(x['flow'] for x in busy) + job['flow'] > max_flow:
+                    continue
+            starts[job['key']] = t
+            pending.remove(job)
+            heapq.heappush(running, (t + job['runtime'], job['key'], job))
+            peak = max(peak, sum(x[2]['flow'] for x in running))
+
+        if pending:
+            if not running:
+                _LOGGER.error('unable to schedule %s', [x['key'] for x in pending])
+                break
+            t = running[0][0]
+
+    end = max((starts[x['key']] + x['runtime'] for x in jobs if x['key'] in starts), default=0)
+    return starts, end, peak
+
+
+def _flow_caps(jobs, limit=None):
+    """The total flow of every set of programs that could run together.
+
+    The peak flow of a schedule is always one of these totals, so they are
+    the only caps worth trying. Totals are rounded to 0.1 and kept below
+    limit, so there are at most limit / 0.1 of them however many programs
+    there are.
+    """
+    flows = [x['flow'] for x in jobs if x['flow']]
+    limit = limit or sum(flows)
+    sums  = {0}
+    for flow in flows:
+        sums |= {round(x + flow, 1) for x in sums if x + flow < limit}
+    sums.discard(0)
+    return sorted(sums)
+
+
+def fit_window(jobs, window, max_valves=None, max_flow=None,
+               objective=OBJECTIVE_MAKESPAN, exclusive=True):
+    """Assign a start offset to every program so they fit a watering window.
+
+    jobs is a list of dicts with the key, runtime (seconds), the peak
+    valves and flow the program uses, the set of zones it waters and its
+    priority. With exclusive only one program runs at a time. The
+    makespan objective orders the programs by priority then longest first.
+    The peak_flow objective looks for the lowest total flow limit that
+    still finishes within window seconds. A list schedule does not always
+    get shorter as the limit rises, so the totals of the programs' flows
+    are tried in turn from the lowest until one fits. It has no effect
+    with exclusive, the peak is then the flow of the largest program.
+    """
+    order = sorted(jobs, key=lambda x: (-x['priority'], -x['runtime']))
+    starts, end, peak = _schedule(order, max_valves, max_flow, exclusive)
+
+    if objective == OBJECTIVE_PEAK_FLOW and exclusive:
+        _LOGGER.warning('the peak_flow objective needs concurrent programs, '
+                        'the programs run one at a time in makespan order')
+    elif objective == OBJECTIVE_PEAK_FLOW:
+        for cap in _flow_caps(jobs, max_flow):
+            trial = _schedule(order, max_valves, cap, exclusive)
+            if trial[1] <= window:
+                starts, end, peak = trial
+                break
+
+    schedule = sorted(({'key': x['key'],
+                        'start': starts[x['key']],
+                        'end': starts[x['key']] + x['runtime']}
+                       for x in jobs if x['key'] in starts),
+                      key=lambda x: (x['start'], x['key']))
+    return {'schedule': schedule,
+            'makespan': end,
+            'peak_flow': peak,
+            'fits': end <= window}
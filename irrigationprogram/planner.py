@@ -0,0 +1,225 @@
+import heapq
+import logging
+
+from .const import (
+    PHASE_WATER,
+    PHASE_WAIT,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class ZoneStep:
+    """A zone of a program resolved at the start of a run.
+
+    The water, wait and repeat values are resolved from their entities
+    once, the times are in seconds. skip holds the reason the zone will
+    not run, None when it will.
+    """
+
+    __slots__ = ('index', 'zone', 'name', 'icon', 'water', 'wait',
+                 'repeat', 'flow', 'skip', 'volume')
+
+    def __init__(self, index, zone, name, icon, water=0, wait=0,
+                 repeat=1, flow=None, skip=None, volume=None):
+        self.index  = index
+        self.zone   = zone
+        self.name   = name
+        self.icon   = icon
+        self.water  = water
+        self.wait   = wait
+        self.repeat = repeat
+        self.flow   = flow
+        self.skip   = skip
+        self.volume = volume
+
+    @property
+    def runtime(self):
+        """ seconds from the first cycle starting to the last finishing """
+        if self.skip is not None:
+            return 0
+        return (self.water + self.wait) * self.repeat - self.wait
+
+    def phases(self, resume=None):
+        """The (cycle, phase, seconds) steps of the zone, cycles count down.
+
+        resume is the (cycle, phase, seconds left) of an interrupted run,
+        the steps before it are left out.
+        """
+        steps = []
+        for i in range(self.repeat, 0, -1):
+            steps.append((i, PHASE_WATER, self.water))
+            if i > 1 and self.wait > 0:
+                steps.append((i, PHASE_WAIT, self.wait))
+
+        if resume is not None:
+            cycle, phase, left = resume
+            for pos, (i, p, seconds) in enumerate(steps):
+                if i == cycle and p == phase:
+                    steps = steps[pos + 1:]
+                    if left > 0:
+                        steps.insert(0, (i, p, left))
+                    break
+        return steps
+
+    def as_cycle(self):
+        """ the tuple used by plan_cycles """
+        return (self.index, self.water, self.wait, self.repeat, self.flow)
+
+    def as_checkpoint(self):
+        """ the resolved values saved with a run checkpoint """
+        return [self.index, self.zone, self.water, self.wait, self.repeat, self.skip, self.volume]
+
+    def as_dict(self):
+        result = {'name': self.name,
+                  'zone': self.zone,
+                  'water': self.water,
+                  'wait': self.wait,
+                  'repeat': self.repeat,
+                  'skip': self.skip}
+        if self.volume is not None:
+            result['volume'] = self.volume
+        return result
+
+
+def plan_cycles(zones, valves=1, max_flow=None, interleave=False):
+    """Build the watering cycles of a program within a valve/flow budget.
+
+    zones is a list of (key, water, wait, repeat, flow) with the times in
+    seconds. No more than valves zones are watered at the same time and,
+    when max_flow is given, the flow of the zones being watered never
+    exceeds it. A zone whose flow exceeds max_flow on its own is run alone.
+
+    Without interleave each zone holds its valve and flow for its whole
+    water/wait/repeat sequence and zones start in configuration order.
+    With interleave the budget is only held while watering, so other zones
+    are watered during a soak. Each zone keeps its water time and repeat
+    count and is never watered again until at least its wait has passed.
+
+    Returns a list of (start, key, water) ordered by start offset.
+    """
+    ready  = {}
+    left   = {}
+    order  = []
+    pos    = {}
+    for key, water, wait, repeat, flow in zones:
+        if water <= 0 or repeat <= 0:
+            continue
+        ready[key] = 0
+        left[key]  = (water, wait, repeat, flow or 0)
+        pos[key]   = len(order)
+        order.append(key)
+
+    def work(k):
+        water, wait, repeat, flow = left[k]
+        return water * repeat + wait * (repeat - 1)
+
+    if interleave:
+        """ favour the zone with the most work left, then configuration order """
+        priority = lambda k: (-work(k), pos[k])
+    else:
+        priority = lambda k: pos[k]
+
+    valves  = max(1, valves)
+    running = []
+    in_use  = 0
+    plan    = []
+    t       = 0
+
+    while left:
+        """ release the budget of anything that has finished """
+        while running and running[0][0] <= t:
+            end, key, flow = heapq.heappop(running)
+            in_use -= flow
+
+        due = sorted((k for k in left if ready[k] <= t), key=priority)
+        for key in due:
+            if len(running) >= valves:
+                break
+            water, wait, repeat, flow = left[key]
+            if max_flow and running and in_use + flow > max_flow:
+                continue
+
+            if interleave:
+                plan.append((t, key, water))
+                end        = t + water
+                ready[key] = end + wait
+                if repeat > 1:
+                    left[key] = (water, wait, repeat - 1, flow)
+                else:
+                    del left[key]
+            else:
+                for r in range(repeat):
+                    plan.append((t + r * (water + wait), key, water))
+                end = t + work(key)
+                del left[key]
+
+            in_use += flow
+            heapq.heappush(running, (end, key, flow))
+
+        """ move on to the next time something finishes or becomes ready """
+        events = [x for x in (ready[k] for k in left) if x > t]
+        if running:
+            events.append(running[0][0])
+        if not events:
+            if left:
+                _LOGGER.error('unable to plan zones %s', list(left))
+            break
+        t = min(events)
+
+    plan.sort(key=lambda x: (x[0], pos[x[1]]))
+    return plan
+
+
+def resume_cycles(plan, offset):
+    """Drop the cycles of a plan that finished before offset seconds.
+
+    A cycle that was being watered at offset keeps the part still to run,
+    the remaining cycles are moved offset seconds earlier.
+    """
+    resumed = []
+    for start, key, water in plan:
+        end = start + water
+        if end <= offset:
+            continue
+        resumed.append((max(0, start - offset), key, end - max(start, offset)))
+    return resumed
+
+
+def makespan(plan):
+    """ the elapsed seconds from the first start to the last finish """
+    return max((start + water for start, key, water in plan), default=0)
+
+
+def peak_usage(plan, flows):
+    """ the most zones and the most flow watering at the same time in a plan """
+    events = []
+    for start, key, water in plan:
+        events.append((start + water, -1, flows.get(key, 0)))
+        events.append((start, 1, flows.get(key, 0)))
+    valves = flow = peak_valves = peak_flow = 0
+    for when, change, rate in sorted(events):
+        valves += change
+        flow   += change * rate
+        peak_valves = max(peak_valves, valves)
+        peak_flow   = max(peak_flow, flow)
+    return peak_valves, peak_flow
+
+
+def handovers(plan, overlap):
+    """Map each zone to the zone opened overlap seconds before it closes.
+
+    Only zones that run one after the other hand over, and only when
+    both water for longer than the overlap.
+    """
+    if not overlap:
+        return {}
+    steps = [x for x in plan if x.skip is None]
+    return {a.index: b for a, b in zip(steps, steps[1:])
+            if a.water > overlap and b.water > overlap}
+
+
+def sequential_runtime(plan, overlap=0):
+    """ the seconds to run the zones one after the other """
+    return sum(x.runtime for x in plan) - overlap * len(handovers(plan, overlap))
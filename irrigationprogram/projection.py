@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+
+import homeassistant.util.dt as dt_util
+
+from .scheduler import is_run_day, next_run
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+COLUMNS = ['entity_id', 'zone', 'runs', 'minutes', 'litres']
+
+
+def run_offsets(first, days, run_days=None, run_freq=None):
+    """The day offsets from first that a program runs on, first included.
+
+    Each run sets last_ran for the next day evaluated, as a scheduled run
+    does, so the run_days/run_freq conditions are the ones the program
+    uses.
+    """
+    offsets  = [0]
+    last_ran = first
+    for offset in range(1, days):
+        day = first + timedelta(days=offset)
+        if is_run_day(day, run_days, run_freq, last_ran):
+            offsets.append(offset)
+            last_ran = day
+    return offsets
+
+
+def _dryness(start, days, rain_probability):
+    """ the chance of each day that a rain sensor does not skip the zone """
+    if rain_probability is None:
+        return None
+    if not isinstance(rain_probability, list):
+        rain_probability = [rain_probability] * 12
+    result = []
+    for offset in range(days):
+        month = (start + timedelta(days=offset)).month
+        result.append(1 - rain_probability[(month - 1) % len(rain_probability)] / 100)
+    return result
+
+
+def project(jobs, now, days, rain_probability=None):
+    """Project the runtime and litres of the programs over the coming days.
+
+    The run days of a schedule are evaluated once for the length of the
+    projection and shared by the programs with the same run_days,
+    run_freq and weekday of their next run, each program then only adds
+    its totals on its run days. A zone with a rain sensor is expected to
+    be skipped on a day with the rain probability of the month, given as
+    one percentage or a list of twelve starting in January.
+
+    Returns the totals of each zone as rows of COLUMNS, the minutes and
+    litres of each day from today, and the same for each zone entity,
+    summed over the programs that water it, to budget a zone by day.
+    """
+    start   = dt_util.as_local(now).date()
+    dryness = _dryness(start, days, rain_probability)
+    minutes = [0] * days
+    litres  = [0] * days
+    rows    = []
+    masks   = {}
+    daily   = {}
+
+    for job in jobs:
+        offsets = []
+        if job['enabled'] and job['start_time'] is not None:
+            first = next_run(now, job['start_time'], job['run_days'],
+                             job['run_freq'], job['last_ran'])
+            if first is not None:
+                first = first.date()
+                key   = (job['run_days'], job['run_freq'], first.weekday())
+                if key not in masks:
+                    masks[key] = run_offsets(first, days, job['run_days'], job['run_freq'])
+                skip    = (first - start).days
+                offsets = [skip + x for x in masks[key] if skip + x < days]
+
+        """ expected number of runs that are not skipped for rain """
+        runs = len(offsets)
+        dry  = runs
+        if dryness is not None:
+            dry = sum(dryness[x] for x in offsets)
+
+        day_minutes  = 0
+        day_litres   = 0
+        rain_minutes = 0
+        rain_litres  = 0
+        for zone in job['zones']:
+            zone_runs = dry if zone['rain'] else runs
+            rows.append([job['key'],
+                         zone['zone'],
+                         round(zone_runs, 1),
+                         round(zone_runs * zone['seconds'] / 60, 1),
+                         round(zone_runs * (zone['litres'] or 0), 1)])
+            if zone['rain'] and dryness is not None:
+                rain_minutes += zone['seconds'] / 60
+                rain_litres  += zone['litres'] or 0
+            else:
+                day_minutes += zone['seconds'] / 60
+                day_litres  += zone['litres'] or 0
+
+            if offsets:
+                table = daily.setdefault(zone['zone'], ([0] * days, [0] * days))
+                for x in offsets:
+                    factor = dryness[x] if zone['rain'] and dryness is not None else 1
+                    table[0][x] += factor * zone['seconds'] / 60
+                    table[1][x] += factor * (zone['litres'] or 0)
+
+        for x in offsets:
+            factor      = dryness[x] if dryness is not None else 1
+            minutes[x] += day_minutes + rain_minutes * factor
+            litres[x]  += day_litres + rain_litres * factor
+
+    _LOGGER.debug('projection of %s programs used %s run day masks', len(jobs), len(masks))
+    return {'start': start.isoformat(),
+            'days': days,
+            'columns': COLUMNS,
+            'zones': rows,
+            'minutes': [round(x, 1) for x in minutes],
+            'litres': [round(x, 1) for x in litres],
+            'zone_days': {zone: {'minutes': [round(x, 1) for x in table[0]],
+                                 'litres': [round(x, 1) for x in table[1]]}
+                          for zone, table in daily.items()},
+            'total': {'minutes': round(sum(minutes), 1),
+                      'litres': round(sum(litres), 1)}}
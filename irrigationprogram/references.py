@@ -0,0 +1,162 @@
+import logging
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (
+    ATTR_START,
+    ATTR_WATER,
+    ATTR_ZONE,
+    SIGNAL_HEALTH,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+""" a program cannot run as expected without these """
+REQUIRED = (ATTR_START, ATTR_ZONE, ATTR_WATER)
+
+
+class ReferenceIndex:
+    """The entities referenced by the programs and the programs using them.
+
+    The unique entities are checked in one pass when Home Assistant has
+    started, after that the missing set is kept up to date from the state
+    changed events of the referenced entities so a lookup never touches
+    the state machine. While a reload removes and adds programs the checks
+    are deferred and run once when the added programs have registered.
+    """
+
+    def __init__(self, hass):
+        self.hass       = hass
+        self._refs      = {}
+        self._missing   = set()
+        self._validated = False
+        self._unsub     = None
+        self._deferred  = None
+        self._expected  = set()
+
+    @callback
+    def async_register(self, program_id, references):
+        """ add the (entity_id, role) references of a program """
+        for entity_id, role in references:
+            self._refs.setdefault(entity_id, {}).setdefault(program_id, set()).add(role)
+        if self._deferred is not None:
+            self._deferred.update(entity_id for entity_id, role in references)
+            self._expected.discard(program_id)
+            self._async_resume()
+        elif self._validated:
+            self.async_validate({entity_id for entity_id, role in references})
+
+    @callback
+    def async_unregister(self, program_id):
+        for entity_id in list(self._refs):
+            users = self._refs[entity_id]
+            users.pop(program_id, None)
+            if not users:
+                del self._refs[entity_id]
+                self._missing.discard(entity_id)
+        if self._deferred is not None:
+            self._expected.discard(program_id)
+        elif self._validated:
+            self._async_track()
+            self._async_report(log=False)
+
+    @callback
+    def async_defer(self):
+        """ hold the checks while a reload removes and adds programs """
+        if self._deferred is None:
+            self._deferred = set()
+
+    @callback
+    def async_resume(self, programs=()):
+        """ check the references once the programs being added have registered """
+        self._expected = set(programs)
+        self._async_resume()
+
+    @callback
+    def _async_resume(self):
+        if self._deferred is None or self._expected:
+            return
+        entities, self._deferred = self._deferred, None
+        if self._validated:
+            """ one resubscribe and one report for the whole reload """
+            self.async_validate(entities)
+
+    @callback
+    def async_validate(self, entities=None):
+        """ check the referenced entities, all of them or only those given """
+        for entity_id in self._refs if entities is None else entities:
+            if self.hass.states.get(entity_id) is None:
+                self._missing.add(entity_id)
+            else:
+                self._missing.discard(entity_id)
+        self._validated = True
+        self._async_track()
+        self._async_report()
+
+    def is_missing(self, entity_id):
+        if not self._validated:
+            return self.hass.states.get(entity_id) is None
+        return entity_id in self._missing
+
+    def programs(self, entity_id):
+        """ the programs that reference an entity """
+        return list(self._refs.get(entity_id, ()))
+
+    def report(self):
+        programs = set()
+        for users in self._refs.values():
+            programs.update(users)
+        return {'entities': len(self._refs),
+                'programs': len(programs),
+                'missing': {entity_id: {program: sorted(roles)
+                                        for program, roles in self._refs[entity_id].items()}
+                            for entity_id in sorted(self._missing)}}
+
+    @callback
+    def _async_track(self):
+        if self._unsub is not None:
+            self._unsub()
+        self._unsub = async_track_state_change_event(
+            self.hass, list(self._refs), self._async_state_changed)
+
+    @callback
+    def _async_state_changed(self, event):
+        entity_id = event.data.get(ATTR_ENTITY_ID)
+        missing   = event.data.get('new_state') is None
+        if missing == (entity_id in self._missing):
+            return
+        if missing:
+            self._missing.add(entity_id)
+        else:
+            self._missing.discard(entity_id)
+            _LOGGER.info('%s is now available', entity_id)
+        self._async_report(log=missing)
+
+    @callback
+    def _async_report(self, log=True):
+        """ one log entry for all the missing entities """
+        if not log:
+            async_dispatcher_send(self.hass, SIGNAL_HEALTH)
+            return
+        errors   = []
+        warnings = []
+        for entity_id in sorted(self._missing):
+            roles = set()
+            for users in self._refs[entity_id].values():
+                roles.update(users)
+            if roles.intersection(REQUIRED):
+                errors.append(entity_id)
+            else:
+                warnings.append(entity_id)
+        if errors:
+            _LOGGER.error('%s not found, check your configuration, '
+                          'the irrigation programs using them will not run as expected: %s',
+                          errors, {x: self.programs(x) for x in errors})
+        if warnings:
+            _LOGGER.warning('%s not found, check your configuration: %s',
+                            warnings, {x: self.programs(x) for x in warnings})
+        async_dispatcher_send(self.hass, SIGNAL_HEALTH)
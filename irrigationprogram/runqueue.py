@@ -0,0 +1,272 @@
+import itertools
+import logging
+from datetime import timedelta
+
+import homeassistant.util.dt as dt_util
+from homeassistant.core import callback
+
+from .const import (
+    POLICY_PREEMPT,
+    POLICY_MERGE,
+    POLICY_SKIP,
+    STOP_PREEMPTED,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class RunQueue:
+    """Domain wide run slot and zone locks shared by the irrigation programs.
+
+    A program holds a lock on each of its zones while it runs. By default
+    one program waters at a time, any running program holds back the
+    others. With concurrent programs that share no zones run at the same
+    time, as long as the valves and flow of the running programs stay
+    within the platform max_valves and max_flow. A program over a limit on
+    its own only runs alone.
+
+    A program that cannot start either preempts the programs in its way,
+    when its policy is preempt and its priority is at least as high as
+    theirs, skips the zones in use, or waits in the queue. Waiting programs
+    are started in priority order, then in the order they asked, with
+    concurrent a program only starts ahead of an earlier one when they
+    share no zones. A program with the merge policy does not water again
+    the zones watered while it was waiting.
+    """
+
+    def __init__(self, hass):
+        self.hass       = hass
+        self.concurrent = False
+        self.max_valves = None
+        self.max_flow   = None
+        self.locks      = {}
+        self._held      = {}
+        self._queue     = []
+        self._seq       = itertools.count()
+        self._watered   = {}
+
+    def configure(self, concurrent=False, max_valves=None, max_flow=None):
+        """ whether programs run at the same time and the budget they share """
+        self.concurrent = concurrent
+        self.max_valves = max_valves
+        self.max_flow   = max_flow
+        self._async_grant()
+
+    @property
+    def budgeted(self):
+        """ True when the running programs share a valve or flow budget """
+        return self.concurrent and bool(self.max_valves or self.max_flow)
+
+    @property
+    def running(self):
+        """ the programs holding zone locks """
+        return [held[0] for held in self._held.values()]
+
+    def position(self, program):
+        """ the place of a program in the queue, None when not queued """
+        for pos, entry in enumerate(self._queue):
+            if entry['program'] is program:
+                return pos + 1
+        return None
+
+    def holders(self, zones):
+        """ the running programs in the way of a program with these zones """
+        if not self.concurrent:
+            return self.running
+        holders = {}
+        for zone in zones:
+            if zone in self.locks:
+                holders.setdefault(self.locks[zone].entity_id, self.locks[zone])
+        return list(holders.values())
+
+    def blocked(self, zones, demand=(0, 0)):
+        """ a program with these zones and demand cannot start now """
+        return bool(self.holders(zones)) or not self._fits(demand)
+
+    def held(self, program):
+        """ the zones locked by a program """
+        held = self._held.get(program.entity_id)
+        if held is None or held[0] is not program:
+            return set()
+        return held[1]
+
+    def waiting_for(self, program):
+        """ the zones a queued program is waiting for """
+        for entry in self._queue:
+            if entry['program'] is program:
+                return sorted(z for z in entry['zones'] if z in self.locks)
+        return []
+
+    def _fits(self, demand):
+        """ the valves and flow of a program fit beside the running programs """
+        if not self._held or not self.concurrent:
+            return not self._held
+        valves = sum(x[2][0] for x in self._held.values()) + demand[0]
+        flow   = sum(x[2][1] for x in self._held.values()) + demand[1]
+        if self.max_valves and valves > self.max_valves:
+            return False
+        if self.max_flow and flow > self.max_flow:
+            return False
+        return True
+
+    def _ahead(self, key, zones):
+        """ a program queued ahead of key is waiting for the same slot or zones """
+        for entry in self._queue:
+            if entry['key'] >= key:
+                break
+            if not self.concurrent or entry['zones'] & zones:
+                return True
+        return False
+
+    async def async_acquire(self, program, zones, priority, policy, demand=(0, 0)):
+        """Wait for the locks on the zones of a program.
+
+        demand is the valves and flow the program uses at its peak. Returns
+        the zones the program is not to water, merged into earlier runs or
+        skipped because they are in use, None if the program was removed
+        from the queue before it got its zones.
+        """
+        zones   = set(zones)
+        key     = (True, -priority, next(self._seq))
+        holders = self.holders(zones)
+        if not holders and not self._ahead(key, zones) and self._fits(demand):
+            self._lock(program, zones, demand)
+            return set()
+
+        if policy == POLICY_SKIP:
+            """ water the zones that are free now, none while another program runs alone """
+            if self.concurrent and self._fits(demand):
+                busy = {z for z in zones if z in self.locks}
+                for entry in self._queue:
+                    if entry['key'] < key:
+                        busy |= zones & entry['zones']
+            else:
+                busy = set(zones)
+            _LOGGER.debug('%s skips %s in use', program.entity_id, sorted(busy))
+            if busy != zones:
+                """ a program with nothing to water does not hold the run slot """
+                self._lock(program, zones - busy, demand)
+            return busy
+
+        preempt = (policy == POLICY_PREEMPT and
+                   all(priority >= x.priority for x in holders))
+        entry = {'program':  program,
+                 'zones':    zones,
+                 'demand':   demand,
+                 'key':      (not preempt,) + key[1:],
+                 'policy':   policy,
+                 'since':    self.hass.loop.time(),
+                 'future':   self.hass.loop.create_future()}
+        self._queue.append(entry)
+        self._queue.sort(key=lambda x: x['key'])
+
+        if preempt and holders:
+            for holder in holders:
+                _LOGGER.debug('%s preempts %s', program.entity_id, holder.entity_id)
+                holder.async_stop_run(STOP_PREEMPTED)
+        elif not holders:
+            self._async_grant()
+        else:
+            _LOGGER.debug('%s queued behind %s', program.entity_id,
+                          [x.entity_id for x in holders])
+
+        return await entry['future']
+
+    @callback
+    def async_cancel(self, program):
+        """ remove a waiting program from the queue """
+        for entry in self._queue:
+            if entry['program'] is program:
+                self._queue.remove(entry)
+                if not entry['future'].done():
+                    entry['future'].set_result(None)
+                self._async_grant()
+                return
+
+    @callback
+    def async_release(self, program, watered=()):
+        """ the program has finished, hand its zones to the waiting programs """
+        held = self._held.get(program.entity_id)
+        if held is None or held[0] is not program:
+            return
+        del self._held[program.entity_id]
+        for zone in held[1]:
+            if self.locks.get(zone) is program:
+                del self.locks[zone]
+        now = self.hass.loop.time()
+        for zone in watered:
+            self._watered[zone] = now
+        self._async_grant()
+
+    def _lock(self, program, zones, demand=(0, 0)):
+        self._held[program.entity_id] = (program, set(zones), demand)
+        for zone in zones:
+            self.locks[zone] = program
+
+    @callback
+    def _async_grant(self):
+        """ start the queued programs whose zones are free, in queue order """
+        reserved = set()
+        for entry in list(self._queue):
+            if entry['future'].done():
+                self._queue.remove(entry)
+                continue
+            if (entry['zones'] & reserved
+                    or any(z in self.locks for z in entry['zones'])
+                    or not self._fits(entry['demand'])):
+                if not self.concurrent:
+                    break
+                """ later programs sharing these zones wait their turn """
+                reserved |= entry['zones']
+                continue
+            self._queue.remove(entry)
+            merged = set()
+            if entry['policy'] == POLICY_MERGE:
+                merged = {zone for zone, when in self._watered.items()
+                          if when >= entry['since'] and zone in entry['zones']}
+            self._lock(entry['program'], entry['zones'], entry['demand'])
+            entry['future'].set_result(merged)
+
+        """ forget zones no waiting program can merge """
+        oldest = min((x['since'] for x in self._queue), default=None)
+        self._watered = {zone: when for zone, when in self._watered.items()
+                         if oldest is not None and when >= oldest}
+
+    def snapshot(self):
+        """ the running programs, the zone locks and the estimated start of the queued programs """
+        now     = dt_util.utcnow()
+        ends    = {}
+        running = []
+        for entity_id, (program, zones, _) in self._held.items():
+            ends[entity_id] = program.remaining_runtime
+            running.append({'entity_id': entity_id,
+                            'zones': sorted(zones),
+                            'estimated_end': (now + timedelta(seconds=ends[entity_id])).isoformat()})
+
+        """ a queued program starts when the programs using its zones end,
+            or every running program when they run one at a time """
+        free  = {zone: ends[program.entity_id] for zone, program in self.locks.items()}
+        slot  = max(ends.values(), default=0)
+        queue = []
+        for entry in self._queue:
+            program = entry['program']
+            if self.concurrent:
+                start = max((free.get(z, 0) for z in entry['zones']), default=0)
+                if not self._fits(entry['demand']):
+                    """ waits for a running program to give back its share of the budget """
+                    start = max(start, min(ends.values(), default=0))
+            else:
+                start = slot
+                slot += program.planned_runtime or 0
+            queue.append({'entity_id': program.entity_id,
+                          'priority': program.priority,
+                          'policy': entry['policy'],
+                          'waiting_for': sorted(z for z in entry['zones'] if z in self.locks),
+                          'estimated_start': (now + timedelta(seconds=start)).isoformat()})
+            for zone in entry['zones']:
+                free[zone] = start + (program.planned_runtime or 0)
+        return {'running': running,
+                'locks': {z: x.entity_id for z, x in self.locks.items()},
+                'depth': len(queue),
+                'queue': queue}
@@ -0,0 +1,62 @@
+import logging
+from datetime import datetime, timedelta
+
+import homeassistant.util.dt as dt_util
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_run_freq(value):
+    """ the run frequency in days, invalid values behave like |int(0) """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_run_day(day, run_days=None, run_freq=None, last_ran=None):
+    """Evaluate the run_days/run_freq conditions for a local date.
+
+    run_days is the state of the run days input_select, for example
+    "['Mon','Thu']", the day matches when its abbreviation is found in it.
+    run_freq is the number of days that must have passed since last_ran.
+    """
+    if run_days is not None:
+        if day.strftime('%a') not in run_days:
+            return False
+
+    if run_freq is not None and last_ran is not None:
+        if (day - last_ran).days < run_freq:
+            return False
+
+    return True
+
+
+def _local_start(day, start_time):
+    """ the local datetime of start_time on day, with the UTC offset of that time """
+    tz    = dt_util.DEFAULT_TIME_ZONE
+    naive = datetime.combine(day, start_time)
+    if hasattr(tz, 'localize'):
+        """ pytz, a time in the gap of a DST change is moved forward """
+        return tz.normalize(tz.localize(naive))
+    return naive.replace(tzinfo=tz)
+
+
+def next_run(now, start_time, run_days=None, run_freq=None, last_ran=None):
+    """ return the next local datetime after now that the program is due """
+    if start_time is None:
+        return None
+
+    now     = dt_util.as_local(now)
+    horizon = max(8, (run_freq or 0) + 1)
+
+    for offset in range(horizon):
+        day  = now.date() + timedelta(days=offset)
+        when = _local_start(day, start_time)
+        if when <= now:
+            continue
+        if is_run_day(day, run_days, run_freq, last_ran):
+            return when
+
+    return None
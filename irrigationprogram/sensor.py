@@ -0,0 +1,234 @@
+import logging
+
+from homeassistant.const import STATE_ON
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import Entity
+
+from .const import (
+    DOMAIN,
+    DATA_RUN_STATS,
+    DATA_REFERENCES,
+    DATA_PROGRAMS,
+    DATA_ET,
+    ATTR_QUEUE_POSITION,
+    ATTR_ZONE_LOCKS,
+    PHASE_WATER,
+    STATUS_IDLE,
+    STATUS_WATERING,
+    STATUS_WAITING,
+    SIGNAL_RUN_STATS,
+    SIGNAL_HEALTH,
+    SIGNAL_STATUS,
+    SIGNAL_ET,
+    DFLT_ICON_STATS,
+    DFLT_ICON_HEALTH,
+    DFLT_ICON_WATER,
+    DFLT_ICON_ET,
+    DFLT_ICON_WAIT,
+    DFLT_ICON_OFF,
+    )
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the irrigation diagnostics sensors."""
+    if discovery_info is None:
+        return
+    async_add_entities([ControllerSensor(hass), RunStatsSensor(hass), HealthSensor(hass), EtSensor(hass)])
+
+
+class ControllerSensor(Entity):
+    """The status of every program in one entity.
+
+    Each program publishes its status when it writes its own state, the
+    sensor keeps the last status of every program and only writes its
+    state when one of them has changed.
+    """
+
+    def __init__(self, hass):
+        self._programs = {}
+
+    async def async_added_to_hass(self):
+
+        for program in self.hass.data[DOMAIN][DATA_PROGRAMS].values():
+            if program.entity_id is not None:
+                self._programs[program.entity_id] = program.status()
+
+        @callback
+        def status_changed(program):
+            programs = self.hass.data[DOMAIN][DATA_PROGRAMS]
+            if programs.get(program.device_id) is program:
+                status = program.status()
+                if self._programs.get(program.entity_id) == status:
+                    return
+                self._programs[program.entity_id] = status
+            elif self._programs.pop(program.entity_id, None) is None:
+                return
+            self.async_write_ha_state()
+
+        self.async_on_remove(async_dispatcher_connect(
+            self.hass, SIGNAL_STATUS, status_changed))
+
+    @property
+    def name(self):
+        return 'Irrigation controller'
+
+    @property
+    def unique_id(self):
+        return DOMAIN + '_controller'
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def state(self):
+        """ watering while a zone is open, waiting while a program is on """
+        phases = [x.get('phase') for x in self._programs.values() if x['state'] == STATE_ON]
+        if PHASE_WATER in phases:
+            return STATUS_WATERING
+        if phases:
+            return STATUS_WAITING
+        return STATUS_IDLE
+
+    @property
+    def icon(self):
+        return {STATUS_WATERING: DFLT_ICON_WATER,
+                STATUS_WAITING: DFLT_ICON_WAIT}.get(self.state, DFLT_ICON_OFF)
+
+    @property
+    def device_state_attributes(self):
+        queued = sorted((x[ATTR_QUEUE_POSITION], k) for k, x in self._programs.items()
+                        if ATTR_QUEUE_POSITION in x)
+        return {'programs': dict(self._programs),
+                'queue': [k for _, k in queued],
+                'locks': {z: k for k, x in self._programs.items()
+                          for z in x.get(ATTR_ZONE_LOCKS, ())}}
+
+
+class RunStatsSensor(Entity):
+    """The telemetry of the last run of every program."""
+
+    def __init__(self, hass):
+        self._stats = hass.data[DOMAIN][DATA_RUN_STATS]
+        self._runs  = 0
+
+    async def async_added_to_hass(self):
+
+        @callback
+        def run_finished(entity_id):
+            self._runs += 1
+            self.async_write_ha_state()
+
+        self.async_on_remove(async_dispatcher_connect(
+            self.hass, SIGNAL_RUN_STATS, run_finished))
+
+    @property
+    def name(self):
+        return 'Irrigation run stats'
+
+    @property
+    def unique_id(self):
+        return DOMAIN + '_run_stats'
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def icon(self):
+        return DFLT_ICON_STATS
+
+    @property
+    def state(self):
+        """ the number of runs completed since Home Assistant started """
+        return self._runs
+
+    @property
+    def device_state_attributes(self):
+        return dict(self._stats)
+
+
+class HealthSensor(Entity):
+    """The referenced entities that cannot be found and the programs using them."""
+
+    def __init__(self, hass):
+        self._references = hass.data[DOMAIN][DATA_REFERENCES]
+
+    async def async_added_to_hass(self):
+
+        @callback
+        def health_changed():
+            self.async_write_ha_state()
+
+        self.async_on_remove(async_dispatcher_connect(
+            self.hass, SIGNAL_HEALTH, health_changed))
+
+    @property
+    def name(self):
+        return 'Irrigation health'
+
+    @property
+    def unique_id(self):
+        return DOMAIN + '_health'
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def icon(self):
+        return DFLT_ICON_HEALTH
+
+    @property
+    def state(self):
+        """ the number of referenced entities that are missing """
+        return len(self._references.report()['missing'])
+
+    @property
+    def device_state_attributes(self):
+        return self._references.report()
+
+
+class EtSensor(Entity):
+    """The water adjustment worked out from the local weather sensors."""
+
+    def __init__(self, hass):
+        self._et = hass.data[DOMAIN][DATA_ET]
+
+    async def async_added_to_hass(self):
+
+        @callback
+        def et_changed():
+            self.async_write_ha_state()
+
+        self.async_on_remove(async_dispatcher_connect(
+            self.hass, SIGNAL_ET, et_changed))
+
+    @property
+    def name(self):
+        return 'Irrigation ET factor'
+
+    @property
+    def unique_id(self):
+        return DOMAIN + '_et_factor'
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def icon(self):
+        return DFLT_ICON_ET
+
+    @property
+    def state(self):
+        """ the factor applied to the zones with a crop coefficient """
+        return self._et.factor()
+
+    @property
+    def device_state_attributes(self):
+        return self._et.snapshot()
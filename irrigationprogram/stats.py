@@ -0,0 +1,102 @@
+import logging
+from contextlib import contextmanager
+
+import homeassistant.util.dt as dt_util
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class RunStats:
+    """Telemetry for a single run of a program.
+
+    Times are measured on the event loop clock, valve open seconds are
+    counted from the confirmation of the open to the confirmation of the
+    close. Phase timings are only recorded when debug logging is enabled.
+    """
+
+    def __init__(self, entity_id, loop, scheduled=None):
+        self.entity_id    = entity_id
+        self.loop         = loop
+        self.scheduled    = scheduled
+        self.started      = dt_util.utcnow()
+        self.finished     = None
+        self.stopped      = False
+        self.state_writes = 0
+        self.commands     = 0
+        self.command_time = 0.0
+        self.command_max  = 0.0
+        self.zones        = {}
+        self.phases       = {}
+        self._opened      = {}
+        self.first_open   = {}
+        self._timing      = _LOGGER.isEnabledFor(logging.DEBUG)
+
+    def plan(self, plan):
+        """ record the planned valve open seconds and skip reasons """
+        for step in plan:
+            zone = self.zones.setdefault(step.zone, {
+                'name': step.name, 'planned': 0, 'actual': 0, 'litres': 0,
+                'skip': None})
+            if step.skip is None:
+                zone['planned'] += step.water * step.repeat
+            else:
+                zone['skip'] = step.skip
+
+    def command(self, seconds):
+        """ a valve command and the time it took to confirm """
+        self.commands     += 1
+        self.command_time += seconds
+        self.command_max   = max(self.command_max, seconds)
+
+    def opened(self, zones):
+        now = self.loop.time()
+        for zone in zones:
+            self._opened.setdefault(zone, now)
+            if zone not in self.first_open:
+                self.first_open[zone] = dt_util.utcnow()
+
+    def closed(self, zones):
+        now = self.loop.time()
+        for zone in zones:
+            start = self._opened.pop(zone, None)
+            if start is not None and zone in self.zones:
+                self.zones[zone]['actual'] += now - start
+
+    @contextmanager
+    def phase(self, name):
+        """ time a phase of the run when debug logging is enabled """
+        if not self._timing:
+            yield
+            return
+        start = self.loop.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(self.loop.time() - start, 3)
+
+    def finish(self, stopped=False):
+        self.closed(list(self._opened))
+        self.finished = dt_util.utcnow()
+        self.stopped  = stopped
+
+    def as_dict(self):
+        delay = None
+        if self.scheduled is not None:
+            delay = round((self.started - self.scheduled).total_seconds(), 3)
+        return {
+            'program': self.entity_id,
+            'scheduled_start': self.scheduled.isoformat() if self.scheduled else None,
+            'actual_start': self.started.isoformat(),
+            'start_delay': delay,
+            'finished': self.finished.isoformat() if self.finished else None,
+            'stopped': self.stopped,
+            'zones': {z: dict(v, actual=round(v['actual'], 1),
+                             litres=round(v['litres'], 1))
+                      for z, v in self.zones.items()},
+            'commands': self.commands,
+            'command_latency_avg': round(self.command_time / self.commands, 3) if self.commands else None,
+            'command_latency_max': round(self.command_max, 3),
+            'state_writes': self.state_writes,
+            'phases': self.phases,
+        }
@@ -6,9 +6,14 @@ from datetime import timedelta
 import math
 import homeassistant.util.dt as dt_util
 from homeassistant.core import callback
-from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import config_validation as cv, entity_platform
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.helpers.entity import async_generate_entity_id
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_state_change,
+    async_track_state_change_event,
+)
 
 from homeassistant.helpers.restore_state import (
     RestoreEntity,
@@ -41,7 +46,101 @@ from .const import (
     DFLT_ICON_RAIN,
     DFLT_ICON,
     ATTR_LAST_RAN,
+    ATTR_UPDATE_INTERVAL,
+    ATTR_NEXT_RUN,
+    ATTR_INTERLEAVE,
+    ATTR_INTERLEAVED_PLAN,
+    ATTR_MAX_VALVES,
+    ATTR_MAX_FLOW,
+    ATTR_FLOW,
+    ATTR_PLAN,
+    ATTR_PLANNED_RUNTIME,
+    EVENT_PLAN,
+    DATA_DISPATCHER,
+    DATA_PROGRAMS,
+    DATA_VALVES,
+    DATA_RUN_STATS,
+    DATA_HISTORY,
+    SIGNAL_RUN_STATS,
+    SIGNAL_STATUS,
+    ATTR_VALVE_TIMEOUT,
+    ATTR_VALVE_RETRIES,
+    ATTR_VALVE_LATENCY,
+    ATTR_RESUME,
+    ATTR_RESUME_WINDOW,
+    DATA_CHECKPOINTS,
+    PHASE_WAIT,
+    PHASE_WATER,
+    PHASE_QUEUED,
+    RESUME_ABANDON,
+    RESUME_RESUME,
+    RESUME_RESTART,
+    ATTR_RAIN_INTERRUPT,
+    ATTR_RAIN_DEBOUNCE,
+    ATTR_INTERRUPTED,
+    ATTR_STOP_REASON,
+    STOP_TURN_OFF,
+    ATTR_PRIORITY,
+    ATTR_QUEUE_POLICY,
+    ATTR_QUEUE_POSITION,
+    ATTR_ZONE_LOCKS,
+    ATTR_WAITING_FOR,
+    DATA_RUN_QUEUE,
+    SKIP_MERGED,
+    SKIP_LOCKED,
+    POLICY_PREEMPT,
+    POLICY_QUEUE,
+    POLICY_MERGE,
+    POLICY_SKIP,
+    DATA_LIMITS,
+    DATA_ADD_ENTITIES,
+    DATA_REFERENCES,
+    ATTR_CONTROLLER,
+    ATTR_CONTROLLERS,
+    ATTR_CONCURRENT,
+    ATTR_MAX_COMMANDS,
+    ATTR_COMMAND_INTERVAL,
+    DFLT_MAX_COMMANDS,
+    DFLT_COMMAND_INTERVAL,
+    ATTR_HANDOVER,
+    ATTR_ET,
+    ATTR_CROP_COEFFICIENT,
+    DATA_ET,
+    ET_TEMPERATURE,
+    ET_HUMIDITY,
+    ET_WIND,
+    ET_SOLAR,
+    ET_RAIN,
+    ET_DAYS,
+    ET_REFERENCE,
+    ET_MAX_FACTOR,
+    DFLT_ET_DAYS,
+    DFLT_ET_REFERENCE,
+    DFLT_ET_MAX_FACTOR,
+    ATTR_VOLUME,
+    ATTR_FLOW_SENSOR,
+    ATTR_FLOW_TOLERANCE,
+    ATTR_FLOW_ALERTS,
+    EVENT_FLOW_ALERT,
+    DFLT_FLOW_TOLERANCE,
+    SKIP_MISSING,
+    SKIP_RAIN,
+    SKIP_ADJUSTED,
+    DFLT_UPDATE_INTERVAL,
+    DFLT_VALVE_TIMEOUT,
+    DFLT_VALVE_RETRIES,
+    DFLT_RELOAD_TIMEOUT,
+    DFLT_RESUME,
+    DFLT_RESUME_WINDOW,
+    DFLT_RAIN_DEBOUNCE,
+    DFLT_PRIORITY,
+    DFLT_QUEUE_POLICY,
 )
+from .flowmeter import VolumeMeter
+from .planner import ZoneStep, plan_cycles, resume_cycles, makespan, peak_usage, handovers, sequential_runtime
+from .scheduler import next_run, parse_run_freq
+from .stats import RunStats
+from .timer import PhaseTimer
 
 from homeassistant.const import (
     EVENT_HOMEASSISTANT_START,
@@ -53,8 +152,16 @@ from homeassistant.const import (
     SERVICE_TURN_ON,
     ATTR_ICON,
     MATCH_ALL,
+    STATE_ON,
+    STATE_OFF,
 )
 
+def _volume_needs_meter(zone):
+    """ a volume can only be measured with a flow sensor """
+    if zone.get(ATTR_VOLUME) is not None and zone.get(ATTR_FLOW_SENSOR) is None:
+        raise vol.Invalid('volume requires a flow_sensor')
+    return zone
+
 SWITCH_SCHEMA = vol.All(
     cv.deprecated(ATTR_ENTITY_ID),
     vol.Schema(
@@ -65,7 +172,18 @@ SWITCH_SCHEMA = vol.All(
         vol.Exclusive(ATTR_RUN_DAYS,"FRQP"): cv.entity_domain('input_select'),
         vol.Optional(ATTR_IRRIGATION_ON): cv.entity_domain('input_boolean'),
         vol.Optional(ATTR_ICON,default=DFLT_ICON): cv.icon,
-        vol.Required(ATTR_ZONES): [{
+        vol.Optional(ATTR_UPDATE_INTERVAL,default=DFLT_UPDATE_INTERVAL): cv.positive_int,
+        vol.Optional(ATTR_INTERLEAVE,default=False): cv.boolean,
+        vol.Optional(ATTR_MAX_VALVES): cv.positive_int,
+        vol.Optional(ATTR_MAX_FLOW): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(ATTR_RESUME,default=DFLT_RESUME): vol.In([RESUME_ABANDON, RESUME_RESUME, RESUME_RESTART]),
+        vol.Optional(ATTR_RESUME_WINDOW,default=DFLT_RESUME_WINDOW): cv.positive_int,
+        vol.Optional(ATTR_RAIN_INTERRUPT,default=False): cv.boolean,
+        vol.Optional(ATTR_RAIN_DEBOUNCE,default=DFLT_RAIN_DEBOUNCE): cv.positive_int,
+        vol.Optional(ATTR_PRIORITY,default=DFLT_PRIORITY): vol.Coerce(int),
+        vol.Optional(ATTR_QUEUE_POLICY,default=DFLT_QUEUE_POLICY): vol.In([POLICY_PREEMPT, POLICY_QUEUE, POLICY_MERGE, POLICY_SKIP]),
+        vol.Optional(ATTR_HANDOVER,default=0): cv.positive_int,
+        vol.Required(ATTR_ZONES): [vol.All({
             vol.Required(ATTR_ZONE): cv.entity_domain(CONST_SWITCH),
             vol.Required(CONF_NAME): cv.string,
             vol.Optional(ATTR_RAIN_SENSOR): cv.entity_domain('binary_sensor'),
@@ -75,24 +193,57 @@ SWITCH_SCHEMA = vol.All(
             vol.Optional(ATTR_WAIT): cv.entity_domain('input_number'),
             vol.Optional(ATTR_REPEAT): cv.entity_domain('input_number'),
             vol.Optional(ATTR_ICON,default=DFLT_ICON): cv.icon,
-        }],
+            vol.Optional(ATTR_FLOW): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional(ATTR_CONTROLLER): cv.string,
+            vol.Optional(ATTR_CROP_COEFFICIENT): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional(ATTR_VOLUME): cv.entity_domain('input_number'),
+            vol.Optional(ATTR_FLOW_SENSOR): cv.entity_domain('sensor'),
+            vol.Optional(ATTR_FLOW_TOLERANCE,default=DFLT_FLOW_TOLERANCE): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+        }, _volume_needs_meter)],
         vol.Optional(CONF_UNIQUE_ID): cv.string,
         }
     ),
 )
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
-    {vol.Required(CONF_SWITCHES): cv.schema_with_slug_keys(SWITCH_SCHEMA)}
+    {
+    vol.Required(CONF_SWITCHES): cv.schema_with_slug_keys(SWITCH_SCHEMA),
+    vol.Optional(ATTR_MAX_VALVES): cv.positive_int,
+    vol.Optional(ATTR_MAX_FLOW): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(ATTR_CONCURRENT,default=False): cv.boolean,
+    vol.Optional(ATTR_VALVE_TIMEOUT,default=DFLT_VALVE_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(ATTR_VALVE_RETRIES,default=DFLT_VALVE_RETRIES): cv.positive_int,
+    vol.Optional(ATTR_CONTROLLERS,default={}): {cv.string: {
+        vol.Optional(ATTR_MAX_COMMANDS,default=DFLT_MAX_COMMANDS): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(ATTR_COMMAND_INTERVAL,default=DFLT_COMMAND_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }},
+    vol.Optional(ATTR_ET): {
+        vol.Required(ET_TEMPERATURE): cv.entity_domain('sensor'),
+        vol.Optional(ET_HUMIDITY): cv.entity_domain('sensor'),
+        vol.Optional(ET_WIND): cv.entity_domain('sensor'),
+        vol.Optional(ET_SOLAR): cv.entity_domain('sensor'),
+        vol.Optional(ET_RAIN): cv.entity_domain('sensor'),
+        vol.Optional(ET_DAYS,default=DFLT_ET_DAYS): vol.All(vol.Coerce(int), vol.Range(min=1, max=30)),
+        vol.Optional(ET_REFERENCE,default=DFLT_ET_REFERENCE): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+        vol.Optional(ET_MAX_FACTOR,default=DFLT_ET_MAX_FACTOR): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    },
+    }
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 
-async def _async_create_entities(hass, config):
-    """Create the Template switches."""
+async def _async_create_entities(hass, config, devices=None):
+    """Create the Template switches, all of them or only devices."""
     switches = []
 
+    """ controller wide limits apply to every program """
+    g_max_valves = config.get(ATTR_MAX_VALVES)
+    g_max_flow   = config.get(ATTR_MAX_FLOW)
+
     for device, device_config in config[CONF_SWITCHES].items():
+        if devices is not None and device not in devices:
+            continue
         friendly_name           = device_config.get(CONF_NAME, device)
         start_time              = device_config.get(ATTR_START)
         run_freq                = device_config.get(ATTR_RUN_FREQ)
@@ -101,6 +252,17 @@ async def _async_create_entities(hass, config):
         icon                    = device_config.get(ATTR_ICON)
         zones                   = device_config.get(ATTR_ZONES)
         unique_id               = device_config.get(CONF_UNIQUE_ID)
+        update_interval         = device_config.get(ATTR_UPDATE_INTERVAL)
+        interleave              = device_config.get(ATTR_INTERLEAVE)
+        max_valves              = _lowest(device_config.get(ATTR_MAX_VALVES), g_max_valves) or 1
+        max_flow                = _lowest(device_config.get(ATTR_MAX_FLOW), g_max_flow)
+        resume                  = device_config.get(ATTR_RESUME)
+        resume_window           = device_config.get(ATTR_RESUME_WINDOW)
+        rain_interrupt          = device_config.get(ATTR_RAIN_INTERRUPT)
+        rain_debounce           = device_config.get(ATTR_RAIN_DEBOUNCE)
+        priority                = device_config.get(ATTR_PRIORITY)
+        queue_policy            = device_config.get(ATTR_QUEUE_POLICY)
+        handover                = device_config.get(ATTR_HANDOVER)
 
         switches.append(
             IrrigationProgram(
@@ -116,16 +278,125 @@ async def _async_create_entities(hass, config):
                 DFLT_ICON_RAIN,
                 zones,
                 unique_id,
+                update_interval,
+                interleave,
+                max_valves,
+                max_flow,
+                resume,
+                resume_window,
+                rain_interrupt,
+                rain_debounce,
+                priority,
+                queue_policy,
+                handover,
             )
         )
+        switches[-1].program_config = _program_config(config, device)
 
     return switches
 
 
+def _program_config(config, device):
+    """ the configuration of a program including the limits it inherits """
+    return dict(config[CONF_SWITCHES][device],
+                **{ATTR_MAX_VALVES: config.get(ATTR_MAX_VALVES),
+                   ATTR_MAX_FLOW: config.get(ATTR_MAX_FLOW)})
+
+
+def _lowest(*values):
+    """ the smallest of the limits that have been configured """
+    values = [x for x in values if x is not None]
+    return min(values) if values else None
+
+
+def _apply_platform_options(hass, config):
+    valves         = hass.data[DOMAIN][DATA_VALVES]
+    valves.timeout = config.get(ATTR_VALVE_TIMEOUT, DFLT_VALVE_TIMEOUT)
+    valves.retries = config.get(ATTR_VALVE_RETRIES, DFLT_VALVE_RETRIES)
+
+    """ the relay board each zone is on """
+    zones = {}
+    for device_config in config[CONF_SWITCHES].values():
+        for zone in device_config.get(ATTR_ZONES):
+            if zone.get(ATTR_CONTROLLER) is not None:
+                zones[zone.get(ATTR_ZONE)] = zone.get(ATTR_CONTROLLER)
+    valves.configure(config.get(ATTR_CONTROLLERS, {}), zones)
+
+    hass.data[DOMAIN][DATA_ET].async_configure(config.get(ATTR_ET))
+    hass.data[DOMAIN][DATA_LIMITS] = {ATTR_MAX_VALVES: config.get(ATTR_MAX_VALVES),
+                                      ATTR_MAX_FLOW: config.get(ATTR_MAX_FLOW)}
+
+    """ one program at a time unless concurrent, then within the platform limits """
+    hass.data[DOMAIN][DATA_RUN_QUEUE].configure(config.get(ATTR_CONCURRENT, False),
+                                                config.get(ATTR_MAX_VALVES),
+                                                config.get(ATTR_MAX_FLOW))
+
+
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the irrigation switches."""
+    _apply_platform_options(hass, config)
+
+    """ kept for the reload service """
+    hass.data[DOMAIN][DATA_ADD_ENTITIES] = async_add_entities
+
     async_add_entities(await _async_create_entities(hass, config))
 
+    platform = entity_platform.current_platform.get()
+    platform.async_register_entity_service(
+        'get_plan', {}, 'async_get_plan'
+    )
+
+
+async def async_reload_programs(hass, config):
+    """Apply a new platform configuration to the live programs.
+
+    Programs whose configuration is unchanged are left alone, even while
+    running. Changed and removed programs are stopped, waiting for their
+    zones to close, and removed, then the changed and new programs are
+    added. Returns the device ids added, updated, removed and unchanged.
+    """
+    async_add_entities = hass.data[DOMAIN].get(DATA_ADD_ENTITIES)
+    if async_add_entities is None:
+        _LOGGER.error('The irrigationprogram switch platform is not set up')
+        return None
+
+    _apply_platform_options(hass, config)
+
+    programs   = hass.data[DOMAIN][DATA_PROGRAMS]
+    references = hass.data[DOMAIN][DATA_REFERENCES]
+    wanted     = {device: _program_config(config, device)
+                  for device in config[CONF_SWITCHES]}
+    result     = {'added': [], 'updated': [], 'removed': [], 'unchanged': []}
+    added      = []
+
+    references.async_defer()
+    try:
+        for device, program in list(programs.items()):
+            if wanted.get(device) == program.program_config:
+                result['unchanged'].append(device)
+                continue
+            result['updated' if device in wanted else 'removed'].append(device)
+            if program.is_on:
+                """ also takes a queued program out of the run queue """
+                _LOGGER.info('%s has changed, stopping it', program.entity_id)
+                await program.async_turn_off()
+            try:
+                await asyncio.wait_for(program.async_wait_idle(), DFLT_RELOAD_TIMEOUT)
+            except asyncio.TimeoutError:
+                _LOGGER.warning('%s did not stop within %s seconds, removing it anyway',
+                                program.entity_id, DFLT_RELOAD_TIMEOUT)
+            await program.async_remove()
+
+        devices = [x for x in wanted if x not in programs]
+        result['added'] = [x for x in devices if x not in result['updated']]
+        entities = await _async_create_entities(hass, config, devices)
+        added    = [x.entity_id for x in entities]
+    finally:
+        """ the references are checked once, when the added programs have registered """
+        references.async_resume(added)
+    async_add_entities(entities)
+    return result
+
 
 class IrrigationProgram(SwitchEntity, RestoreEntity):
     """Representation of an Irrigation program."""
@@ -143,6 +414,17 @@ class IrrigationProgram(SwitchEntity, RestoreEntity):
         rain_icon,
         zones,
         unique_id,
+        update_interval=DFLT_UPDATE_INTERVAL,
+        interleave=False,
+        max_valves=1,
+        max_flow=None,
+        resume=DFLT_RESUME,
+        resume_window=DFLT_RESUME_WINDOW,
+        rain_interrupt=False,
+        rain_debounce=DFLT_RAIN_DEBOUNCE,
+        priority=DFLT_PRIORITY,
+        queue_policy=DFLT_QUEUE_POLICY,
+        handover=0,
     ):
 
         self.entity_id = async_generate_entity_id(
@@ -160,7 +442,6 @@ class IrrigationProgram(SwitchEntity, RestoreEntity):
         self._wait_icon          = wait_icon
         self._rain_icon          = rain_icon
         self._zones              = zones
-        self._state_attributes   = None
         self._state              = False
         self._unique_id          = unique_id
         self._stop               = False
@@ -168,37 +449,50 @@ class IrrigationProgram(SwitchEntity, RestoreEntity):
         self._running            = False
         self._last_run           = None
         self._triggered_manually = True
-        self._template           = None
-
-        """ Validate and Build a template from the attributes provided """
-
-        _LOGGER.debug('Start Time %s: %s',self._start_time, hass.states.get(self._start_time))
-        template = "states('sensor.time')" + " + ':00' == states('" + self._start_time + "') "
-
-        if self._irrigation_on is not None:
-            _LOGGER.debug('Irrigation on %s: %s',self._irrigation_on, hass.states.get(self._irrigation_on))
-            template = template + " and is_state('" + self._irrigation_on + "', 'on') "
-
-        if self._run_days is not None:
-            _LOGGER.debug('Run Days %s: %s',self._run_days, hass.states.get(self._run_days))
-            template = template + " and now().strftime('%a') in states('" + self._run_days + "')"
-
-        if self._run_freq is not None:
-            _LOGGER.debug('Run Frequency %s: %s',self._run_freq, hass.states.get(self._run_freq))
-            template = template + \
-                    " and states('" + run_freq + "')|int" + \
-                    " <= ((as_timestamp(now()) " + \
-                    "- as_timestamp(states." + self.entity_id + \
-                    ".attributes.last_ran) | int) /86400) | int(0) "
-
-        template = "{{ " + template + " }}"
-
-        _LOGGER.debug('-------------------- on start: %s ----------------------------',self._name)
-        _LOGGER.debug('Template: %s', template)
-
-        template       = cv.template(template)
-        template.hass  = hass
-        self._template = template
+        self._next_run           = None
+        self._update_interval    = update_interval
+        self._timer              = PhaseTimer(hass.loop)
+        self._interleave         = interleave
+        self._interleaved_plan   = None
+        self._max_valves         = max_valves
+        self._max_flow           = max_flow
+        self._plan               = None
+        self._valves             = hass.data[DOMAIN][DATA_VALVES]
+        self._stats              = None
+        self._scheduled_for      = None
+        self._planned_runtime    = None
+        self._resume             = resume
+        self._resume_window      = resume_window
+        self._checkpoints        = hass.data[DOMAIN][DATA_CHECKPOINTS]
+        self._history            = hass.data[DOMAIN][DATA_HISTORY]
+        self._et                 = hass.data[DOMAIN][DATA_ET]
+        self._checkpoint         = None
+        self._rain_interrupt     = rain_interrupt
+        self._rain_debounce      = rain_debounce
+        self._interrupted        = {}
+        self._flow_alerts        = {}
+        self._active             = ()
+        self._phase              = None
+        self._ends               = None
+        self._stop_reason        = None
+        self._priority           = priority
+        self._queue_policy       = queue_policy
+        self._handover           = handover
+        self._run_queue          = hass.data[DOMAIN][DATA_RUN_QUEUE]
+        self._idle               = asyncio.Event()
+        self._idle.set()
+        self.program_config      = None
+        self._refs               = hass.data[DOMAIN][DATA_REFERENCES]
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('-------------------- on start: %s ----------------------------',self._name)
+            _LOGGER.debug('Start Time %s: %s',self._start_time, hass.states.get(self._start_time))
+            if self._irrigation_on is not None:
+                _LOGGER.debug('Irrigation on %s: %s',self._irrigation_on, hass.states.get(self._irrigation_on))
+            if self._run_days is not None:
+                _LOGGER.debug('Run Days %s: %s',self._run_days, hass.states.get(self._run_days))
+            if self._run_freq is not None:
+                _LOGGER.debug('Run Frequency %s: %s',self._run_freq, hass.states.get(self._run_freq))
 
 
     @callback
@@ -218,54 +512,136 @@ class IrrigationProgram(SwitchEntity, RestoreEntity):
             if self._last_run is None:
                 self._last_run = dt_util.as_local(time_date).date().isoformat()
 
-        ATTRS = {}
-        ATTRS [ATTR_LAST_RAN]  = self._last_run
-        ATTRS [ATTR_REMAINING] = 0
-        setattr(self, '_state_attributes', ATTRS)
-        
-        """ house keeping to help ensure solenoids are in a safe state """
-        self.hass.bus.async_listen_once(
-            EVENT_HOMEASSISTANT_START, self.async_turn_off())
+        """ the run history is the record of the last scheduled run """
+        last_ran = self._history.last_ran(self.entity_id)
+        if last_ran is not None:
+            self._last_run = last_ran.isoformat()
+
+        self.hass.data[DOMAIN][DATA_PROGRAMS][self._device_id] = self
+        self._refs.async_register(self.entity_id, self.references())
 
         @callback
-        async def template_check(entity, old_state, new_state):
-            self.async_schedule_update_ha_state(True)
+        def safe_state(event):
+            """ house keeping to help ensure solenoids are in a safe state """
+            self.hass.async_create_task(self._async_recover())
+
+        if not self.hass.is_running:
+            self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_START, safe_state)
+
+        @callback
+        def schedule_inputs_changed(entity, old_state, new_state):
+            self.async_schedule_next_run()
 
         @callback
         def template_sensor_startup(event):
             """Triggered when HASS has fully started"""
 
-            """ Validate the referenced objects now that HASS has started"""
-            if  self.hass.states.async_available('sensor.time'):
-                _LOGGER.error('%s not defined check your configuration, ' + \
-                                'if sensor.time has not been defined the irriagtion program will not behave as expected' \
-                                ,'sensor.time')
+            """ the referenced objects are validated for all the programs at once """
 
-            if  self.hass.states.async_available(self._start_time):
-                _LOGGER.error('%s not found, check your configuration, ' + \
-                                'if the entity has not been defined the irriagtion program will not run as expected' \
-                                ,self._start_time)
+            """ recalculate the next run only when a schedule input changes """
+            inputs = [self._start_time]
+            for x in (self._irrigation_on, self._run_days, self._run_freq):
+                if x is not None:
+                    inputs.append(x)
+            self.async_on_remove(async_track_state_change(
+                self.hass, inputs, schedule_inputs_changed))
 
-            if self._irrigation_on is not None:
-                if  self.hass.states.async_available(self._irrigation_on):
-                    _LOGGER.warning('%s not found, check your configuration',self._irrigation_on)
+            self.async_schedule_next_run()
 
-            if self._run_days is not None:
-                if  self.hass.states.async_available(self._run_days):
-                    _LOGGER.warning('%s not found, check your configuration',self._run_days)
+        if self.hass.is_running:
+            """ added by a reload, Home Assistant has already started """
+            template_sensor_startup(None)
+        else:
+            self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_START, template_sensor_startup)
 
-            if self._run_freq is not None:
-                if  self.hass.states.async_available(self._run_freq):
-                    _LOGGER.warning('%s not found, check your configuration',self._run_freq)
+        await super().async_added_to_hass()
 
-            """Update template on startup """
-            async_track_state_change(
-                self.hass, 'sensor.time', template_check)
+    async def async_will_remove_from_hass(self):
+        """ remove the program from the start queue """
+        self.hass.data[DOMAIN][DATA_DISPATCHER].async_cancel(self.entity_id)
+        self.hass.data[DOMAIN][DATA_PROGRAMS].pop(self._device_id, None)
+        self._refs.async_unregister(self.entity_id)
+        async_dispatcher_send(self.hass, SIGNAL_STATUS, self)
+
+    def references(self):
+        """ the (entity_id, role) of every entity the program uses """
+        refs = [(self._start_time, ATTR_START)]
+        for entity_id, role in ((self._irrigation_on, ATTR_IRRIGATION_ON),
+                                (self._run_days, ATTR_RUN_DAYS),
+                                (self._run_freq, ATTR_RUN_FREQ)):
+            if entity_id is not None:
+                refs.append((entity_id, role))
+        for zone in self._zones:
+            for role in (ATTR_ZONE, ATTR_WATER, ATTR_WATER_ADJUST, ATTR_WAIT,
+                         ATTR_REPEAT, ATTR_RAIN_SENSOR, ATTR_IGNORE_RAIN_SENSOR,
+                         ATTR_VOLUME, ATTR_FLOW_SENSOR):
+                if zone.get(role) is not None:
+                    refs.append((zone.get(role), role))
+        return refs
+
+    @callback
+    def async_schedule_next_run(self):
+        """Calculate the next start from the schedule inputs and queue it
+        with the domain dispatcher.
+        """
+        self._next_run = self._calculate_next_run()
+        _LOGGER.debug('%s next run: %s', self.entity_id, self._next_run)
+        self.hass.data[DOMAIN][DATA_DISPATCHER].async_schedule(
+            self.entity_id, self._next_run, self._async_scheduled_start)
 
-        self.hass.bus.async_listen_once(
-            EVENT_HOMEASSISTANT_START, template_sensor_startup)
+        self.async_write_ha_state()
 
-        await super().async_added_to_hass()
+    def _calculate_next_run(self):
+
+        if self._irrigation_on is not None:
+            if not self.hass.states.is_state(self._irrigation_on, 'on'):
+                return None
+
+        inputs = self._schedule_inputs()
+        if inputs is None:
+            return None
+        return next_run(dt_util.now(), *inputs)
+
+    def _schedule_inputs(self):
+        """ the start time, run days, run frequency and last ran, None when not available """
+        start_time = self.hass.states.get(self._start_time)
+        if start_time is None:
+            return None
+        start_time = dt_util.parse_time(start_time.state)
+        if start_time is None:
+            _LOGGER.warning('%s is not a valid time', self._start_time)
+            return None
+
+        run_days = None
+        if self._run_days is not None:
+            run_days = self.hass.states.get(self._run_days)
+            if run_days is None:
+                return None
+            run_days = run_days.state
+
+        run_freq = None
+        if self._run_freq is not None:
+            run_freq = self.hass.states.get(self._run_freq)
+            if run_freq is None:
+                return None
+            run_freq = parse_run_freq(run_freq.state)
+
+        last_ran = self._history.last_ran(self.entity_id)
+        if last_ran is None and self._last_run is not None:
+            last_ran = dt_util.parse_date(self._last_run)
+
+        return start_time, run_days, run_freq, last_ran
+
+    @callback
+    def _async_scheduled_start(self, now):
+        """ the start time has been reached """
+        if self._running == False:
+            self._triggered_manually = False
+            self._scheduled_for      = self._next_run
+            self.hass.async_create_task(self.async_turn_on())
+        self.async_schedule_next_run()
 
 
     @property
@@ -298,241 +674,952 @@ class IrrigationProgram(SwitchEntity, RestoreEntity):
         """Return the state attributes.
         Implemented by component base class.
         """
-        return self._state_attributes
+        ATTRS = {}
+        ATTRS [ATTR_LAST_RAN]  = self._last_run
+        ATTRS [ATTR_REMAINING] = self._timer.remaining
+        if self._next_run is not None:
+            ATTRS [ATTR_NEXT_RUN] = self._next_run.isoformat()
+        if self._plan is not None:
+            ATTRS [ATTR_PLAN]            = [x.as_dict() for x in self._plan]
+            ATTRS [ATTR_PLANNED_RUNTIME] = self._planned_runtime
+        if self._interleaved_plan is not None:
+            ATTRS [ATTR_INTERLEAVED_PLAN] = self._interleaved_plan
+        latency = {z: self._valves.latency[z] for z in self.zone_entities
+                   if z in self._valves.latency}
+        if latency:
+            ATTRS [ATTR_VALVE_LATENCY] = latency
+        if self._interrupted:
+            ATTRS [ATTR_INTERRUPTED] = {self._zones[x].get(CONF_NAME): reason
+                                        for x, reason in self._interrupted.items()}
+        if self._stop_reason is not None:
+            ATTRS [ATTR_STOP_REASON] = self._stop_reason
+        if self._flow_alerts:
+            ATTRS [ATTR_FLOW_ALERTS] = self._flow_alerts
+        position = self._run_queue.position(self)
+        if position is not None:
+            ATTRS [ATTR_QUEUE_POSITION] = position
+            ATTRS [ATTR_WAITING_FOR]    = self._run_queue.waiting_for(self)
+        locks = self._run_queue.held(self)
+        if locks:
+            ATTRS [ATTR_ZONE_LOCKS] = sorted(locks)
+        return ATTRS
 
-    async def async_update(self):
+    @callback
+    def async_write_ha_state(self):
+        """ count the state writes made by a run """
+        if self._stats is not None and self._running:
+            self._stats.state_writes += 1
+        super().async_write_ha_state()
+        async_dispatcher_send(self.hass, SIGNAL_STATUS, self)
+
+    def status(self):
+        """ the compact state of the program for the controller sensor """
+        status = {CONF_NAME: self._program_name,
+                  'state': STATE_ON if self._state else STATE_OFF}
+        if self._phase is not None:
+            status['phase'] = self._phase
+        if self._active and self._phase != PHASE_QUEUED:
+            zones = [self._zones[x] for x in self._active]
+            status[ATTR_ZONES] = [x.get(CONF_NAME) for x in zones]
+            if self._phase == PHASE_WATER:
+                status[ATTR_ICON] = zones[0].get(ATTR_ICON)
+            else:
+                status[ATTR_ICON] = self._wait_icon
+        if self._ends is not None:
+            status['ends'] = self._ends.isoformat()
+        if self._next_run is not None:
+            status[ATTR_NEXT_RUN] = self._next_run.isoformat()
+        position = self._run_queue.position(self)
+        if position is not None:
+            status[ATTR_QUEUE_POSITION] = position
+        locks = self._run_queue.held(self)
+        if locks:
+            status[ATTR_ZONE_LOCKS] = sorted(locks)
+        return status
+
+    def _set_runtime(self, seconds):
+        """ the remaining time counts down to ends """
+        self._timer.set_runtime(seconds)
+        self._ends = dt_util.utcnow().replace(microsecond=0) + timedelta(seconds=seconds)
 
-        """Update the state from the template."""
-        if self._running == False:
-            if self._template.async_render():
-                self._triggered_manually = False
-                loop = asyncio.get_event_loop()
-                loop.create_task(self.async_turn_on())
+    @property
+    def device_id(self):
+        return self._device_id
 
-        self.async_write_ha_state()
+    @property
+    def priority(self):
+        return self._priority
+
+    @property
+    def planned_runtime(self):
+        return self._planned_runtime
+
+    @property
+    def start_time_entity(self):
+        return self._start_time
+
+    def window_job(self):
+        """ the runtime and peak valve/flow use of the next scheduled run, nothing is published """
+        steps = [x for x in (self._compile_step(index, zone, False)
+                             for index, zone in enumerate(self._zones))
+                 if x.skip is None]
+        if self._planned_mode():
+            cycles  = plan_cycles([x.as_cycle() for x in steps],
+                                  self._max_valves,
+                                  self._max_flow,
+                                  self._interleave)
+            runtime = makespan(cycles)
+            valves, flow = peak_usage(cycles, {x.index: x.flow or 0 for x in steps})
+        else:
+            runtime = sequential_runtime(steps, self._handover)
+            valves  = 1 if steps else 0
+            flow    = max((x.flow or 0 for x in steps), default=0)
+            pairs   = handovers(steps, self._handover)
+            if pairs:
+                """ two zones are open during a handover """
+                valves = 2
+                flow   = max(flow, max((x.flow or 0) + (pairs[x.index].flow or 0)
+                                       for x in steps if x.index in pairs))
+        return {'key': self.entity_id,
+                'runtime': runtime,
+                'valves': valves,
+                'flow': flow,
+                'zones': {x.zone for x in steps},
+                'priority': self._priority}
+
+    def projection_job(self):
+        """ the schedule and the valve seconds and litres of each zone per run, nothing is published """
+        inputs = self._schedule_inputs() or (None, None, None, None)
+        zones  = []
+        for index, zone in enumerate(self._zones):
+            """ the rain sensor is expected to skip the zone, not evaluated now """
+            step = self._compile_step(index, zone, True)
+            if step.skip is not None:
+                continue
+            seconds = step.water * step.repeat
+            litres  = step.volume
+            if litres is None and step.flow is not None:
+                litres = step.flow * seconds / 60
+            ignore  = zone.get(ATTR_IGNORE_RAIN_SENSOR)
+            zones.append({'zone': step.zone,
+                          'seconds': seconds,
+                          'litres': litres,
+                          'rain': zone.get(ATTR_RAIN_SENSOR) is not None
+                                  and not (ignore and self.hass.states.is_state(ignore, 'on'))})
+        return {'key': self.entity_id,
+                'enabled': self._irrigation_on is None
+                           or self.hass.states.is_state(self._irrigation_on, 'on'),
+                'start_time': inputs[0],
+                'run_days': inputs[1],
+                'run_freq': inputs[2],
+                'last_ran': inputs[3],
+                'zones': zones}
+
+    @property
+    def remaining_runtime(self):
+        """ seconds until the current run is expected to finish """
+        if not self._running:
+            return 0
+        remaining = self._timer.remaining
+        if not self._planned_mode() and self._plan is not None and self._active:
+            remaining += sum(x.runtime for x in self._plan
+                             if x.index > self._active[0] and x.index not in self._interrupted)
+        return remaining
+
+    @property
+    def run_stats(self):
+        """ telemetry of the current run """
+        if self._stats is None or not self._running:
+            return None
+        return self._stats.as_dict()
 
     async def async_turn_on(self, **kwargs):
-        
-        """ Initialise for stop programs service call """
-        p_icon        = self._icon
-        p_name        = self._name
+        await self._async_run()
+
+    async def _async_recover(self):
+        """ make the zones safe then apply the resume policy to an interrupted run """
+        checkpoint = self._checkpoints.get(self.entity_id)
+        await self.async_turn_off()
+        if checkpoint is None:
+            return
+        self._checkpoints.async_clear(self.entity_id)
+
+        if self._resume == RESUME_ABANDON:
+            _LOGGER.info('%s was interrupted, the run is abandoned', self.entity_id)
+            return
+
+        age = dt_util.utcnow() - dt_util.parse_datetime(checkpoint['at'])
+        if age > timedelta(minutes=self._resume_window):
+            _LOGGER.warning('%s was interrupted %s ago, outside the resume window',
+                            self.entity_id, age)
+            return
+
+        self._triggered_manually = checkpoint['manual']
+        if self._resume == RESUME_RESTART:
+            _LOGGER.info('%s was interrupted, restarting the run', self.entity_id)
+            await self._async_run()
+        elif self._restore_plan(checkpoint) is None:
+            _LOGGER.warning('%s zones or run mode have changed, the interrupted run is abandoned',
+                            self.entity_id)
+            self._triggered_manually = True
+        else:
+            _LOGGER.info('%s was interrupted, resuming the run', self.entity_id)
+            await self._async_run(checkpoint)
+
+    async def _async_run(self, checkpoint=None):
+
+        if self._running:
+            _LOGGER.debug('%s is already running or queued', self.entity_id)
+            return
+        self._idle.clear()
+        try:
+            await self._async_queue_and_run(checkpoint)
+        finally:
+            self._idle.set()
+
+    async def async_wait_idle(self):
+        """ wait for a run that is stopping to finish """
+        await self._idle.wait()
+
+    async def _async_queue_and_run(self, checkpoint):
+
+        """ Initialise for the run """
         self._running = True
         self._stop    = False
         self._state   = True
-        self.async_schedule_update_ha_state()
-        step = 1
-
-        """ stop all programs but this one """
-        DATA = {'ignore': self._device_id}
-        await self.hass.services.async_call(DOMAIN,
-                                            'stop_programs',
-                                            DATA)
-        await asyncio.sleep(1)
-
-        _LOGGER.debug('-------------------- on execution: %s ----------------------------',self._name)
-        _LOGGER.debug('Template: %s', self._template)
-        if self._start_time is not None:
-            _LOGGER.debug('Start Time %s: %s',self._start_time, self.hass.states.get(self._start_time))
-        if self._irrigation_on is not None:
-            _LOGGER.debug('Irrigation on %s: %s',self._irrigation_on, self.hass.states.get(self._irrigation_on))
-        if self._run_days is not None:
-            _LOGGER.debug('Run Days %s: %s',self._run_days, self.hass.states.get(self._run_days))
-        if self._run_freq is not None:
-            _LOGGER.debug('Run Frequency %s: %s',self._run_freq, self.hass.states.get(self._run_freq))
+        self._interrupted = {}
+        self._flow_alerts = {}
+        self._stop_reason = None
+        self._stats   = RunStats(self.entity_id, self._timer.loop, self._scheduled_for)
+        self._scheduled_for = None
+        self._timer.reset()
+        self.async_write_ha_state()
+
+        try:
+            """ the valves and flow counted against the budget shared by concurrent programs """
+            demand = (0, 0)
+            if self._run_queue.budgeted:
+                job    = self.window_job()
+                demand = (job['valves'], job['flow'])
+
+            """ wait for the zones, a preempted program has closed them when they are given """
+            if self._queue_policy != POLICY_SKIP and self._run_queue.blocked(self.zone_entities, demand):
+                """ the estimated start of the programs queued behind this one """
+                self._build_plan(self._triggered_manually)
+                self._phase = PHASE_QUEUED
+                self.async_write_ha_state()
+            with self._stats.phase('queue'):
+                merged = await self._run_queue.async_acquire(
+                    self, self.zone_entities, self._priority, self._queue_policy, demand)
+            self._phase = None
+            if merged is None:
+                """ stopped while queued """
+                return
+
+            try:
+                await self._async_run_program(checkpoint, merged)
+            finally:
+                """ hand the zones to the waiting programs """
+                self._run_queue.async_release(
+                    self, [z for z, x in self._stats.zones.items() if x['actual'] > 0])
+        finally:
+            """ back to idle however the run ended, a failed run can start again """
+            if self._running:
+                self._phase                 = None
+                self._state                 = False
+                self._running               = False
+                self._stop                  = False
+                self._triggered_manually    = True
+                self.async_write_ha_state()
+
+    async def _async_run_program(self, checkpoint, merged):
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug('-------------------- on execution: %s ----------------------------',self._name)
+            _LOGGER.debug('Next run: %s', self._next_run)
+            if self._start_time is not None:
+                _LOGGER.debug('Start Time %s: %s',self._start_time, self.hass.states.get(self._start_time))
+            if self._irrigation_on is not None:
+                _LOGGER.debug('Irrigation on %s: %s',self._irrigation_on, self.hass.states.get(self._irrigation_on))
+            if self._run_days is not None:
+                _LOGGER.debug('Run Days %s: %s',self._run_days, self.hass.states.get(self._run_days))
+            if self._run_freq is not None:
+                _LOGGER.debug('Run Frequency %s: %s',self._run_freq, self.hass.states.get(self._run_freq))
 
         """ Iterate through all the defined zones """
-        for zone in self._zones:
-            z_rain_sen_v  = zone.get(ATTR_RAIN_SENSOR)
-            z_ignore_v    = zone.get(ATTR_IGNORE_RAIN_SENSOR)
-            z_zone        = zone.get(ATTR_ZONE)
-            z_water_v     = zone.get(ATTR_WATER)
-            z_water_adj_v = zone.get(ATTR_WATER_ADJUST)
-            z_wait_v      = zone.get(ATTR_WAIT)
-            z_repeat_v    = zone.get(ATTR_REPEAT)
-            z_icon        = zone.get(ATTR_ICON)
-            z_name        = zone.get(CONF_NAME)
-            z_ignore_bool = False
-
-            if  z_ignore_v is not None and self.hass.states.async_available(z_ignore_v):
-                _LOGGER.error('%s not found',z_ignore_v)
-                continue
-            if  z_water_v is not None and self.hass.states.async_available(z_water_v):
-                _LOGGER.error('%s not found',z_water_v)
-                continue
-            if  z_water_adj_v is not None and self.hass.states.async_available(z_water_adj_v):
-                _LOGGER.error('%s not found',z_water_adj_v)
-                continue
-            if  z_rain_sen_v is not None and self.hass.states.async_available(z_rain_sen_v):
-                _LOGGER.error('%s not found',z_rain_sen_v)
-                continue
-            if  z_wait_v is not None and self.hass.states.async_available(z_wait_v):
-                _LOGGER.error('%s not found',z_wait_v)
-            if  z_repeat_v is not None and self.hass.states.async_available(z_repeat_v):
-                _LOGGER.error('%s not found',z_repeat_v)
+        resume = None
+        with self._stats.phase('plan'):
+            if checkpoint is None:
+                plan = self._build_plan(self._triggered_manually)
+            else:
+                plan   = self._restore_plan(checkpoint)
+                resume = self._resume_point(checkpoint)
+            for step in plan:
+                if step.skip is None and step.zone in merged:
+                    """ watered by a program this run waited for, or in use """
+                    step.skip = SKIP_LOCKED if self._queue_policy == POLICY_SKIP else SKIP_MERGED
+        self._stats.plan(plan)
+        self._start_checkpoint(plan)
+        self.async_write_ha_state()
+
+        unsub_rain = self._watch_rain(plan)
+        try:
+            with self._stats.phase('run'):
+                if self._planned_mode():
+                    await self._async_run_planned(plan, resume)
+                else:
+                    await self._async_run_sequential(plan, resume)
+        finally:
+            unsub_rain()
+            self._active = ()
 
-            _LOGGER.debug('------------ on execution zone: %s--------', z_zone)
-            raining = False
+        """ end of for zone loop """
 
-            if self._triggered_manually == True:
-                _LOGGER.debug('------------Irrigation Manually triggered, rain sensor not evaluated--------')
-            else:
-                """ assess the rain sensor """
-                if z_rain_sen_v is not None:
-                    _LOGGER.debug('rain sensor: %s',self.hass.states.get(z_rain_sen_v))
-                    if  self.hass.states.get(z_rain_sen_v) == None:
-                        _LOGGER.warning('rain sensor: %s not found, check your configuration',z_rain_sen_v)
-                    else:
-                        raining = self.hass.states.is_state(z_rain_sen_v,'on')
-                        _LOGGER.debug('raining:%s',raining)
-                """ assess the ignore rain sensor """
-                if  z_ignore_v is not None:
-                    _LOGGER.debug('Ignore rain sensor: %s',self.hass.states.get(z_ignore_v))
-                    if  self.hass.states.get(z_ignore_v) == None:
-                        _LOGGER.warning('Ignore rain sensor: %s not found, check your configuration',z_ignore_v)
-                    else:
-                         z_ignore_bool = self.hass.states.is_state(z_ignore_v,'on')
-                """ process rain sensor """
-                if not z_ignore_bool: #ignore rain sensor
-                    _LOGGER.debug('Do not ignore the rain sensor')
-                    if raining:
-                        _LOGGER.debug('raining do not run, continue to next zone')
-                        ''' set the icon to Raining - for a few seconds '''
-                        self._icon = self._rain_icon
-                        self._name = self._program_name + "-" + z_name
-                        self.async_schedule_update_ha_state()
-                        await asyncio.sleep(5)
-                        self._icon = p_icon
-                        self._name = self._program_name
-                        self.async_schedule_update_ha_state()
-                        await asyncio.sleep(1)
-                        continue
+        self._timer.clear_runtime()
+        self._ends       = None
+        self._phase      = None
+        self._checkpoint = None
+        self._checkpoints.async_clear(self.entity_id)
+
+        """ publish the telemetry of the run """
+        self._stats.finish(self._stop)
+
+        """ add the run to the history, it holds the last run date """
+        self._record_history(plan)
+        if not self._triggered_manually:
+            self._last_run = self._history.last_ran(self.entity_id).isoformat()
+        self.hass.data[DOMAIN][DATA_RUN_STATS][self.entity_id] = self._stats.as_dict()
+        async_dispatcher_send(self.hass, SIGNAL_RUN_STATS, self.entity_id)
+
+        self._state                 = False
+        self._running               = False
+        self._stop                  = False
+        self._triggered_manually    = True
+
+        """ last ran may have changed the next run """
+        self.async_schedule_next_run()
+        _LOGGER.debug('program run complete')
+
+
+    def _compile_step(self, index, zone, manual):
+        """ evaluate the entities of a zone once and return its ZoneStep """
+        step          = ZoneStep(index,
+                                 zone.get(ATTR_ZONE),
+                                 zone.get(CONF_NAME),
+                                 zone.get(ATTR_ICON),
+                                 flow=zone.get(ATTR_FLOW))
+        z_rain_sen_v  = zone.get(ATTR_RAIN_SENSOR)
+        z_ignore_v    = zone.get(ATTR_IGNORE_RAIN_SENSOR)
+        z_zone        = zone.get(ATTR_ZONE)
+        z_water_v     = zone.get(ATTR_WATER)
+        z_water_adj_v = zone.get(ATTR_WATER_ADJUST)
+        z_wait_v      = zone.get(ATTR_WAIT)
+        z_repeat_v    = zone.get(ATTR_REPEAT)
+        z_volume_v    = zone.get(ATTR_VOLUME)
+        z_ignore_bool = False
+
+        if  self._refs.is_missing(z_zone):
+            _LOGGER.error('%s not found',z_zone)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_ignore_v is not None and self._refs.is_missing(z_ignore_v):
+            _LOGGER.error('%s not found',z_ignore_v)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_water_v is not None and self._refs.is_missing(z_water_v):
+            _LOGGER.error('%s not found',z_water_v)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_volume_v is not None and self._refs.is_missing(z_volume_v):
+            _LOGGER.error('%s not found',z_volume_v)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_water_adj_v is not None and self._refs.is_missing(z_water_adj_v):
+            _LOGGER.error('%s not found',z_water_adj_v)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_rain_sen_v is not None and self._refs.is_missing(z_rain_sen_v):
+            _LOGGER.error('%s not found',z_rain_sen_v)
+            step.skip = SKIP_MISSING
+            return step
+        if  z_wait_v is not None and self._refs.is_missing(z_wait_v):
+            _LOGGER.error('%s not found',z_wait_v)
+        if  z_repeat_v is not None and self._refs.is_missing(z_repeat_v):
+            _LOGGER.error('%s not found',z_repeat_v)
+
+        _LOGGER.debug('------------ on execution zone: %s--------', z_zone)
+        raining = False
+
+        if manual == True:
+            _LOGGER.debug('------------Irrigation Manually triggered, rain sensor not evaluated--------')
+        else:
+            """ assess the rain sensor """
+            if z_rain_sen_v is not None:
+                _LOGGER.debug('rain sensor: %s',self.hass.states.get(z_rain_sen_v))
+                if  self.hass.states.get(z_rain_sen_v) == None:
+                    _LOGGER.warning('rain sensor: %s not found, check your configuration',z_rain_sen_v)
+                else:
+                    raining = self.hass.states.is_state(z_rain_sen_v,'on')
+                    _LOGGER.debug('raining:%s',raining)
+            """ assess the ignore rain sensor """
+            if  z_ignore_v is not None:
+                _LOGGER.debug('Ignore rain sensor: %s',self.hass.states.get(z_ignore_v))
+                if  self.hass.states.get(z_ignore_v) == None:
+                    _LOGGER.warning('Ignore rain sensor: %s not found, check your configuration',z_ignore_v)
+                else:
+                     z_ignore_bool = self.hass.states.is_state(z_ignore_v,'on')
+            """ process rain sensor """
+            if not z_ignore_bool: #ignore rain sensor
+                _LOGGER.debug('Do not ignore the rain sensor')
+                if raining:
+                    _LOGGER.debug('raining do not run, continue to next zone')
+                    step.skip = SKIP_RAIN
+                    return step
+
+        """ factor to adjust watering time """
+        z_water_adj = 1
+        if z_water_adj_v is not None:
+            z_water_adj = float(self.hass.states.get(z_water_adj_v).state)
+            _LOGGER.debug('watering adjustment factor is %s', z_water_adj)
+        if zone.get(ATTR_CROP_COEFFICIENT) is not None and self._et.configured:
+            z_water_adj = z_water_adj * self._et.factor() * zone.get(ATTR_CROP_COEFFICIENT)
+            _LOGGER.debug('evapotranspiration adjustment factor is %s', z_water_adj)
+
+        z_water = math.ceil(int(float(self.hass.states.get(z_water_v).state)) * float(z_water_adj))
+        if z_water == 0:
+            _LOGGER.debug('watering time has been adjusted to 0 do not run zone %s',z_zone)
+            step.skip = SKIP_ADJUSTED
+            return step
+
+        z_wait = 0
+        if z_wait_v is not None:
+            z_wait = int(float(self.hass.states.get(z_wait_v).state))
+
+        z_repeat = 1
+        if z_repeat_v is not None:
+            z_repeat = int(float(self.hass.states.get(z_repeat_v).state))
+            if z_repeat == 0:
+                z_repeat = 1
+
+        """ water to a volume, the water time is the limit """
+        if z_volume_v is not None:
+            step.volume = round(float(self.hass.states.get(z_volume_v).state) * float(z_water_adj), 1)
+            if step.volume <= 0:
+                _LOGGER.debug('volume has been adjusted to 0 do not run zone %s',z_zone)
+                step.skip = SKIP_ADJUSTED
+                return step
+
+        _LOGGER.debug('Start water:%s, water_adj:%s wait:%s, repeat:%s', z_water, z_water_adj, z_wait, z_repeat)
+        step.water  = z_water * 60
+        step.wait   = z_wait * 60
+        step.repeat = z_repeat
+        return step
+
+    def _resolve_plan(self, manual):
+        """ resolve every zone, returns the plan and its runtime without publishing them """
+        plan = tuple(self._compile_step(index, zone, manual)
+                     for index, zone in enumerate(self._zones))
+
+        if self._planned_mode():
+            runtime = makespan(plan_cycles(
+                [x.as_cycle() for x in plan if x.skip is None],
+                self._max_valves,
+                self._max_flow,
+                self._interleave))
+        else:
+            runtime = sequential_runtime(plan, self._handover)
+        return plan, runtime
+
+    def _build_plan(self, manual):
+        """ resolve every zone once at the start of a run """
+        self._plan, self._planned_runtime = self._resolve_plan(manual)
+        return self._plan
+
+    def _record_history(self, plan):
+        """ the seconds each zone watered, litres when its flow is known """
+        flows = {step.zone: step.flow for step in plan}
+        zones = {}
+        for zone, stats in self._stats.zones.items():
+            record = {'seconds': stats['actual'], 'skip': stats['skip']}
+            if stats['litres']:
+                record['litres'] = round(stats['litres'], 1)
+            elif flows.get(zone) is not None:
+                record['litres'] = round(flows[zone] * stats['actual'] / 60, 1)
+            if zone in self._stats.first_open:
+                record['start'] = self._stats.first_open[zone].timestamp()
+            zones[zone] = record
+        self._history.async_record(self.entity_id, zones,
+                                   self._stats.started,
+                                   not self._triggered_manually)
+
+    def _watch_rain(self, plan):
+        """Interrupt the zones of a scheduled run when their rain sensor
+        turns on and stays on for the debounce time.
+
+        Returns the function that stops watching.
+        """
+        sensors = {}
+        if self._rain_interrupt and not self._triggered_manually:
+            for step in plan:
+                if step.skip is not None:
+                    continue
+                sensor = self._zones[step.index].get(ATTR_RAIN_SENSOR)
+                ignore = self._zones[step.index].get(ATTR_IGNORE_RAIN_SENSOR)
+                if sensor is None:
+                    continue
+                if ignore is not None and self.hass.states.is_state(ignore, STATE_ON):
+                    continue
+                sensors.setdefault(sensor, []).append(step.index)
+        if not sensors:
+            return lambda: None
+
+        pending = {}
+
+        @callback
+        def rain_confirmed(sensor, now=None):
+            pending.pop(sensor, None)
+            if self.hass.states.is_state(sensor, STATE_ON):
+                self._interrupt(sensors[sensor], SKIP_RAIN)
+
+        @callback
+        def rain_changed(event):
+            sensor    = event.data.get(ATTR_ENTITY_ID)
+            new_state = event.data.get('new_state')
+            raining   = new_state is not None and new_state.state == STATE_ON
+            if not raining:
+                cancel = pending.pop(sensor, None)
+                if cancel is not None:
+                    cancel()
+            elif sensor not in pending:
+                if self._rain_debounce:
+                    pending[sensor] = async_call_later(
+                        self.hass, self._rain_debounce,
+                        lambda now: rain_confirmed(sensor, now))
+                else:
+                    rain_confirmed(sensor)
+
+        unsub = async_track_state_change_event(self.hass, list(sensors), rain_changed)
+
+        def stop_watching():
+            unsub()
+            for cancel in pending.values():
+                cancel()
+            pending.clear()
+        return stop_watching
+
+    @callback
+    def _interrupt(self, indexes, reason):
+        """ stop zones of the running program, an active zone is closed at once """
+        indexes = [x for x in indexes if x not in self._interrupted]
+        if not indexes:
+            return
+        for x in indexes:
+            self._interrupted[x] = reason
+        _LOGGER.info('%s interrupted %s: %s', self.entity_id,
+                     [self._zones[x].get(ATTR_ZONE) for x in indexes], reason)
+        if any(x in self._active for x in indexes):
+            self._timer.interrupt()
+        self.async_write_ha_state()
+
+    def _restore_plan(self, checkpoint):
+        """ the plan of an interrupted run, None if the zones or run mode have changed """
+        if checkpoint.get('mode') != self._run_mode():
+            """ the progress saved by the other run mode cannot be resumed """
+            return None
+        plan = []
+        for index, zone, water, wait, repeat, skip, *volume in checkpoint[ATTR_PLAN]:
+            if index >= len(self._zones) or self._zones[index].get(ATTR_ZONE) != zone:
+                return None
+            config = self._zones[index]
+            plan.append(ZoneStep(index, zone,
+                                 config.get(CONF_NAME),
+                                 config.get(ATTR_ICON),
+                                 water, wait, repeat,
+                                 config.get(ATTR_FLOW),
+                                 skip,
+                                 volume[0] if volume else None))
+        self._plan = tuple(plan)
+        return self._plan
+
+    def _resume_point(self, checkpoint):
+        """The progress of an interrupted run.
+
+        The zones are left as they were while Home Assistant was down, the
+        phase in progress is treated as having continued until the restart.
+        """
+        elapsed = dt_util.utcnow() - dt_util.parse_datetime(checkpoint['at'])
+        left    = max(0, checkpoint['left'] - int(elapsed.total_seconds()))
+        if 'offset' in checkpoint:
+            return {'offset': checkpoint['offset'] + checkpoint['left'] - left}
+        return {ATTR_ZONE: checkpoint[ATTR_ZONE],
+                'phase': (checkpoint[ATTR_REPEAT], checkpoint['phase'], left)}
+
+    def _start_checkpoint(self, plan):
+        """ the part of the checkpoint that stays the same for the whole run """
+        if self._resume == RESUME_ABANDON:
+            self._checkpoint = None
+            return
+        self._checkpoint = {
+            'manual': self._triggered_manually,
+            'mode': self._run_mode(),
+            ATTR_PLAN: [x.as_checkpoint() for x in plan],
+            }
+
+    @callback
+    def _save_checkpoint(self, **progress):
+        """ record the progress of the run at a phase change """
+        if self._checkpoint is None:
+            return
+        self._checkpoint.update(progress, at=dt_util.utcnow().isoformat())
+        self._checkpoints.async_save(self.entity_id, self._checkpoint)
+
+    def _planned_mode(self):
+        """ the zones are run from a cycle plan rather than one at a time """
+        return self._interleave or self._max_valves > 1 or self._max_flow
+
+    def _run_mode(self):
+        """ the options a planned run's offsets depend on, None when run one zone at a time """
+        if not self._planned_mode():
+            return None
+        return [self._interleave, self._max_valves, self._max_flow]
+
+    async def async_get_plan(self):
+        """Publish the plan the next scheduled run would use, no valves are
+        started. The attributes of a run in progress are left as they are.
+        """
+        plan, runtime = self._resolve_plan(False)
+        if not self._running:
+            self._plan            = plan
+            self._planned_runtime = runtime
+            self.async_write_ha_state()
+        self.hass.bus.async_fire(EVENT_PLAN, {
+            ATTR_ENTITY_ID: self.entity_id,
+            ATTR_PLAN: [x.as_dict() for x in plan],
+            ATTR_PLANNED_RUNTIME: runtime,
+            })
+
+    async def _async_run_sequential(self, plan, resume=None):
+        """ run each zone in turn, water/wait/repeat """
+        handover = handovers(plan, self._handover)
+        early    = None
+        for step in plan:
+            z_zone        = step.zone
 
             if self._stop == True:
                 break
 
-            """ factor to adjust watering time """
-            z_water_adj = 1
-            if z_water_adj_v is not None:
-                z_water_adj = float(self.hass.states.get(z_water_adj_v).state)
-                _LOGGER.debug('watering adjustment factor is %s', z_water_adj)
-
-            z_water = math.ceil(int(float(self.hass.states.get(z_water_v).state)) * float(z_water_adj))
-            if z_water == 0:
-                _LOGGER.debug('watering time has been adjusted to 0 do not run zone %s',z_zone)
+            if step.skip is not None:
+                """ the skip reason is published in the plan attribute """
                 continue
-                
-            z_wait = 0
-            if z_wait_v is not None:
-                z_wait = int(float(self.hass.states.get(z_wait_v).state))
 
-            z_repeat = 1
-            if z_repeat_v is not None:
-                z_repeat = int(float(self.hass.states.get(z_repeat_v).state))
-                if z_repeat == 0:
-                    z_repeat = 1
+            if step.index in self._interrupted:
+                if early is not None and early[0] is step:
+                    self._stop_meter(z_zone, early[2])
+                    await self._async_close(z_zone)
+                    early = None
+                continue
 
-            _LOGGER.debug('Start water:%s, water_adj:%s wait:%s, repeat:%s', z_water, z_water_adj, z_wait, z_repeat)
+            """ zones finished before an interruption are not run again """
+            phases = step.phases()
+            if resume is not None:
+                if step.index < resume[ATTR_ZONE]:
+                    continue
+                if step.index == resume[ATTR_ZONE]:
+                    phases = step.phases(resume['phase'])
+
+            """ a zone opened during the handover has already watered,
+                its meter has been running since it opened """
+            carried = None
+            if early is not None and early[0] is step:
+                i, phase, seconds = phases[0]
+                phases[0] = (i, phase, max(0, seconds - round(self._timer.loop.time() - early[1])))
+                carried   = early[2]
+            early = None
 
-            self._runtime = (((z_water + z_wait) * z_repeat) - z_wait) * 60
             """Set time remaining attribute """
-            ATTRS = {}
-            ATTRS [ATTR_LAST_RAN] = self._last_run
-            ATTRS [ATTR_REMAINING] = self._runtime
-            setattr(self, '_state_attributes', ATTRS)
- 
+            self._set_runtime(sum(x[2] for x in phases))
+
             """ run the watering cycle, water/wait/repeat """
-            DATA = {ATTR_ENTITY_ID: z_zone}
-            _LOGGER.debug('switch data:%s',DATA)
-            for i in range(z_repeat, 0, -1):
-                _LOGGER.debug('run switch repeat:%s',i)
-                if self._stop == True:
+            self._active = (step.index,)
+            for pos, (i, phase, seconds) in enumerate(phases):
+                _LOGGER.debug('run switch repeat:%s %s',i, phase)
+                if self._stop == True or step.index in self._interrupted:
                     break
-                self._name = self._program_name + "-" + z_name
-                if self.hass.states.is_state(z_zone,'off'):
-                    await self.hass.services.async_call(CONST_SWITCH,
-                                                        SERVICE_TURN_ON,
-                                                        DATA)
-
-                self._icon = z_icon
-                self.async_schedule_update_ha_state()
-
-                water = z_water * 60
-                for w in range(0,water, step):
-                    self._runtime = self._runtime - step
-                    ATTRS = {}
-                    ATTRS [ATTR_LAST_RAN] = self._last_run
-                    ATTRS [ATTR_REMAINING] = self._runtime
-                    setattr(self, '_state_attributes', ATTRS)
-                    self.async_schedule_update_ha_state()
-                    await asyncio.sleep(step)
-                    if self._stop == True:
-                        break
+                self._save_checkpoint(zone=step.index, repeat=i, phase=phase, left=seconds)
 
-                """ turn the switch entity off """
-                if z_wait > 0 and i > 1 and not self._stop:
+                meter = None
+                if phase == PHASE_WATER:
+                    if not await self._async_open(z_zone):
+                        _LOGGER.error('%s did not turn on, continue to next zone', z_zone)
+                        break
+                    meter   = carried or self._start_meter(step)
+                    carried = None
+                    self._phase = PHASE_WATER
+                    self.async_write_ha_state()
+                else:
                     """ Eco mode is enabled """
-                    self._icon = self._wait_icon
-                    self.async_schedule_update_ha_state()
-                    if self.hass.states.is_state(z_zone,'on'):
-                        await self.hass.services.async_call(CONST_SWITCH,
-                                                            SERVICE_TURN_OFF,
-                                                            DATA)
-
-                    wait = z_wait * 60
-                    for w in range(0,wait, step):
-                        self._runtime = self._runtime - step
-                        ATTRS = {}
-                        ATTRS [ATTR_LAST_RAN] = self._last_run
-                        ATTRS [ATTR_REMAINING] = self._runtime
-                        setattr(self, '_state_attributes', ATTRS)
-                        self.async_schedule_update_ha_state()
-                        await asyncio.sleep(step)
-                        if self._stop == True:
-                            break
-
-                if i <= 1 or self._stop:
-                    """ last/only cycle """
-                    if self.hass.states.is_state(z_zone,'on'):
-                        await self.hass.services.async_call(CONST_SWITCH,
-                                                            SERVICE_TURN_OFF,
-                                                            DATA)
-
-        """ end of for zone loop """
+                    self._phase = PHASE_WAIT
+                    self.async_write_ha_state()
+                    await self._async_close(z_zone)
+
+                end       = self._timer.loop.time() + seconds
+                following = handover.get(step.index)
+                if pos == len(phases) - 1 and following is not None and seconds > self._handover:
+                    """ open the next zone before this one closes """
+                    if not await self._timer.async_wait(seconds - self._handover,
+                                                        self._update_interval,
+                                                        self.async_write_ha_state) \
+                            and following.index not in self._interrupted \
+                            and not (meter and meter.reached):
+                        if await self._async_open(following.zone):
+                            early = (following, self._timer.loop.time(),
+                                     self._start_meter(following))
+                            self._active = (step.index, following.index)
+                            self.async_write_ha_state()
+
+                """ wake once at the end of the phase, when stopped, interrupted
+                    or the target volume has been delivered """
+                while self._stop == False and step.index not in self._interrupted \
+                        and not (meter and meter.reached):
+                    if not await self._timer.async_wait(max(0, end - self._timer.loop.time()),
+                                                        self._update_interval,
+                                                        self.async_write_ha_state):
+                        break
+                    if early is not None and early[0].index in self._interrupted:
+                        """ the zone opened for the handover was interrupted """
+                        self._stop_meter(early[0].zone, early[2])
+                        await self._async_close(early[0].zone)
+                        early = None
+                        self._active = (step.index,)
+
+                self._stop_meter(z_zone, meter)
+                if carried is not None:
+                    """ the zone opened early was stopped before it watered """
+                    self._stop_meter(z_zone, carried)
+                    carried = None
+
+            """ last/only cycle, stopped or interrupted """
+            await self._async_close(z_zone)
+            self._active = ()
+
+        """ stopped during a handover """
+        if early is not None:
+            self._stop_meter(early[0].zone, early[2])
+            await self._async_close(early[0].zone)
+
+    def _start_meter(self, step, share=None):
+        """Measure the water delivered to a zone from its flow sensor.
+
+        With a volume each opening of the zone closes once its share of
+        the volume has been delivered, a repeat by default, the water time
+        remains the limit. Returns None when the zone has no flow sensor.
+        """
+        config = self._zones[step.index]
+        sensor = config.get(ATTR_FLOW_SENSOR)
+        if sensor is None:
+            return None
 
-        """Update last run date attribute """
-        if not self._triggered_manually:
-            now            = dt_util.utcnow()
-            time_date      = dt_util.start_of_local_day(dt_util.as_local(now))
-            self._last_run = dt_util.as_local(time_date).date().isoformat()
+        @callback
+        def alert(reason, flow):
+            _LOGGER.warning('%s %s suspected, flow %s expected %s',
+                            config.get(CONF_NAME), reason, flow, step.flow)
+            self._flow_alerts[config.get(CONF_NAME)] = reason
+            self.hass.bus.async_fire(EVENT_FLOW_ALERT, {
+                ATTR_ENTITY_ID: self.entity_id,
+                ATTR_ZONE: step.zone,
+                'alert': reason,
+                ATTR_FLOW: flow,
+                'expected': step.flow,
+                })
+            self.async_write_ha_state()
+
+        meter = VolumeMeter(self.hass,
+                            sensor,
+                            step.volume * (share or 1 / step.repeat) if step.volume else None,
+                            step.flow,
+                            config.get(ATTR_FLOW_TOLERANCE),
+                            self._timer.interrupt,
+                            alert)
+        meter.async_start()
+        return meter
+
+    def _stop_meter(self, zone, meter):
+        """ add the litres measured while the zone was open to the run stats """
+        if meter is not None:
+            self._stats.zones[zone]['litres'] += meter.async_stop()
+
+    async def _async_run_planned(self, plan, resume=None):
+        """Run the zones from a plan built within the valve and flow budget.
+
+        With interleave other zones are watered while a zone soaks, without
+        it as many zones as the budget allows run their own water/wait/repeat
+        cycle at the same time. A zone with a volume closes once the share
+        of the volume of its water time in that opening is delivered.
+        """
+        steps = {x.index: x for x in plan}
+        plan  = plan_cycles([x.as_cycle() for x in plan if x.skip is None],
+                            self._max_valves,
+                            self._max_flow,
+                            self._interleave)
+        total = {}
+        for start, index, water in plan:
+            total[index] = total.get(index, 0) + water
+        offset = 0
+        if resume is not None:
+            """ continue an interrupted run where it was """
+            offset = resume['offset']
+            plan   = resume_cycles(plan, offset)
+        if self._interleave:
+            self._interleaved_plan = [
+                {CONF_NAME: self._zones[index].get(CONF_NAME),
+                 ATTR_ZONE: self._zones[index].get(ATTR_ZONE),
+                 'start': start,
+                 ATTR_WATER: water}
+                for start, index, water in plan]
+            _LOGGER.debug('interleaved plan: %s', self._interleaved_plan)
+
+        """ the remaining time covers the whole program """
+        self._set_runtime(makespan(plan))
+
+        """ valve open/close events, a zone that closes and opens at the
+            same moment is left open """
+        events = {}
+        for start, index, water in plan:
+            for when, action in ((start, SERVICE_TURN_ON), (start + water, SERVICE_TURN_OFF)):
+                key = (when, index)
+                if key in events and events[key] != action:
+                    del events[key]
+                else:
+                    events[key] = action
+        timeline = sorted(events.items(),
+                          key=lambda x: (x[0][0], x[1] == SERVICE_TURN_ON))
+
+        """ the water time of each opening, a zone left open between cycles
+            waters their times in one opening """
+        spans  = {}
+        opened = {}
+        for (when, index), action in timeline:
+            if action == SERVICE_TURN_ON:
+                opened[index] = when
+            elif index in opened:
+                start = opened.pop(index)
+                spans[(start, index)] = when - start
+
+        """ zones switched at the same moment are sent together """
+        moments = {}
+        for (when, index), action in timeline:
+            moments.setdefault(when, ([], []))[action == SERVICE_TURN_ON].append(index)
+
+        base    = self._timer.loop.time()
+        running = []
+        meters  = {}
+        order   = sorted(moments)
+        for pos, when in enumerate(order):
+            closing, opening = moments[when]
+            delay = base + when - self._timer.loop.time()
+            while delay > 0 and not self._stop:
+                self._active = running
+                self._show_running(running)
+                await self._timer.async_wait(delay,
+                                             self._update_interval,
+                                             self.async_write_ha_state)
+                """ close the interrupted zones and the zones that have their
+                    volume, and carry on with the rest """
+                stopped = [x for x in running if x in self._interrupted
+                           or (x in meters and meters[x].reached)]
+                if stopped:
+                    running = [x for x in running if x not in stopped]
+                    for x in stopped:
+                        self._stop_meter(self._zones[x].get(ATTR_ZONE), meters.pop(x, None))
+                    await self._async_close(
+                        [self._zones[x].get(ATTR_ZONE) for x in stopped])
+                delay = base + when - self._timer.loop.time()
+            if self._stop == True:
+                break
 
-        ATTRS = {}
-        ATTRS [ATTR_LAST_RAN] = self._last_run
-        ATTRS [ATTR_REMAINING] = self._runtime
-        setattr(self, '_state_attributes', ATTRS)
+            opening = [x for x in opening if x not in self._interrupted]
+            if closing:
+                running = [x for x in running if x not in closing]
+                for x in closing:
+                    self._stop_meter(self._zones[x].get(ATTR_ZONE), meters.pop(x, None))
+                await self._async_close(
+                    [self._zones[x].get(ATTR_ZONE) for x in closing])
+            if opening:
+                running.extend(opening)
+                await self._async_open(
+                    [self._zones[x].get(ATTR_ZONE) for x in opening])
+                for x in opening:
+                    meter = self._start_meter(steps[x], spans.get((when, x), 0) / total[x])
+                    if meter is not None:
+                        meters[x] = meter
+
+            if pos + 1 < len(order):
+                self._save_checkpoint(offset=offset + when,
+                                      left=order[pos + 1] - when)
+
+        """ close anything left open by a stop """
+        for x in list(meters):
+            self._stop_meter(self._zones[x].get(ATTR_ZONE), meters.pop(x))
+        await self._async_close(
+            [self._zones[x].get(ATTR_ZONE) for x in running])
+
+    async def _async_open(self, zones):
+        """ open zones, recording the command in the run telemetry """
+        if isinstance(zones, str):
+            zones = [zones]
+        pending = [z for z in zones if not self.hass.states.is_state(z, STATE_ON)]
+        start   = self._timer.loop.time()
+        ok = await self._valves.async_turn_on(zones)
+        if self._stats is not None and pending:
+            self._stats.command(self._timer.loop.time() - start)
+            self._stats.opened([z for z in zones if self.hass.states.is_state(z, STATE_ON)])
+        return ok
+
+    async def _async_close(self, zones):
+        """ close zones, recording the command in the run telemetry """
+        if isinstance(zones, str):
+            zones = [zones]
+        pending = [z for z in zones if self.hass.states.is_state(z, STATE_ON)]
+        start   = self._timer.loop.time()
+        ok = await self._valves.async_turn_off(zones)
+        if self._stats is not None and pending:
+            self._stats.command(self._timer.loop.time() - start)
+            self._stats.closed([z for z in zones if not self.hass.states.is_state(z, STATE_ON)])
+        return ok
+
+    def _show_running(self, running):
+        """ publish the zones being watered """
+        self._phase = PHASE_WATER if running else PHASE_WAIT
+        self.async_write_ha_state()
 
-        self._state                 = False
-        self._running               = False
-        self._stop                  = False
-        self._triggered_manually    = True
-        self._icon                  = p_icon
-        self._name                  = self._program_name
+    @property
+    def zone_entities(self):
+        """ the zone switches used by the program """
+        return [zone.get(ATTR_ZONE) for zone in self._zones]
 
+    @callback
+    def async_stop_run(self, reason=STOP_TURN_OFF):
+        """ stop the run without touching the zones """
+        if not self._state and not self._running:
+            return
+        self._stop_reason = reason
+        self._stop = True
+        self._run_queue.async_cancel(self)
+        self._timer.stop()
+        self._state = False
         self.async_write_ha_state()
-        _LOGGER.debug('program run complete')
-
 
     async def async_turn_off(self, **kwargs):
 
-        self._stop = True 
- 
-        for zone in self._zones:
-            z_zone = zone.get(ATTR_ZONE)
-            DATA = {ATTR_ENTITY_ID: z_zone}
-            _LOGGER.debug('Zone switch %s: %s',z_zone, self.hass.states.get(z_zone))
-            if self.hass.states.is_state(z_zone,'on'):
-                await self.hass.services.async_call(CONST_SWITCH,
-                                                    SERVICE_TURN_OFF,
-                                                    DATA)
+        if self._running:
+            self._stop_reason = STOP_TURN_OFF
+        self._stop = True
+        self._timer.stop()
+
+        """ a queued program gives up its place """
+        self._run_queue.async_cancel(self)
+
+        await self._async_close(self.zone_entities)
 
         self._state = False
-        self.async_schedule_update_ha_state()
\ No newline at end of file
+        self.async_write_ha_state()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import asyncio
+import math
+
+
+class PhaseTimer:
+    """Deadline based timer for the water and wait phases of a zone.
+
+    A phase stores a single deadline on the event loop's monotonic clock
+    and sleeps until it expires. The sleep is only interrupted to publish
+    the state at the update interval, when the program is stopped or when
+    a zone is interrupted.
+    """
+
+    def __init__(self, loop=None):
+        self._loop         = loop
+        self._deadline     = None
+        self._run_deadline = None
+        self._wake         = None
+        self._stopped      = False
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def reset(self):
+        """ prepare the timer for a new program run """
+        self._deadline     = None
+        self._run_deadline = None
+        self._wake         = asyncio.Event()
+        self._stopped      = False
+
+    def stop(self):
+        """ wake any sleeping phase immediately, later phases return at once """
+        self._stopped = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def interrupt(self):
+        """ wake the sleeping phase, the next phase sleeps as normal """
+        if self._wake is not None:
+            self._wake.set()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def set_runtime(self, seconds):
+        """ set the deadline used to report the remaining run time """
+        self._run_deadline = self.loop.time() + seconds
+
+    def clear_runtime(self):
+        self._run_deadline = None
+
+    @property
+    def remaining(self):
+        """ seconds left in the current zone run, worked out on read """
+        if self._run_deadline is None:
+            return 0
+        return max(0, math.ceil(self._run_deadline - self.loop.time()))
+
+    @property
+    def phase_remaining(self):
+        """ seconds left in the active phase """
+        if self._deadline is None:
+            return 0
+        return max(0, math.ceil(self._deadline - self.loop.time()))
+
+    async def async_wait(self, seconds, update_interval=None, update_cb=None):
+        """ sleep until the phase deadline, return True if woken early """
+        if self._wake is None:
+            self.reset()
+        if not self._stopped:
+            self._wake.clear()
+        self._deadline = self.loop.time() + seconds
+
+        while not self._wake.is_set():
+            left = self._deadline - self.loop.time()
+            if left <= 0:
+                return False
+            timeout = left
+            if update_interval:
+                timeout = min(left, update_interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                if update_cb is not None and self._deadline > self.loop.time():
+                    update_cb()
+
+        return True
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (
+    CONST_SWITCH,
+    ATTR_MAX_COMMANDS,
+    ATTR_COMMAND_INTERVAL,
+    DFLT_VALVE_TIMEOUT,
+    DFLT_VALVE_RETRIES,
+    DFLT_MAX_COMMANDS,
+    DFLT_COMMAND_INTERVAL,
+)
+
+# Shortcut for the logger
+_LOGGER = logging.getLogger(__name__)
+
+
+class ValveController:
+    """Command queue for the zones of one relay board.
+
+    Each zone is sent its own service call, at most max_commands are in
+    flight at a time and the calls start at least interval seconds apart.
+    A zone that is switched again before its command has gone out is only
+    sent the latest command, every caller is told the command that was
+    sent.
+    """
+
+    def __init__(self, hass, name, max_commands=DFLT_MAX_COMMANDS,
+                 interval=DFLT_COMMAND_INTERVAL):
+        self.hass         = hass
+        self.name         = name
+        self.max_commands = max_commands
+        self.interval     = interval
+        self._pending     = {}
+        self._workers     = 0
+        self._next_send   = 0
+
+    @callback
+    def async_send(self, service, zones):
+        """ queue a command for the zones, returns the service sent to each once they have been sent """
+        futures = []
+        for zone in zones:
+            future = self.hass.loop.create_future()
+            queued = self._pending.get(zone)
+            if queued is None:
+                self._pending[zone] = (service, [future])
+            else:
+                """ the zone keeps its place in the queue """
+                _LOGGER.debug('%s: %s %s replaced by %s', self.name, zone, queued[0], service)
+                self._pending[zone] = (service, queued[1] + [future])
+            futures.append(future)
+        while self._workers < min(self.max_commands, len(self._pending)):
+            self._workers += 1
+            self.hass.async_create_task(self._async_worker())
+        return asyncio.gather(*futures)
+
+    async def _async_worker(self):
+        loop = self.hass.loop
+        try:
+            while self._pending:
+                zone = next(iter(self._pending))
+                service, futures = self._pending.pop(zone)
+
+                """ reserve the next send slot before waiting for it """
+                now   = loop.time()
+                start = max(now, self._next_send)
+                self._next_send = start + self.interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+
+                try:
+                    await self.hass.services.async_call(CONST_SWITCH,
+                                                        service,
+                                                        {ATTR_ENTITY_ID: zone},
+                                                        blocking=True)
+                except Exception as err:
+                    _LOGGER.error('%s: %s %s failed: %s', self.name, service, zone, err)
+                finally:
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(service)
+        finally:
+            self._workers -= 1
+
+
+class ValveActuator:
+    """Switch zone valves and wait for their state to confirm the change.
+
+    A command is complete as soon as the state changed event of every zone
+    arrives. Zones that do not confirm within the timeout are sent the
+    command again up to retries times. The time each zone took to confirm
+    is kept in latency.
+
+    Zones without a controller are switched with a single service call,
+    the zones of each controller go through its queue, the controllers
+    are sent their commands at the same time. A zone whose queued command
+    is replaced by a later one is no longer waited for, it is neither
+    retried nor reported as failed.
+    """
+
+    def __init__(self, hass, timeout=DFLT_VALVE_TIMEOUT, retries=DFLT_VALVE_RETRIES):
+        self.hass        = hass
+        self.timeout     = timeout
+        self.retries     = retries
+        self.latency     = {}
+        self.controllers = {}
+        self.zones       = {}
+
+    def configure(self, controllers, zones):
+        """Set the controller limits and the controller of each zone.
+
+        controllers maps a name to its max_commands and command interval,
+        a controller that is not listed uses the defaults. zones maps a
+        zone to its controller name.
+        """
+        self.zones = dict(zones)
+        for name in set(self.zones.values()) | set(controllers):
+            limits     = controllers.get(name, {})
+            controller = self.controllers.get(name)
+            if controller is None:
+                controller = self.controllers[name] = ValveController(self.hass, name)
+            controller.max_commands = limits.get(ATTR_MAX_COMMANDS, DFLT_MAX_COMMANDS)
+            controller.interval     = limits.get(ATTR_COMMAND_INTERVAL, DFLT_COMMAND_INTERVAL)
+
+    async def async_turn_on(self, zones):
+        """ open a zone or list of zones, returns True once confirmed on """
+        if isinstance(zones, str):
+            zones = [zones]
+        return await self._async_switch(zones, STATE_ON)
+
+    async def async_turn_off(self, zones):
+        """Close the zones that are on.
+
+        The zones without a controller are closed with a single service
+        call, the others go through the queue of their controller where an
+        open still waiting to go out is replaced. zones can contain
+        duplicates, returns True once every zone is confirmed off.
+        """
+        if isinstance(zones, str):
+            zones = [zones]
+        return await self._async_switch(zones, STATE_OFF)
+
+    async def _async_switch(self, zones, target):
+
+        service = SERVICE_TURN_ON if target == STATE_ON else SERVICE_TURN_OFF
+        loop    = self.hass.loop
+        if target == STATE_ON:
+            pending = [z for z in dict.fromkeys(zones)
+                       if not self.hass.states.is_state(z, STATE_ON)]
+        else:
+            pending = [z for z in dict.fromkeys(zones)
+                       if self.hass.states.is_state(z, STATE_ON)]
+
+        for attempt in range(self.retries + 1):
+            if not pending:
+                break
+
+            waiters = {z: loop.create_future() for z in pending}
+
+            @callback
+            def state_changed(event):
+                new_state = event.data.get('new_state')
+                waiter    = waiters.get(event.data.get(ATTR_ENTITY_ID))
+                if waiter is None or waiter.done():
+                    return
+                if new_state is not None and new_state.state == target:
+                    waiter.set_result(loop.time())
+
+            unsub = async_track_state_change_event(self.hass, pending, state_changed)
+            start = loop.time()
+            try:
+                _LOGGER.debug('%s zones: %s', service, pending)
+                sent = await self._async_send(service, pending)
+                for zone in [z for z in pending if sent[z] != service]:
+                    """ replaced in the controller queue by a later command """
+                    if not waiters[zone].done():
+                        _LOGGER.debug('%s %s replaced by %s', service, zone, sent[zone])
+                        waiters.pop(zone).cancel()
+                if waiters:
+                    await asyncio.wait(list(waiters.values()), timeout=self.timeout)
+            finally:
+                unsub()
+
+            pending = []
+            for zone, waiter in waiters.items():
+                if waiter.done():
+                    self.latency[zone] = round(waiter.result() - start, 3)
+                elif self.hass.states.is_state(zone, target):
+                    self.latency[zone] = round(loop.time() - start, 3)
+                else:
+                    waiter.cancel()
+                    pending.append(zone)
+
+            if pending and attempt < self.retries:
+                _LOGGER.warning('%s not confirmed %s within %s seconds, retrying',
+                                pending, target, self.timeout)
+
+        if pending:
+            _LOGGER.error('%s did not confirm %s', pending, target)
+        return not pending
+
+    async def _async_send(self, service, zones):
+        """One call for the zones without a controller, queued per controller
+        otherwise. Returns the service sent to each zone.
+        """
+        groups = {}
+        for zone in zones:
+            groups.setdefault(self.zones.get(zone), []).append(zone)
+        calls = []
+        for name, members in groups.items():
+            if name is None:
+                calls.append(self.hass.services.async_call(CONST_SWITCH,
+                                                           service,
+                                                           {ATTR_ENTITY_ID: members}))
+            else:
+                calls.append(self.controllers[name].async_send(service, members))
+        results = await asyncio.gather(*calls)
+        sent    = {}
+        for (name, members), services in zip(groups.items(), results):
+            if name is None:
+                services = [service] * len(members)
+            sent.update(zip(members, services))
+        return sent
@@ -0,0 +1,59 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+""" the component and the benchmark simulation are imported from the checkout """
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from simulation import Simulation  # noqa: E402
+
+from irrigationprogram import async_setup  # noqa: E402
+from irrigationprogram.const import DOMAIN, DATA_HISTORY  # noqa: E402
+from irrigationprogram.switch import (  # noqa: E402
+    _apply_platform_options,
+    _async_create_entities,
+)
+
+""" the simulation starts at 05:00 UTC """
+START = 5 * 3600
+
+
+def simulate(config, states, seconds, prepare=None, during=None):
+    """Set up the programs of a platform configuration on the virtual clock.
+
+    prepare is called with hass before the programs are added, during is
+    awaited with hass and the programs once they are. Returns the zone
+    commands as (seconds since midnight, zone, state), the programs by
+    entity_id and hass.
+    """
+
+    async def scenario(sim):
+        hass = sim.hass
+        await async_setup(hass, {})
+        for entity_id, state in states.items():
+            hass.states.async_set(entity_id, state)
+        if prepare is not None:
+            prepare(hass)
+        _apply_platform_options(hass, config)
+        entities = await _async_create_entities(hass, config)
+        await sim.async_add_programs(entities)
+        programs = {x.entity_id: x for x in entities}
+        if during is not None:
+            await during(hass, programs)
+        await sim.async_advance(seconds)
+        await hass.data[DOMAIN][DATA_HISTORY].async_flush()
+        return SimpleNamespace(
+            log=[(round(START + when), entity_id, state)
+                 for when, entity_id, state in sim.zone_log],
+            programs=programs,
+            hass=hass)
+
+    return Simulation().run(scenario)
+
+
+@pytest.fixture
+def simulation():
+    return simulate
@@ -0,0 +1,75 @@
+"""Resume a run interrupted by a restart from its checkpoint."""
+import pytest
+
+from conftest import START
+
+from irrigationprogram.const import DOMAIN, DATA_CHECKPOINTS, PHASE_WATER
+from irrigationprogram.switch import PLATFORM_SCHEMA
+
+""" the checkpoint is saved at the start of the simulation """
+SAVED_AT = '2026-01-05T05:00:00+00:00'
+PLAN     = [[0, 'switch.zone_0', 120, 0, 1, None, None],
+            [1, 'switch.zone_1', 120, 0, 1, None, None]]
+
+""" half way through zone 1 of a run one zone at a time """
+SEQUENTIAL = {'manual': False, 'mode': None, 'plan': PLAN, 'at': SAVED_AT,
+              'zone': 1, 'repeat': 1, 'phase': PHASE_WATER, 'left': 60}
+
+""" half way through both zones of a run with max_valves 2 """
+PLANNED = {'manual': False, 'mode': [False, 2, None], 'plan': PLAN, 'at': SAVED_AT,
+           'offset': 60, 'left': 60}
+
+
+def program(**options):
+    states = {'input_datetime.start': '12:00:00',
+              'input_number.water': '2',
+              'switch.zone_0': 'off',
+              'switch.zone_1': 'off'}
+    switch = {'start_time': 'input_datetime.start',
+              'resume': 'resume',
+              'zones': [{'zone': 'switch.zone_%s' % z, 'name': 'Zone %s' % z,
+                         'water': 'input_number.water'} for z in range(2)]}
+    switch.update(options)
+    return PLATFORM_SCHEMA({'platform': DOMAIN, 'switches': {'a': switch}}), states
+
+
+def saved(checkpoint):
+    def prepare(hass):
+        hass.data[DOMAIN][DATA_CHECKPOINTS].async_save('switch.a', dict(checkpoint))
+    return prepare
+
+
+def started(log):
+    return [x for x in log if x[2] == 'on']
+
+
+def test_resume_sequential(simulation):
+    config, states = program()
+    result = simulation(config, states, 600, saved(SEQUENTIAL))
+    assert started(result.log) == [(START, 'switch.zone_1', 'on')]
+    assert (START + 60, 'switch.zone_1', 'off') in result.log
+
+
+def test_resume_planned(simulation):
+    config, states = program(max_valves=2)
+    result = simulation(config, states, 600, saved(PLANNED))
+    assert sorted(started(result.log)) == [(START, 'switch.zone_0', 'on'),
+                                           (START, 'switch.zone_1', 'on')]
+    assert max(x[0] for x in result.log) == START + 60
+
+
+@pytest.mark.parametrize('checkpoint, options', [
+    (PLANNED, {}),
+    (SEQUENTIAL, {'max_valves': 2}),
+    (SEQUENTIAL, {'interleave': True}),
+    (dict(PLANNED, mode=[False, 2, 20.0]), {'max_valves': 2}),
+])
+def test_mode_changed_starts_fresh(simulation, checkpoint, options):
+    """ the run is abandoned, the program is idle and can start again """
+    config, states = program(**options)
+    result = simulation(config, states, 600, saved(checkpoint))
+    assert started(result.log) == []
+    program_a = result.programs['switch.a']
+    assert not program_a.is_on
+    assert not program_a._running
+    assert result.hass.data[DOMAIN][DATA_CHECKPOINTS].get('switch.a') is None
@@ -0,0 +1,92 @@
+"""Estimate the reference evapotranspiration and the water time factor."""
+import pytest
+
+from simulation import Simulation
+
+from irrigationprogram.const import (
+    ET_DAYS,
+    ET_MAX_FACTOR,
+    ET_RAIN,
+    ET_REFERENCE,
+    ET_TEMPERATURE,
+)
+from irrigationprogram.et import EtEngine, reference_et
+
+""" the simulation starts at 05:00, midnight is 19 hours later """
+MIDNIGHT = 19 * 3600
+
+
+def test_reference_et_fao56_example():
+    """ FAO-56 example 18, Brussels on 6 July """
+    et0 = reference_et(12.3, 21.5, 16.9, 187, 50.8, 100, humidity=70.5, wind=2.078, solar=22.07)
+    assert et0 == pytest.approx(3.9, abs=0.05)
+
+
+def test_reference_et_estimates():
+    """ without solar radiation it is estimated from the temperature range """
+    et0 = reference_et(12.3, 21.5, 16.9, 187, 50.8, 100)
+    assert 3 < et0 < 4.5
+    assert reference_et(12.3, 21.5, 16.9, 187, 50.8, 100, humidity=95) < et0
+    assert reference_et(12.3, 21.5, 16.9, 187, 50.8, 100, wind=6) > et0
+
+
+def engine(count, after=None, **config):
+    """Run an engine for a number of days with 10 then 20 °C and 3 mm of rain a day.
+
+    after is called with the engine before the simulation ends.
+    """
+
+    async def scenario(sim):
+        hass = sim.hass
+        hass.states.async_set('sensor.temperature', '10')
+        hass.states.async_set('sensor.rain', '0')
+        et = EtEngine(hass)
+        et.async_configure(dict(config, **{ET_TEMPERATURE: 'sensor.temperature',
+                                           ET_RAIN: 'sensor.rain'}))
+        for day in range(count):
+            await sim.async_advance(3600)
+            hass.states.async_set('sensor.temperature', '20')
+            hass.states.async_set('sensor.rain', '2')
+            await sim.async_advance(3600)
+            """ the rain gauge resets """
+            hass.states.async_set('sensor.rain', '1')
+            await sim.async_advance(MIDNIGHT - 2 * 3600 + 1)
+            hass.states.async_set('sensor.temperature', '10')
+            hass.states.async_set('sensor.rain', '0')
+            await sim.async_advance(5 * 3600 - 1)
+        if after is not None:
+            after(et)
+        return et
+
+    return Simulation().run(scenario)
+
+
+def test_end_of_day():
+    et = engine(1)
+    [(et0, rain)] = et.days()
+    assert rain == 3
+    mean = (10 * 3600 + 20 * (MIDNIGHT - 3600)) / MIDNIGHT
+    assert et0 == round(reference_et(10, 20, mean, 5, et.hass.config.latitude,
+                                     et.hass.config.elevation or 0), 2)
+    assert et.factor() == round(max(0, et0 - rain) / 5, 2)
+
+
+def test_buffer_keeps_the_last_days():
+    days = []
+
+    def resize(et):
+        days.extend(et.days())
+        assert et.snapshot()['rain'] == 9
+        """ a smaller buffer keeps the newest days """
+        et.async_configure(dict(et.config, **{ET_DAYS: 2}))
+
+    et = engine(4, resize, **{ET_DAYS: 3})
+    assert len(days) == 3
+    assert et.days() == days[1:]
+
+
+def test_factor_is_capped():
+    et = engine(1, **{ET_REFERENCE: 0.1, ET_MAX_FACTOR: 1.5})
+    """ the balance is above the reference by more than the cap """
+    assert et.days()[0][0] - 3 > 0.1 * 1.5
+    assert et.factor() == 1.5
@@ -0,0 +1,90 @@
+"""Measure the litres delivered to a zone from a flow sensor."""
+import asyncio
+import logging
+
+from simulation import Simulation
+
+from irrigationprogram.const import FLOW_BLOCKAGE, FLOW_LEAK
+from irrigationprogram.flowmeter import VolumeMeter
+
+
+def simulate(test):
+    async def scenario(sim):
+        return await test(sim.hass, sim.loop)
+    return Simulation().run(scenario)
+
+
+def rate(hass, value, unit='L/min'):
+    hass.states.async_set('sensor.flow', value, {'unit_of_measurement': unit})
+
+
+def test_rate_reaches_the_target_between_readings():
+    async def test(hass, loop):
+        rate(hass, 0)
+        reached = []
+        meter = VolumeMeter(hass, 'sensor.flow', target=15,
+                            reached_cb=lambda: reached.append(loop.time()))
+        start = loop.time()
+        assert meter.async_start()
+        rate(hass, 10)
+        await asyncio.sleep(0)
+        await asyncio.sleep(120)
+        """ 15 litres at 10 L/min, no reading needed at 90 seconds """
+        assert [round(x - start) for x in reached] == [90]
+        """ the meter runs until the valve closes """
+        assert round(meter.async_stop()) == 20
+    simulate(test)
+
+
+def test_rate_units():
+    async def test(hass, loop):
+        rate(hass, 0.5, 'L/s')
+        meter = VolumeMeter(hass, 'sensor.flow')
+        meter.async_start()
+        await asyncio.sleep(60)
+        assert round(meter.async_stop()) == 30
+    simulate(test)
+
+
+def test_total_counter_with_reset():
+    async def test(hass, loop):
+        hass.states.async_set('sensor.total', 2.0, {'unit_of_measurement': 'm³'})
+        meter = VolumeMeter(hass, 'sensor.total')
+        meter.async_start()
+        hass.states.async_set('sensor.total', 2.01, {'unit_of_measurement': 'm³'})
+        await asyncio.sleep(0)
+        """ the counter restarts from zero """
+        hass.states.async_set('sensor.total', 0.005, {'unit_of_measurement': 'm³'})
+        await asyncio.sleep(0)
+        assert round(meter.async_stop()) == 15
+    simulate(test)
+
+
+def test_unknown_unit_is_not_used(caplog):
+    async def test(hass, loop):
+        rate(hass, 5, 'ft³/min')
+        meter = VolumeMeter(hass, 'sensor.flow', target=10)
+        with caplog.at_level(logging.WARNING):
+            assert not meter.async_start()
+        assert 'not a known flow rate or volume' in caplog.text
+        rate(hass, 6, 'ft³/min')
+        await asyncio.sleep(60)
+        assert meter.async_stop() == 0
+        assert not meter.reached
+    simulate(test)
+
+
+def test_leak_and_blockage():
+    async def test(hass, loop):
+        alerts = []
+        for value, expected in ((15, 10), (5, 10), (10, 10)):
+            rate(hass, value)
+            meter = VolumeMeter(hass, 'sensor.flow', expected=expected, tolerance=20,
+                                alert_cb=lambda alert, flow: alerts.append((alert, flow)))
+            meter.async_start()
+            await asyncio.sleep(60)
+            rate(hass, value + 0.001)
+            await asyncio.sleep(0)
+            meter.async_stop()
+        assert [x[0] for x in alerts] == [FLOW_LEAK, FLOW_BLOCKAGE]
+    simulate(test)
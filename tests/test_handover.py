@@ -0,0 +1,67 @@
+"""Open the next zone before the zone that is watering closes."""
+from conftest import START
+
+from irrigationprogram.const import DOMAIN
+from irrigationprogram.planner import ZoneStep, handovers, sequential_runtime
+from irrigationprogram.switch import PLATFORM_SCHEMA
+
+""" the program starts a minute after the simulation """
+STARTS = START + 60
+
+
+def program(minutes, **options):
+    """ a zone for each of the minutes, handing over for a minute """
+    states = {'input_datetime.start': '05:01:00'}
+    zones  = []
+    for z, water in enumerate(minutes):
+        states['switch.zone_%s' % z]       = 'off'
+        states['input_number.water_%s' % z] = str(water)
+        zones.append({'zone': 'switch.zone_%s' % z, 'name': 'Zone %s' % z,
+                      'water': 'input_number.water_%s' % z})
+    switch = dict({'start_time': 'input_datetime.start', 'handover': 60, 'zones': zones}, **options)
+    return PLATFORM_SCHEMA({'platform': DOMAIN, 'switches': {'a': switch}}), states
+
+
+def test_handovers():
+    steps = [ZoneStep(0, 'switch.zone_0', 'Zone 0', None, water=600),
+             ZoneStep(1, 'switch.zone_1', 'Zone 1', None, skip='rain'),
+             ZoneStep(2, 'switch.zone_2', 'Zone 2', None, water=600),
+             ZoneStep(3, 'switch.zone_3', 'Zone 3', None, water=60)]
+    assert handovers(steps, 60) == {0: steps[2]}
+    assert handovers(steps, 0) == {}
+    assert sequential_runtime(steps, 60) == 1200
+    assert sequential_runtime(steps) == 1260
+
+
+def test_next_zone_opens_before_the_last_closes(simulation):
+    config, states = program([10, 10, 1])
+    result = simulation(config, states, 3600)
+    assert result.log == [(STARTS, 'switch.zone_0', 'on'),
+                          (STARTS + 540, 'switch.zone_1', 'on'),
+                          (STARTS + 600, 'switch.zone_0', 'off'),
+                          (STARTS + 1140, 'switch.zone_1', 'off'),
+                          (STARTS + 1140, 'switch.zone_2', 'on'),
+                          (STARTS + 1200, 'switch.zone_2', 'off')]
+
+
+def test_stop_during_a_handover_closes_both_zones(simulation):
+    config, states = program([10, 10])
+
+    async def during(hass, programs):
+        hass.loop.call_at(STARTS - START + 570, lambda: hass.async_create_task(
+            programs['switch.a'].async_turn_off()))
+
+    result = simulation(config, states, 3600, during=during)
+    assert sorted(result.log) == [(STARTS, 'switch.zone_0', 'on'),
+                                  (STARTS + 540, 'switch.zone_1', 'on'),
+                                  (STARTS + 570, 'switch.zone_0', 'off'),
+                                  (STARTS + 570, 'switch.zone_1', 'off')]
+
+
+def test_no_handover_between_concurrent_zones(simulation):
+    config, states = program([10, 10], max_valves=2)
+    result = simulation(config, states, 3600)
+    assert sorted(result.log) == [(STARTS, 'switch.zone_0', 'on'),
+                                  (STARTS, 'switch.zone_1', 'on'),
+                                  (STARTS + 600, 'switch.zone_0', 'off'),
+                                  (STARTS + 600, 'switch.zone_1', 'off')]
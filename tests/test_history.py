@@ -0,0 +1,78 @@
+"""Keep the runs of the programs and zones in an append only log."""
+from datetime import timedelta
+
+import homeassistant.util.dt as dt_util
+from simulation import Simulation
+
+from irrigationprogram.const import HISTORY_FILE
+from irrigationprogram.history import RunHistory
+
+HOUR = timedelta(hours=1)
+DAY  = timedelta(days=1)
+
+
+def history(test):
+    async def scenario(sim):
+        return await test(sim.hass, RunHistory(sim.hass))
+    return Simulation().run(scenario)
+
+
+def record(runs, start, scheduled=True, seconds=600, litres=None):
+    zones = {'switch.zone_0': {'seconds': seconds, 'litres': litres},
+             'switch.zone_1': {'seconds': 0, 'skip': 'rain'}}
+    runs.async_record('switch.a', zones, start, scheduled)
+
+
+def test_totals_and_last_run():
+    async def test(hass, runs):
+        now = dt_util.utcnow()
+        record(runs, now - 2 * DAY, litres=20)
+        record(runs, now - DAY, scheduled=False, seconds=300, litres=10.5)
+        assert runs.totals('switch.a') == {'runs': 2, 'seconds': 900, 'litres': 30.5}
+        assert runs.totals('switch.zone_0', start=now - DAY - HOUR) == {
+            'runs': 1, 'seconds': 300, 'litres': 10.5}
+        assert runs.totals('switch.zone_1') == {'runs': 2, 'seconds': 0, 'litres': 0}
+        assert runs.totals('switch.b') == {'runs': 0, 'seconds': 0, 'litres': 0}
+        """ only a scheduled run counts for the run frequency """
+        assert runs.last_ran('switch.a') == (now - 2 * DAY).date()
+        assert runs.last_run('switch.a')['start'] == (now - DAY).replace(microsecond=0).isoformat()
+        """ a zone that was skipped has not watered """
+        assert runs.last_run('switch.zone_1') is None
+        summary = runs.summary(['switch.zone_0'])['switch.zone_0']
+        assert summary['minutes'] == 15 and summary['last_run']['seconds'] == 300
+    history(test)
+
+
+def test_clock_going_backwards():
+    async def test(hass, runs):
+        now = dt_util.utcnow()
+        record(runs, now, seconds=100)
+        record(runs, now - DAY, seconds=200)
+        assert runs.totals('switch.a', end=now) == {'runs': 1, 'seconds': 200, 'litres': 0}
+        assert runs.totals('switch.a', start=now) == {'runs': 1, 'seconds': 100, 'litres': 0}
+        assert runs.last_run('switch.a')['seconds'] == 100
+    history(test)
+
+
+def test_reload_from_the_file():
+    async def test(hass, runs):
+        now = dt_util.utcnow()
+        record(runs, now - 10 * DAY, litres=5)
+        record(runs, now - DAY, scheduled=False)
+        await runs.async_flush()
+        """ a partly written last line is ignored """
+        with open(hass.config.path(HISTORY_FILE), 'a') as log:
+            log.write('["switch.a",null,')
+        loaded = RunHistory(hass)
+        await loaded.async_load()
+        assert loaded.totals('switch.a') == runs.totals('switch.a')
+        assert loaded.last_ran('switch.a') == runs.last_ran('switch.a')
+
+        """ the records older than the retention period are dropped from the file """
+        expired = RunHistory(hass, days=5)
+        await expired.async_load()
+        assert expired.totals('switch.a') == {'runs': 1, 'seconds': 600, 'litres': 0}
+        assert expired.last_ran('switch.a') is None
+        with open(hass.config.path(HISTORY_FILE)) as log:
+            assert len(log.readlines()) == 3
+    history(test)
@@ -0,0 +1,67 @@
+"""Fit the programs into a watering window."""
+import logging
+
+from irrigationprogram.const import OBJECTIVE_MAKESPAN, OBJECTIVE_PEAK_FLOW
+from irrigationprogram.optimizer import _flow_caps, fit_window
+
+
+def job(key, runtime, flow, zones, priority=0, valves=1):
+    return {'key': key, 'runtime': runtime, 'valves': valves, 'flow': flow,
+            'zones': set(zones), 'priority': priority}
+
+
+def starts(result):
+    return {x['key']: x['start'] for x in result['schedule']}
+
+
+def test_flow_caps():
+    jobs = [job('a', 60, 10, 'a'), job('b', 60, 10, 'b'), job('c', 60, 5, 'c')]
+    assert _flow_caps(jobs) == [5, 10, 15, 20]
+    assert _flow_caps(jobs, 15) == [5, 10]
+    assert _flow_caps([job('a', 60, 0, 'a')]) == []
+
+
+def test_exclusive_runs_back_to_back():
+    jobs = [job('a', 600, 10, 'a'), job('b', 1200, 10, 'b', priority=1), job('c', 900, 10, 'c')]
+    result = fit_window(jobs, 3600)
+    """ priority first, then longest first """
+    assert starts(result) == {'b': 0, 'c': 1200, 'a': 2100}
+    assert result['makespan'] == 2700
+    assert result['peak_flow'] == 10
+    assert result['fits']
+
+
+def test_shared_zones_do_not_overlap():
+    jobs = [job('a', 600, 10, 'xy'), job('b', 600, 10, 'y'), job('c', 600, 10, 'z')]
+    result = fit_window(jobs, 3600, exclusive=False)
+    assert starts(result) == {'a': 0, 'c': 0, 'b': 600}
+    assert result['peak_flow'] == 20
+
+
+def test_limits_apply_across_programs():
+    jobs = [job('a', 600, 10, 'a'), job('b', 600, 10, 'b'), job('c', 600, 10, 'c')]
+    assert fit_window(jobs, 3600, max_valves=2, exclusive=False)['makespan'] == 1200
+    assert fit_window(jobs, 3600, max_flow=15, exclusive=False)['makespan'] == 1800
+    """ a program over the limit on its own runs alone """
+    result = fit_window([job('a', 600, 30, 'a'), job('b', 600, 10, 'b')], 3600,
+                        max_flow=20, exclusive=False)
+    assert result['makespan'] == 1200
+    assert not fit_window(jobs, 1000, max_flow=15, exclusive=False)['fits']
+
+
+def test_peak_flow_finds_the_lowest_limit():
+    jobs = [job('a', 3600, 10, 'a'), job('b', 3600, 10, 'b'), job('c', 3600, 10, 'c')]
+    makespan = fit_window(jobs, 7200, objective=OBJECTIVE_MAKESPAN, exclusive=False)
+    assert makespan['peak_flow'] == 30
+    result = fit_window(jobs, 7200, objective=OBJECTIVE_PEAK_FLOW, exclusive=False)
+    assert result['peak_flow'] == 20
+    assert result['makespan'] == 7200
+    assert result['fits']
+
+
+def test_peak_flow_needs_concurrent(caplog):
+    jobs = [job('a', 3600, 10, 'a'), job('b', 3600, 10, 'b')]
+    with caplog.at_level(logging.WARNING):
+        result = fit_window(jobs, 7200, objective=OBJECTIVE_PEAK_FLOW)
+    assert result['makespan'] == 7200
+    assert 'needs concurrent programs' in caplog.text
@@ -0,0 +1,77 @@
+"""Plan the cycles of a program within its valve and flow budget."""
+import pytest
+
+from irrigationprogram.const import PHASE_WAIT, PHASE_WATER
+from irrigationprogram.planner import ZoneStep, makespan, plan_cycles, resume_cycles
+
+
+def zone(key, water, wait=0, repeat=1, flow=None):
+    return (key, water, wait, repeat, flow)
+
+
+@pytest.mark.parametrize('valves, expected', [
+    (1, [(0, 'a', 60), (60, 'b', 30), (90, 'c', 30)]),
+    (2, [(0, 'a', 60), (0, 'b', 30), (30, 'c', 30)]),
+    (3, [(0, 'a', 60), (0, 'b', 30), (0, 'c', 30)]),
+])
+def test_valves(valves, expected):
+    zones = [zone('a', 60), zone('b', 30), zone('c', 30)]
+    assert plan_cycles(zones, valves) == expected
+
+
+def test_max_flow_holds_back_a_zone_that_does_not_fit():
+    zones = [zone('a', 60, flow=10), zone('b', 30, flow=10), zone('c', 30, flow=5)]
+    assert plan_cycles(zones, 3, max_flow=15) == [(0, 'a', 60), (0, 'c', 30), (60, 'b', 30)]
+
+
+def test_zone_above_max_flow_runs_alone():
+    zones = [zone('a', 60, flow=20), zone('b', 30, flow=5)]
+    assert plan_cycles(zones, 2, max_flow=15) == [(0, 'a', 60), (60, 'b', 30)]
+
+
+def test_zones_without_water_are_left_out():
+    zones = [zone('a', 0), zone('b', 30, repeat=0), zone('c', 30)]
+    assert plan_cycles(zones) == [(0, 'c', 30)]
+
+
+def test_sequential_zone_holds_its_valve_while_it_soaks():
+    zones = [zone('a', 60, wait=120, repeat=2), zone('b', 60)]
+    assert plan_cycles(zones) == [(0, 'a', 60), (180, 'a', 60), (240, 'b', 60)]
+
+
+def test_interleave_waters_another_zone_during_a_soak():
+    zones = [zone('a', 60, wait=120, repeat=2), zone('b', 60, wait=120, repeat=2)]
+    plan  = plan_cycles(zones, interleave=True)
+    assert plan == [(0, 'a', 60), (60, 'b', 60), (180, 'a', 60), (240, 'b', 60)]
+    assert makespan(plan) == 300
+    assert makespan(plan_cycles(zones)) == 480
+
+
+def test_interleave_keeps_the_soak_of_each_zone():
+    zones = [zone('a', 60, wait=300, repeat=3), zone('b', 30, wait=30, repeat=2)]
+    plan  = plan_cycles(zones, interleave=True)
+    for key, water, wait in (('a', 60, 300), ('b', 30, 30)):
+        starts = [x[0] for x in plan if x[1] == key]
+        assert all(y - x >= water + wait for x, y in zip(starts, starts[1:]))
+    assert sorted(x[1] for x in plan) == ['a', 'a', 'a', 'b', 'b']
+
+
+@pytest.mark.parametrize('offset, expected', [
+    (0, [(0, 'a', 60), (60, 'b', 30)]),
+    (30, [(0, 'a', 30), (30, 'b', 30)]),
+    (70, [(0, 'b', 20)]),
+    (90, []),
+])
+def test_resume_cycles(offset, expected):
+    assert resume_cycles([(0, 'a', 60), (60, 'b', 30)], offset) == expected
+
+
+@pytest.mark.parametrize('resume, expected', [
+    (None, [(3, PHASE_WATER, 60), (3, PHASE_WAIT, 30), (2, PHASE_WATER, 60),
+            (2, PHASE_WAIT, 30), (1, PHASE_WATER, 60)]),
+    ((2, PHASE_WATER, 20), [(2, PHASE_WATER, 20), (2, PHASE_WAIT, 30), (1, PHASE_WATER, 60)]),
+    ((2, PHASE_WAIT, 0), [(1, PHASE_WATER, 60)]),
+])
+def test_phases_resume(resume, expected):
+    step = ZoneStep(0, 'switch.zone_0', 'Zone 0', None, water=60, wait=30, repeat=3)
+    assert step.phases(resume) == expected
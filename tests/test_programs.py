@@ -0,0 +1,118 @@
+"""Run the programs on the virtual clock of the benchmark simulation.
+
+The zone commands are checked for their order and virtual time, and a
+small benchmark run is held to the baseline counts so a change to the
+hot loops of switch.py that adds work fails here.
+"""
+import pytest
+
+from conftest import START
+from simulation import Simulation
+from bench_programs import async_benchmark, build_config
+
+from irrigationprogram.const import DOMAIN
+from irrigationprogram.switch import PLATFORM_SCHEMA
+
+""" counts of the 20 programs, 4 zones, 1 day benchmark, and the margin allowed """
+BASELINE = {
+    'setup':    {'state_writes': 60, 'zone_commands': 0, 'template_renders': 0},
+    'schedule': {'wakeups': 173, 'state_writes': 232, 'zone_commands': 153,
+                 'template_renders': 0},
+    'stop':     {'state_writes': 2, 'service_calls': 2, 'zone_commands': 4},
+}
+MARGIN      = 1.1
+PEAK_MEMORY = 4 * 1048576
+
+
+def two_programs(**options):
+    """ a at 05:10 waters zone 0 and 1 for 2 minutes, b at 05:12 waters zone 2 """
+    states = {'input_datetime.a': '05:10:00',
+              'input_datetime.b': '05:12:00',
+              'input_number.water': '2'}
+    for z in range(3):
+        states['switch.zone_%s' % z] = 'off'
+
+    def zones(*ids):
+        return [{'zone': 'switch.zone_%s' % z, 'name': 'Zone %s' % z,
+                 'water': 'input_number.water'} for z in ids]
+
+    platform = {'platform': DOMAIN, 'switches': {
+        'a': {'start_time': 'input_datetime.a', 'zones': zones(0, 1)},
+        'b': {'start_time': 'input_datetime.b', 'zones': zones(2),
+              'queue_policy': options.pop('queue_policy', 'preempt')}}}
+    platform.update(options)
+    return PLATFORM_SCHEMA(platform), states
+
+
+def test_zones_run_in_order(simulation):
+    config, states = build_config(2, 2)
+    log = simulation(config, states, 3600).log
+    """ program 0 starts at 05:00 as the simulation does, its next run is tomorrow """
+    assert log == [(START + 420, 'switch.zone_0', 'on'),
+                   (START + 480, 'switch.zone_0', 'off'),
+                   (START + 480, 'switch.zone_1', 'on'),
+                   (START + 540, 'switch.zone_1', 'off')]
+
+
+def test_later_program_preempts(simulation):
+    config, states = two_programs()
+    log = simulation(config, states, 3600).log
+    """ a is stopped as it moves to zone 1, which is not opened """
+    assert log == [(START + 600, 'switch.zone_0', 'on'),
+                   (START + 720, 'switch.zone_0', 'off'),
+                   (START + 720, 'switch.zone_2', 'on'),
+                   (START + 840, 'switch.zone_2', 'off')]
+
+
+def test_later_program_queues(simulation):
+    config, states = two_programs(queue_policy='queue')
+    log = simulation(config, states, 3600).log
+    assert log == [(START + 600, 'switch.zone_0', 'on'),
+                   (START + 720, 'switch.zone_0', 'off'),
+                   (START + 720, 'switch.zone_1', 'on'),
+                   (START + 840, 'switch.zone_1', 'off'),
+                   (START + 840, 'switch.zone_2', 'on'),
+                   (START + 960, 'switch.zone_2', 'off')]
+
+
+def test_concurrent_programs_share_the_budget(simulation):
+    config, states = two_programs(queue_policy='queue', concurrent=True)
+    log = simulation(config, states, 3600).log
+    """ b shares no zones with a and starts at once """
+    assert (START + 720, 'switch.zone_2', 'on') in log
+    assert (START + 840, 'switch.zone_2', 'off') in log
+    assert max(x[0] for x in log) == START + 840
+
+    """ a second open valve is over the max_valves budget, b waits for a """
+    config, states = two_programs(queue_policy='queue', concurrent=True, max_valves=1)
+    log = simulation(config, states, 3600).log
+    assert log[-2:] == [(START + 840, 'switch.zone_2', 'on'),
+                        (START + 960, 'switch.zone_2', 'off')]
+
+
+def test_benchmark_baseline():
+    phases = Simulation().run(lambda sim: async_benchmark(sim, 20, 4, 1))
+    for phase, counts in BASELINE.items():
+        for name, baseline in counts.items():
+            assert phases[phase][name] <= baseline * MARGIN, (phase, name, phases[phase][name])
+        assert phases[phase]['peak_memory'] < PEAK_MEMORY, phase
+    """ every program ran, preempted runs close their zone early """
+    assert phases['schedule']['zone_commands'] >= 0.9 * BASELINE['schedule']['zone_commands']
+
+
+def test_failed_run_can_start_again(simulation):
+    """ a water time that cannot be read fails the run, the program goes back to idle """
+    config, states = two_programs()
+    states['input_number.water'] = 'unknown'
+
+    async def during(hass, programs):
+        program = programs['switch.a']
+        with pytest.raises(ValueError):
+            await program.async_turn_on()
+        assert not program.is_on
+        hass.states.async_set('input_number.water', '1')
+        await program.async_turn_on()
+
+    log = simulation(config, states, 0, during=during).log
+    assert [x[1:] for x in log] == [('switch.zone_0', 'on'), ('switch.zone_0', 'off'),
+                                    ('switch.zone_1', 'on'), ('switch.zone_1', 'off')]
@@ -0,0 +1,56 @@
+"""Project the water use of the programs over the coming days."""
+from datetime import date, datetime, time
+
+import homeassistant.util.dt as dt_util
+
+from irrigationprogram.projection import project, run_offsets
+
+""" a Monday, before the start time """
+NOW = datetime(2026, 1, 5, 5, 0, tzinfo=dt_util.UTC)
+
+
+def job(key, zones, run_days=None, run_freq=None, enabled=True):
+    return {'key': key, 'enabled': enabled, 'start_time': time(6, 0),
+            'run_days': run_days, 'run_freq': run_freq, 'last_ran': None,
+            'zones': zones}
+
+
+def zone(entity_id, seconds, litres=None, rain=False):
+    return {'zone': entity_id, 'seconds': seconds, 'litres': litres, 'rain': rain}
+
+
+def test_run_offsets():
+    first = date(2026, 1, 5)
+    assert run_offsets(first, 7) == list(range(7))
+    assert run_offsets(first, 7, run_freq=3) == [0, 3, 6]
+    assert run_offsets(first, 14, run_days="['Mon','Thu']") == [0, 3, 7, 10]
+
+
+def test_daily_and_zone_totals():
+    jobs = [job('switch.a', [zone('switch.z1', 600, 50), zone('switch.z2', 300)], run_freq=2),
+            job('switch.b', [zone('switch.z1', 120, 10)], run_days="['Tue']"),
+            job('switch.c', [zone('switch.z3', 600, 100)], enabled=False)]
+    result = project(jobs, NOW, 7)
+    assert result['zones'] == [['switch.a', 'switch.z1', 4, 40.0, 200],
+                               ['switch.a', 'switch.z2', 4, 20.0, 0],
+                               ['switch.b', 'switch.z1', 1, 2.0, 10],
+                               ['switch.c', 'switch.z3', 0, 0.0, 0]]
+    assert result['minutes'] == [15, 2, 15, 0, 15, 0, 15]
+    assert result['litres'] == [50, 10, 50, 0, 50, 0, 50]
+    """ a zone watered by two programs is summed by day """
+    assert result['zone_days']['switch.z1'] == {'minutes': [10, 2, 10, 0, 10, 0, 10],
+                                                'litres': [50, 10, 50, 0, 50, 0, 50]}
+    assert 'switch.z3' not in result['zone_days']
+    assert result['total'] == {'minutes': 62, 'litres': 210}
+
+
+def test_rain_probability():
+    jobs = [job('switch.a', [zone('switch.z1', 600, 100, rain=True), zone('switch.z2', 600, 100)])]
+    result = project(jobs, NOW, 10, rain_probability=20)
+    assert result['zones'][0][2:] == [8.0, 80.0, 800.0]
+    assert result['zones'][1][2:] == [10, 100.0, 1000]
+    assert result['zone_days']['switch.z1']['litres'][0] == 80
+    assert result['litres'][0] == 180
+    """ twelve monthly values, January used """
+    monthly = project(jobs, NOW, 10, rain_probability=[50] + [0] * 11)
+    assert monthly['zones'][0][2:] == [5.0, 50.0, 500.0]
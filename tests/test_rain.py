@@ -0,0 +1,78 @@
+"""Interrupt the zones of a scheduled run when it starts raining."""
+import pytest
+
+from conftest import START
+
+from irrigationprogram.const import DOMAIN
+from irrigationprogram.switch import PLATFORM_SCHEMA
+
+""" the program starts a minute after the simulation """
+STARTS = START + 60
+
+
+def program(**options):
+    """ zones 0 and 1 watch the rain sensor, zone 2 does not """
+    states = {'input_datetime.start': '05:01:00',
+              'input_number.water': '10',
+              'binary_sensor.rain': 'off'}
+    zones  = []
+    for z in range(3):
+        states['switch.zone_%s' % z] = 'off'
+        zone = {'zone': 'switch.zone_%s' % z, 'name': 'Zone %s' % z,
+                'water': 'input_number.water'}
+        if z < 2:
+            zone['rain_sensor'] = 'binary_sensor.rain'
+        zones.append(zone)
+    switch = {'start_time': 'input_datetime.start', 'rain_interrupt': True, 'zones': zones}
+    switch.update(options)
+    return PLATFORM_SCHEMA({'platform': DOMAIN, 'switches': {'a': switch}}), states
+
+
+def rain(*changes):
+    """ set the rain sensor at seconds after the program starts """
+    async def during(hass, programs):
+        for seconds, state in changes:
+            hass.loop.call_at(STARTS - START + seconds,
+                              hass.states.async_set, 'binary_sensor.rain', state)
+    return during
+
+
+def test_rain_interrupts_the_zones_with_a_sensor(simulation):
+    config, states = program()
+    result = simulation(config, states, 3600, during=rain((300, 'on')))
+    assert result.log == [(STARTS, 'switch.zone_0', 'on'),
+                          (STARTS + 330, 'switch.zone_0', 'off'),
+                          (STARTS + 330, 'switch.zone_2', 'on'),
+                          (STARTS + 930, 'switch.zone_2', 'off')]
+    attributes = result.hass.states.get('switch.a').attributes
+    assert sorted(attributes['interrupted']) == ['Zone 0', 'Zone 1']
+
+
+def test_shower_shorter_than_the_debounce(simulation):
+    config, states = program()
+    result = simulation(config, states, 3600, during=rain((300, 'on'), (320, 'off')))
+    assert [x[1:] for x in result.log if x[2] == 'on'] == [
+        ('switch.zone_0', 'on'), ('switch.zone_1', 'on'), ('switch.zone_2', 'on')]
+    assert result.log[-1][0] == STARTS + 1800
+
+
+@pytest.mark.parametrize('options', [{'rain_interrupt': False}, {'rain_debounce': 0}])
+def test_rain_interrupt_options(simulation, options):
+    config, states = program(**options)
+    result = simulation(config, states, 3600, during=rain((300, 'on')))
+    zone_0 = [x[0] for x in result.log if x[1] == 'switch.zone_0']
+    if options.get('rain_interrupt') is False:
+        assert zone_0 == [STARTS, STARTS + 600]
+    else:
+        assert zone_0 == [STARTS, STARTS + 300]
+
+
+def test_rain_interrupts_concurrent_zones(simulation):
+    config, states = program(max_valves=3)
+    result = simulation(config, states, 3600, during=rain((300, 'on')))
+    assert sorted(result.log) == [(STARTS, 'switch.zone_0', 'on'),
+                                  (STARTS, 'switch.zone_1', 'on'),
+                                  (STARTS, 'switch.zone_2', 'on'),
+                                  (STARTS + 330, 'switch.zone_0', 'off'),
+                                  (STARTS + 330, 'switch.zone_1', 'off'),
+                                  (STARTS + 600, 'switch.zone_2', 'off')]
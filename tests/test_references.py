@@ -0,0 +1,60 @@
+"""The index of the entities referenced by the programs."""
+import asyncio
+import logging
+
+from simulation import Simulation
+
+from irrigationprogram.references import ReferenceIndex
+
+
+def with_index(test):
+    """ run a test with a reference index on a simulated hass """
+    async def scenario(sim):
+        sim.hass.states.async_set('switch.zone_0', 'off')
+        return await test(sim.hass, ReferenceIndex(sim.hass))
+    return Simulation().run(scenario)
+
+
+def test_missing_entities():
+    async def test(hass, index):
+        index.async_register('switch.a', [('switch.zone_0', 'zone'),
+                                          ('input_number.water', 'water')])
+        assert index.is_missing('input_number.water')
+        index.async_validate()
+        assert index.report()['missing'] == {'input_number.water': {'switch.a': ['water']}}
+        """ followed from the state changed events """
+        hass.states.async_set('input_number.water', '2')
+        await asyncio.sleep(0)
+        assert not index.is_missing('input_number.water')
+        hass.states.async_remove('switch.zone_0')
+        await asyncio.sleep(0)
+        assert index.is_missing('switch.zone_0')
+        assert index.programs('switch.zone_0') == ['switch.a']
+    with_index(test)
+
+
+def test_reload_validates_once(caplog):
+    async def test(hass, index):
+        index.async_register('switch.a', [('switch.zone_0', 'zone')])
+        index.async_validate()
+        tracked = []
+        track   = index._async_track
+        index._async_track = lambda: tracked.append(1) or track()
+
+        caplog.clear()
+        index.async_defer()
+        index.async_unregister('switch.a')
+        index.async_resume(['switch.b', 'switch.c'])
+        index.async_register('switch.b', [('switch.zone_0', 'zone'),
+                                          ('input_number.missing', 'water')])
+        assert tracked == []
+        index.async_register('switch.c', [('input_number.missing', 'water')])
+        assert tracked == [1]
+        assert len(caplog.records) == 1
+        assert index.report()['programs'] == 2
+
+        """ after the reload each program is checked as it registers """
+        index.async_register('switch.d', [('switch.zone_0', 'zone')])
+        assert tracked == [1, 1]
+    with caplog.at_level(logging.WARNING):
+        with_index(test)
@@ -0,0 +1,88 @@
+"""Reload the platform configuration into the live programs."""
+import asyncio
+
+from conftest import START
+
+from irrigationprogram.const import DOMAIN, DATA_ADD_ENTITIES, DATA_PROGRAMS, DFLT_RELOAD_TIMEOUT
+from irrigationprogram.switch import PLATFORM_SCHEMA, async_reload_programs
+
+STATES = {'input_datetime.start': '12:00:00',
+          'input_number.water': '10',
+          'input_number.other': '5'}
+
+
+def platform(**water):
+    """ a program per device, each on its own zone """
+    switches = {}
+    for zone, device in enumerate(water):
+        switches[device] = {'start_time': 'input_datetime.start',
+                            'zones': [{'zone': 'switch.zone_%s' % zone,
+                                       'name': 'Zone %s' % zone,
+                                       'water': water[device]}]}
+    return PLATFORM_SCHEMA({'platform': DOMAIN, 'switches': switches})
+
+
+def reload(simulation, config, running, stuck=None):
+    """Set up programs a, b and d, start one and reload config a minute later.
+
+    Returns the reload result with the entities added and the programs
+    left, and the simulation. The program stuck never goes idle.
+    """
+    states = dict(STATES, **{'switch.zone_%s' % z: 'off' for z in range(4)})
+    result = {}
+
+    async def during(hass, programs):
+        added = []
+
+        def add_entities(entities):
+            async def async_add():
+                for entity in entities:
+                    entity.hass = hass
+                    await entity.async_internal_added_to_hass()
+                    await entity.async_added_to_hass()
+                    entity.async_write_ha_state()
+                    added.append(entity.entity_id)
+            hass.async_create_task(async_add())
+
+        hass.data[DOMAIN][DATA_ADD_ENTITIES] = add_entities
+        if stuck is not None:
+            programs[stuck].async_wait_idle = hass.loop.create_future
+        hass.async_create_task(programs[running].async_turn_on())
+        await asyncio.sleep(60)
+        start = hass.loop.time()
+        result.update(await async_reload_programs(hass, config))
+        result['seconds'] = hass.loop.time() - start
+        await asyncio.sleep(0.001)
+        result['entities'] = added
+        result['programs'] = sorted(hass.data[DOMAIN][DATA_PROGRAMS])
+
+    initial = platform(a='input_number.water', b='input_number.water', d='input_number.water')
+    return result, simulation(initial, states, 3600, during=during)
+
+
+def test_reload_adds_updates_and_removes(simulation):
+    config = platform(a='input_number.water', b='input_number.other', c='input_number.water')
+    result, sim = reload(simulation, config, 'switch.a')
+    assert {k: result[k] for k in ('added', 'updated', 'removed', 'unchanged')} == {
+        'added': ['c'], 'updated': ['b'], 'removed': ['d'], 'unchanged': ['a']}
+    assert sorted(result['entities']) == ['switch.b', 'switch.c']
+    assert result['programs'] == ['a', 'b', 'c']
+    assert sim.hass.states.get('switch.d') is None
+    """ the unchanged program was left to finish its run """
+    assert sim.log == [(START, 'switch.zone_0', 'on'), (START + 600, 'switch.zone_0', 'off')]
+
+
+def test_reload_stops_a_changed_program(simulation):
+    config = platform(a='input_number.water', b='input_number.other')
+    result, sim = reload(simulation, config, 'switch.b')
+    assert result['updated'] == ['b'] and result['removed'] == ['d']
+    assert sim.log == [(START, 'switch.zone_1', 'on'), (START + 60, 'switch.zone_1', 'off')]
+    assert sim.hass.states.get('switch.b').state == 'off'
+
+
+def test_reload_does_not_wait_for_ever(simulation, caplog):
+    config = platform(a='input_number.water', b='input_number.water')
+    result, sim = reload(simulation, config, 'switch.a', stuck='switch.d')
+    assert result['removed'] == ['d'] and result['programs'] == ['a', 'b']
+    assert round(result['seconds']) == DFLT_RELOAD_TIMEOUT
+    assert 'switch.d did not stop within' in caplog.text
@@ -0,0 +1,123 @@
+"""The run slot, zone locks and queue shared by the programs."""
+import asyncio
+from types import SimpleNamespace
+
+from irrigationprogram.const import (
+    POLICY_MERGE,
+    POLICY_PREEMPT,
+    POLICY_QUEUE,
+    POLICY_SKIP,
+)
+from irrigationprogram.runqueue import RunQueue
+
+
+class Program:
+    """ the attributes of a program the run queue uses """
+
+    def __init__(self, name, priority=0):
+        self.entity_id         = 'switch.' + name
+        self.priority          = priority
+        self.remaining_runtime = 0
+        self.planned_runtime   = 0
+        self.stopped           = None
+
+    def async_stop_run(self, reason):
+        self.stopped = reason
+
+
+def run(test):
+    """ run a test coroutine with a run queue on a fresh loop """
+    async def main():
+        loop = asyncio.get_event_loop()
+        return await test(RunQueue(SimpleNamespace(loop=loop)))
+    return asyncio.run(main())
+
+
+def waiting(queue, program, zones, policy=POLICY_QUEUE, demand=(0, 0)):
+    return asyncio.ensure_future(
+        queue.async_acquire(program, zones, program.priority, policy, demand))
+
+
+def test_one_program_at_a_time():
+    async def test(queue):
+        a, b = Program('a'), Program('b')
+        assert await queue.async_acquire(a, ['z1'], 0, POLICY_QUEUE) == set()
+        task = waiting(queue, b, ['z2'])
+        await asyncio.sleep(0)
+        assert not task.done()
+        assert queue.position(b) == 1
+        queue.async_release(a)
+        assert await task == set()
+        assert queue.running == [b]
+    run(test)
+
+
+def test_skip_with_every_zone_busy_holds_nothing():
+    async def test(queue):
+        a, b, c = Program('a'), Program('b'), Program('c')
+        await queue.async_acquire(a, ['z1'], 0, POLICY_QUEUE)
+        task = waiting(queue, c, ['z3'])
+        await asyncio.sleep(0)
+        assert await queue.async_acquire(b, ['z2'], 0, POLICY_SKIP) == {'z2'}
+        assert queue.running == [a]
+        queue.async_release(a)
+        assert await task == set()
+        assert queue.running == [c]
+    run(test)
+
+
+def test_preempt_stops_lower_priority():
+    async def test(queue):
+        a, b = Program('a'), Program('b', priority=1)
+        await queue.async_acquire(a, ['z1'], 0, POLICY_QUEUE)
+        task = waiting(queue, b, ['z1'], POLICY_PREEMPT)
+        await asyncio.sleep(0)
+        assert a.stopped is not None
+        queue.async_release(a)
+        assert await task == set()
+    run(test)
+
+
+def test_merge_skips_zones_watered_while_waiting():
+    async def test(queue):
+        a, b = Program('a'), Program('b')
+        await queue.async_acquire(a, ['z1', 'z2'], 0, POLICY_QUEUE)
+        task = waiting(queue, b, ['z2', 'z3'], POLICY_MERGE)
+        await asyncio.sleep(0)
+        queue.async_release(a, ['z1', 'z2'])
+        assert await task == {'z2'}
+    run(test)
+
+
+def test_concurrent_within_the_budget():
+    async def test(queue):
+        queue.configure(True, max_valves=2)
+        a, b, c, d = Program('a'), Program('b'), Program('c'), Program('d')
+        await queue.async_acquire(a, ['z1'], 0, POLICY_QUEUE, (1, 10))
+        """ no shared zones and within the budget, starts at once """
+        await queue.async_acquire(b, ['z2'], 0, POLICY_QUEUE, (1, 10))
+        """ over max_valves, waits """
+        task_c = waiting(queue, c, ['z3'], demand=(1, 10))
+        """ shares a zone with a running program """
+        task_d = waiting(queue, d, ['z1'], demand=(0, 0))
+        await asyncio.sleep(0)
+        assert not task_c.done() and not task_d.done()
+        assert queue.waiting_for(d) == ['z1']
+        queue.async_release(b)
+        assert await task_c == set()
+        assert not task_d.done()
+        queue.async_release(a)
+        assert await task_d == set()
+    run(test)
+
+
+def test_cancel_removes_a_queued_program():
+    async def test(queue):
+        a, b = Program('a'), Program('b')
+        await queue.async_acquire(a, ['z1'], 0, POLICY_QUEUE)
+        task = waiting(queue, b, ['z1'])
+        await asyncio.sleep(0)
+        queue.async_cancel(b)
+        assert await task is None
+        assert queue.position(b) is None
+    run(test)
@@ -0,0 +1,70 @@
+"""Work out when a program is next due."""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+import homeassistant.util.dt as dt_util
+
+from irrigationprogram.scheduler import is_run_day, next_run, parse_run_freq
+
+""" a Monday """
+NOW = datetime(2026, 1, 5, 5, 0, tzinfo=dt_util.UTC)
+
+
+@pytest.fixture
+def time_zone():
+    """ set the local time zone for a test """
+    default = dt_util.DEFAULT_TIME_ZONE
+
+    def set_time_zone(name):
+        dt_util.set_default_time_zone(dt_util.get_time_zone(name))
+    yield set_time_zone
+    dt_util.set_default_time_zone(default)
+
+
+@pytest.mark.parametrize('value, expected', [('3', 3), ('2.0', 2), ('unknown', 0), (None, 0)])
+def test_parse_run_freq(value, expected):
+    assert parse_run_freq(value) == expected
+
+
+@pytest.mark.parametrize('run_days, run_freq, last_ran, expected', [
+    (None, None, None, True),
+    ("['Mon','Thu']", None, None, True),
+    ("['Tue','Thu']", None, None, False),
+    (None, 3, date(2026, 1, 2), True),
+    (None, 3, date(2026, 1, 3), False),
+])
+def test_is_run_day(run_days, run_freq, last_ran, expected):
+    assert is_run_day(date(2026, 1, 5), run_days, run_freq, last_ran) == expected
+
+
+@pytest.mark.parametrize('start, run_days, run_freq, last_ran, expected', [
+    (time(6), None, None, None, datetime(2026, 1, 5, 6)),
+    (time(5), None, None, None, datetime(2026, 1, 6, 5)),
+    (time(4), "['Mon','Thu']", None, None, datetime(2026, 1, 8, 4)),
+    (time(6), None, 3, date(2026, 1, 4), datetime(2026, 1, 7, 6)),
+    (time(6), None, 10, date(2026, 1, 4), datetime(2026, 1, 14, 6)),
+    (time(6), "['Sat']", 10, date(2026, 1, 4), None),
+])
+def test_next_run(start, run_days, run_freq, last_ran, expected):
+    when = next_run(NOW, start, run_days, run_freq, last_ran)
+    if expected is not None:
+        expected = expected.replace(tzinfo=dt_util.UTC)
+    assert when == expected
+
+
+def test_next_run_without_start_time():
+    assert next_run(NOW, None) is None
+
+
+@pytest.mark.parametrize('now, start, utc, offset', [
+    (datetime(2026, 10, 1), time(6), datetime(2026, 10, 1, 20), 10),
+    (datetime(2026, 10, 3), time(6), datetime(2026, 10, 3, 19), 11),
+    (datetime(2026, 10, 3), time(2, 30), datetime(2026, 10, 3, 16, 30), 11),
+    (datetime(2026, 4, 4), time(2, 30), datetime(2026, 4, 4, 16, 30), 10),
+])
+def test_next_run_across_daylight_saving(time_zone, now, start, utc, offset):
+    """ Sydney moves forward on 4 October 2026 and back on 5 April 2026 """
+    time_zone('Australia/Sydney')
+    when = next_run(now.replace(tzinfo=dt_util.UTC), start)
+    assert when.utcoffset() == timedelta(hours=offset)
+    assert dt_util.as_utc(when) == utc.replace(tzinfo=dt_util.UTC)
@@ -0,0 +1,76 @@
+"""Switch the zone valves and wait for them to confirm."""
+import asyncio
+
+from simulation import Simulation
+
+from irrigationprogram.const import ATTR_COMMAND_INTERVAL, ATTR_MAX_COMMANDS
+from irrigationprogram.valves import ValveActuator, ValveController
+
+ZONES = ['switch.zone_0', 'switch.zone_1', 'switch.zone_2']
+
+
+def simulate(test):
+    async def scenario(sim):
+        for zone in ZONES:
+            sim.hass.states.async_set(zone, 'off')
+        valves = ValveActuator(sim.hass, timeout=10, retries=2)
+        return await test(sim, valves)
+    return Simulation().run(scenario)
+
+
+def test_zones_without_controller_switch_together():
+    async def test(sim, valves):
+        assert await valves.async_turn_on(ZONES)
+        assert [x[0] for x in sim.zone_log] == [0, 0, 0]
+        assert sim.counters.service_calls == 1
+        """ only the zones that are on are closed """
+        sim.hass.states.async_set('switch.zone_1', 'off')
+        assert await valves.async_turn_off(ZONES + ZONES)
+        assert sim.counters.service_calls == 2
+        assert set(valves.latency) == set(ZONES)
+    simulate(test)
+
+
+def test_controller_spaces_its_commands():
+    async def test(sim, valves):
+        valves.configure({'board': {ATTR_MAX_COMMANDS: 1, ATTR_COMMAND_INTERVAL: 2}},
+                         {zone: 'board' for zone in ZONES[:2]})
+        start = sim.loop.time()
+        assert await valves.async_turn_on(ZONES)
+        assert sorted((round(x[0] - start), x[1]) for x in sim.zone_log) == [
+            (0, 'switch.zone_0'), (0, 'switch.zone_2'), (2, 'switch.zone_1')]
+    simulate(test)
+
+
+def test_controller_sends_the_latest_command():
+    async def test(sim, valves):
+        controller = ValveController(sim.hass, 'board', max_commands=1, interval=5)
+        opening    = controller.async_send('turn_on', ZONES)
+        await asyncio.sleep(1)
+        closing    = controller.async_send('turn_off', ZONES[2:])
+        assert await opening == ['turn_on', 'turn_on', 'turn_off']
+        assert await closing == ['turn_off']
+        assert [x[1:] for x in sim.zone_log] == [('switch.zone_0', 'on'),
+                                                 ('switch.zone_1', 'on'),
+                                                 ('switch.zone_2', 'off')]
+    simulate(test)
+
+
+def test_replaced_open_is_not_retried():
+    async def test(sim, valves):
+        valves.configure({'board': {ATTR_MAX_COMMANDS: 1, ATTR_COMMAND_INTERVAL: 5}},
+                         {zone: 'board' for zone in ZONES})
+        start   = sim.loop.time()
+        opening = asyncio.ensure_future(valves.async_turn_on(ZONES))
+        await asyncio.sleep(1)
+        """ zone 2 is still waiting in the queue when it is closed """
+        sim.hass.states.async_set('switch.zone_2', 'on')
+        closing = asyncio.ensure_future(valves.async_turn_off(['switch.zone_2']))
+        assert await opening
+        assert await closing
+        assert round(sim.loop.time() - start) == 10
+        assert [x[1:] for x in sim.zone_log] == [('switch.zone_0', 'on'),
+                                                 ('switch.zone_1', 'on'),
+                                                 ('switch.zone_2', 'off')]
+        assert valves.latency['switch.zone_2'] == 9
+    simulate(test)